@@ -1,13 +1,25 @@
+import asyncio
+import gzip
+import hashlib
 import shutil
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request, Response
+from typing import Any, Dict, List, Optional, Tuple
 import json
 import logging
 
 from app.services.batch_manager import batch_manager
+from app.services.checkpoint import CheckpointStore, checkpoints
+from app.services.history_index import history_index
+from app.services.job_queue import job_queue
+from app.services.job_runner import job_runner
 from app.services.ocr_engine import ocr_engine
+from app.services.providers import resolve_fallbacks, resolve_provider
+from app.services.results_store import results_store
+from app.services.scheduler import card_scheduler
 from app.services.ws_manager import ws_manager
-from app.models.schemas import BatchCreate, BatchHistoryItem, BatchProgress, BatchResponse, BatchStartRequest
+from app.models.schemas import (
+    BatchCreate, BatchHistoryItem, BatchProgress, BatchResponse, BatchScheduleUpdate, BatchStartRequest,
+)
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -15,57 +27,97 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def _resolve_provider(provider: str, model: Optional[str] = None):
-    """Returns (api_endpoint, model_name, api_key) for the given provider."""
-    if provider == "ollama":
-        return settings.OLLAMA_API_ENDPOINT, model or settings.OLLAMA_MODEL_NAME, settings.OLLAMA_API_KEY
-    return settings.API_ENDPOINT, model or settings.MODEL_NAME, settings.OPENROUTER_API_KEY
-
-
-async def run_ocr_task(batch_name: str, resume: bool = True, retry_errors: bool = False):
-    """Background task to run OCR on a batch."""
+async def run_ocr_task(
+    batch_name: str, resume: bool = True, retry_errors: bool = False, job_id: Optional[int] = None
+) -> str:
+    """Runs OCR on a batch as job job_id of the job queue; returns the final status."""
     # Get (or create) the cancel event and immediately clear it to ensure a fresh state.
     # This prevents a stale set event from a previous cancellation aborting the new run.
     cancel_event = ws_manager.get_or_create_cancel_event(batch_name)
     cancel_event.clear()
+    batch_manager.update_batch_status(batch_name, "running")
 
     try:
         batch_path = batch_manager.get_batch_path(batch_name)
-        config_path = batch_path / "config.json"
+        config = batch_manager.get_config(batch_name).read()
 
         fields = None
         prompt_template = None
         provider = "openrouter"
         model = None
-        if config_path.exists():
-            with open(config_path, "r") as f:
-                config = json.load(f)
-                fields = config.get("fields")
-                prompt_template = config.get("prompt_template")
-                provider = config.get("provider", "openrouter")
-                model = config.get("model")
-
-        api_endpoint, model_name, api_key = _resolve_provider(provider, model)
+        bypass_cache = False
+        cards_per_request = None
+        execution_mode = "live"
+        fallback_providers: List[str] = []
+        priority = 0
+        weight = 1.0
+        if config:
+            fields = config.get("fields")
+            prompt_template = config.get("prompt_template")
+            provider = config.get("provider", "openrouter")
+            model = config.get("model")
+            bypass_cache = config.get("bypass_cache", False)
+            cards_per_request = config.get("cards_per_request")
+            execution_mode = config.get("execution_mode", "live")
+            fallback_providers = config.get("fallback_providers", [])
+            priority = config.get("priority", 0)
+            weight = config.get("weight", 1.0)
+
+        api_endpoint, model_name, api_key = resolve_provider(provider, model)
 
         # If retry_errors is True, move files back from _errors so ocr_engine can process them.
         if retry_errors:
             error_dir = batch_path / "_errors"
             if error_dir.exists():
+                moved = 0
                 for item in error_dir.iterdir():
                     if item.is_file():
                         shutil.move(str(item), str(batch_path / item.name))
-
-        await ocr_engine.process_batch(
-            batch_dir=batch_path,
-            fields=fields,
-            progress_callback=ws_manager.broadcast_progress,
-            resume=resume,
-            cancel_event=cancel_event,
-            prompt_template=prompt_template,
-            api_endpoint=api_endpoint,
-            model_name=model_name,
-            api_key=api_key,
-        )
+                        moved += 1
+                history_index.adjust(batch_name, files=moved, errors=-moved)
+
+        if execution_mode != "bulk" and settings.WORKER_MODE == "external" and job_id is not None:
+            # Worker processes run the cards; this process only observes the job
+            await ocr_engine.process_batch_distributed(
+                batch_dir=batch_path,
+                job_id=job_id,
+                progress_callback=ws_manager.broadcast_progress,
+                resume=resume,
+                cancel_event=cancel_event,
+            )
+        elif execution_mode == "bulk":
+            await ocr_engine.process_batch_bulk(
+                batch_dir=batch_path,
+                fields=fields,
+                progress_callback=ws_manager.broadcast_progress,
+                resume=resume,
+                cancel_event=cancel_event,
+                prompt_template=prompt_template,
+                api_endpoint=api_endpoint,
+                model_name=model_name,
+                api_key=api_key,
+                use_cache=not bypass_cache,
+            )
+        else:
+            await ocr_engine.process_batch(
+                batch_dir=batch_path,
+                fields=fields,
+                progress_callback=ws_manager.broadcast_progress,
+                resume=resume,
+                cancel_event=cancel_event,
+                prompt_template=prompt_template,
+                api_endpoint=api_endpoint,
+                model_name=model_name,
+                api_key=api_key,
+                use_cache=not bypass_cache,
+                cards_per_request=cards_per_request,
+                field_callback=ws_manager.broadcast_partial_result,
+                provider=provider,
+                fallback_routes=resolve_fallbacks(provider, fallback_providers),
+                priority=priority,
+                weight=weight,
+                job_id=job_id,
+            )
 
         # Mark as completed (or cancelled) in a final progress update
         last_state = ws_manager.batch_states.get(batch_name)
@@ -90,6 +142,7 @@ async def run_ocr_task(batch_name: str, resume: bool = True, retry_errors: bool
         # Persist final status to batches.json
         final_status = "cancelled" if cancel_event.is_set() else "completed"
         batch_manager.update_batch_status(batch_name, final_status)
+        return final_status
 
     except Exception as e:
         logger.exception(f"Error in background OCR task for {batch_name}: {e}")
@@ -112,17 +165,33 @@ async def run_ocr_task(batch_name: str, resume: bool = True, retry_errors: bool
             await ws_manager.broadcast_progress(batch_name, failed_state)
         # Persist failed status to batches.json
         batch_manager.update_batch_status(batch_name, "failed")
+        return "failed"
     finally:
         # Clean up cancel event after the task ends (success, cancel, or failure)
         ws_manager.clear_cancel_event(batch_name)
+        # Recount the batch once per run so the history index cannot drift across runs
+        try:
+            await asyncio.to_thread(history_index.reconcile_batch, batch_manager.get_batch_path(batch_name))
+        except Exception as e:
+            logger.warning(f"Failed to recount batch {batch_name} for the history index: {e}")
+
+
+def _enqueue_run(batch_name: str, retry_errors: bool = False) -> int:
+    """Queues a run of the batch in the job queue and wakes the runner."""
+    job_id = job_queue.enqueue(batch_name, retry_errors=retry_errors)
+    if batch_name not in ws_manager.cancel_events:
+        batch_manager.update_batch_status(batch_name, "queued")
+    job_runner.wake()
+    return job_id
 
 
 @router.post("/", response_model=BatchResponse)
-async def create_batch(batch_data: BatchCreate):
+async def create_batch(batch_data: BatchCreate, background_tasks: BackgroundTasks):
     """
     Creates a new batch from a list of files in a temporary session.
     Moves files from temp session to a permanent batch directory.
     Returns the generated batch name.
+    Resized images are pre-encoded in the background while the user configures the run.
     """
     try:
         batch_name = batch_manager.create_batch(
@@ -135,6 +204,9 @@ async def create_batch(batch_data: BatchCreate):
         batch_path = batch_manager.get_batch_path(batch_name)
         files_count = len([f for f in batch_path.iterdir() if f.is_file() and f.suffix.lower() in [".jpg", ".jpeg"]])
 
+        if settings.PREENCODE_ON_CREATE:
+            background_tasks.add_task(ocr_engine.warm_image_cache, batch_path)
+
         return BatchResponse(
             batch_name=batch_name,
             status="uploaded",
@@ -169,6 +241,10 @@ async def delete_batch(batch_name: str):
     Deletes a batch directory and removes its history entry.
     Returns 204 on success, 404 if batch not found.
     """
+    job_queue.request_cancel(batch_name)
+    ws_manager.cancel_batch(batch_name)
+    checkpoints.drop(batch_manager.get_batch_path(batch_name))
+    results_store.remove_batch(batch_name)
     deleted = batch_manager.delete_batch(batch_name)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Batch '{batch_name}' not found")
@@ -176,66 +252,180 @@ async def delete_batch(batch_name: str):
 
 
 @router.post("/{batch_name}/start")
-async def start_batch(batch_name: str, background_tasks: BackgroundTasks, body: BatchStartRequest = BatchStartRequest()):
+async def start_batch(batch_name: str, body: BatchStartRequest = BatchStartRequest()):
     """
     Starts OCR processing for a batch. Accepts optional provider selection in the request body.
+    The run is queued in the durable job queue and survives server restarts.
     """
     batch_path = batch_manager.get_batch_path(batch_name)
     if not batch_path.exists():
         raise HTTPException(status_code=404, detail="Batch not found")
 
     # Persist provider choice into config.json so run_ocr_task can pick it up
-    config_path = batch_path / "config.json"
-    if config_path.exists():
-        with open(config_path, "r") as f:
-            config = json.load(f)
-    else:
-        config = {}
-    config["provider"] = body.provider
-    if body.model:
-        config["model"] = body.model
-    with open(config_path, "w") as f:
-        json.dump(config, f, indent=2)
-
-    background_tasks.add_task(run_ocr_task, batch_name)
-    return {"message": "Batch processing started", "batch_name": batch_name, "provider": body.provider, "model": body.model}
+    def _apply(config: Dict[str, Any]) -> None:
+        config["provider"] = body.provider
+        if body.model:
+            config["model"] = body.model
+        config["bypass_cache"] = body.bypass_cache
+        config["cards_per_request"] = body.cards_per_request
+        config["execution_mode"] = body.execution_mode
+        config["fallback_providers"] = body.fallback_providers
+        config["priority"] = body.priority
+        config["weight"] = body.weight
+
+    config_doc = batch_manager.get_config(batch_name)
+    config_doc.update(_apply)
+    # Worker processes read config.json from disk
+    await asyncio.to_thread(config_doc.flush)
+
+    job_id = _enqueue_run(batch_name)
+    return {
+        "message": "Batch processing started",
+        "batch_name": batch_name,
+        "provider": body.provider,
+        "model": body.model,
+        "job_id": job_id,
+    }
+
+
+def _project(record: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keeps the requested keys ("success", "data.Signatur"); filename, _seq and _deleted always."""
+    out: Dict[str, Any] = {key: record[key] for key in ("filename", "_seq", "_deleted") if key in record}
+    for field in fields:
+        if field.startswith("data."):
+            data = record.get("data")
+            if isinstance(data, dict) and field[5:] in data:
+                out.setdefault("data", {})[field[5:]] = data[field[5:]]
+        elif field in record:
+            out[field] = record[field]
+    return out
+
+
+def _render_results(
+    store: CheckpointStore,
+    since: Optional[int],
+    offset: int,
+    limit: Optional[int],
+    fields: Optional[List[str]],
+    gzipped: bool,
+) -> Tuple[int, int, bool, bytes, bool]:
+    """(version, total records, full set, body, body is gzipped); runs off the event loop."""
+    version, records, full = store.read_since(since)
+    page = records[offset:offset + limit] if limit is not None else records[offset:]
+    if fields:
+        page = [_project(record, fields) for record in page]
+    body = json.dumps(page, ensure_ascii=False).encode("utf-8")
+    if gzipped and len(body) >= settings.RESULTS_GZIP_MIN_BYTES:
+        return version, len(records), full, gzip.compress(body, compresslevel=5), True
+    return version, len(records), full, body, False
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
 
 
 @router.get("/{batch_name}/results")
-async def get_batch_results(batch_name: str) -> List[Dict[str, Any]]:
+async def get_batch_results(
+    batch_name: str,
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Only records with a higher _seq, tombstones included"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=settings.RESULTS_PAGE_SIZE_MAX),
+    fields: Optional[str] = Query(None, description='Comma-separated keys, e.g. "success,error,data.Signatur"'),
+) -> Response:
     """
-    Returns the checkpoint.json contents for a batch as a JSON array.
+    Returns the checkpointed card results (snapshot + journal) for a batch as a JSON array.
     Returns an empty list if no checkpoint exists yet.
+
+    Every record carries its sequence number (_seq). With `since`, only records written
+    after that sequence number are returned, removed cards as {"filename", "_deleted"}.
+    If removals after `since` were already compacted away, all current results are
+    returned with X-Checkpoint-Full: true and replace what the client has.
+    X-Checkpoint-Version is the value to pass next time. The strong ETag changes with
+    the checkpoint version, so polling with If-None-Match gets 304 until a card finishes.
+    X-Total-Count is the number of records before offset/limit.
     """
     batch_path = batch_manager.get_batch_path(batch_name)
     if not batch_path.exists():
         raise HTTPException(status_code=404, detail="Batch not found")
 
-    checkpoint_path = batch_path / "checkpoint.json"
-    if not checkpoint_path.exists():
-        return []
+    store = checkpoints.get(batch_path)
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    variant = hashlib.sha1(f"{since}|{offset}|{limit}|{field_list}|{gzipped}".encode()).hexdigest()[:12]
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
 
     try:
-        with open(checkpoint_path, "r") as f:
-            data = json.load(f)
-        return data
+        version = await asyncio.to_thread(store.version)
+        etag = f'"{version}-{variant}"'
+        if _etag_matches(etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers={**headers, "ETag": etag, "X-Checkpoint-Version": str(version)})
+        version, total, full, body, encoded = await asyncio.to_thread(
+            _render_results, store, since, offset, limit, field_list, gzipped
+        )
     except Exception as e:
         logger.error(f"Failed to read checkpoint for batch {batch_name}: {e}")
         raise HTTPException(status_code=500, detail="Failed to read results")
 
+    headers.update({
+        "ETag": f'"{version}-{variant}"',
+        "X-Checkpoint-Version": str(version),
+        "X-Total-Count": str(total),
+    })
+    if since is not None and full:
+        headers["X-Checkpoint-Full"] = "true"
+    if encoded:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.post("/{batch_name}/cancel")
 async def cancel_batch(batch_name: str) -> Dict[str, str]:
     """
     Sets a cancellation flag that stops OCR after the current image completes.
-    Cancelling a non-running batch is a no-op.
+    Queued runs of the batch are dropped; cancelling a non-running batch is a no-op.
     """
     ws_manager.cancel_batch(batch_name)
+    if job_queue.request_cancel(batch_name)["queued_cancelled"] and batch_name not in ws_manager.cancel_events:
+        batch_manager.update_batch_status(batch_name, "cancelled")
     return {"message": "Cancel requested", "batch_name": batch_name}
 
 
+@router.put("/{batch_name}/schedule")
+async def update_schedule(batch_name: str, body: BatchScheduleUpdate) -> Dict[str, Any]:
+    """
+    Changes a batch's priority and/or weight in the card scheduler.
+    Takes effect immediately if the batch is running and is kept for later runs.
+    """
+    batch_path = batch_manager.get_batch_path(batch_name)
+    if not batch_path.exists():
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if body.weight is not None and body.weight <= 0:
+        raise HTTPException(status_code=422, detail="weight must be positive")
+
+    def _apply(config: Dict[str, Any]) -> Dict[str, Any]:
+        if body.priority is not None:
+            config["priority"] = body.priority
+        if body.weight is not None:
+            config["weight"] = body.weight
+        return dict(config)
+
+    config = batch_manager.get_config(batch_name).update(_apply)
+
+    running = card_scheduler.update(batch_name, weight=body.weight, priority=body.priority)
+    return {
+        "batch_name": batch_name,
+        "priority": config.get("priority", 0),
+        "weight": config.get("weight", 1.0),
+        "running": running,
+    }
+
+
 @router.post("/{batch_name}/retry-image/{filename}")
-async def retry_image(batch_name: str, filename: str, background_tasks: BackgroundTasks) -> Dict[str, str]:
+async def retry_image(batch_name: str, filename: str) -> Dict[str, Any]:
     """
     Moves a single failed file from _errors/ back to the batch directory,
     removes its checkpoint entry so it gets re-processed, and starts OCR.
@@ -250,28 +440,26 @@ async def retry_image(batch_name: str, filename: str, background_tasks: Backgrou
 
     # Move file back to batch directory
     shutil.move(str(error_file), str(batch_path / filename))
+    history_index.adjust(batch_name, files=1, errors=-1)
 
-    # Remove the entry from checkpoint.json so the image gets re-processed
-    checkpoint_path = batch_path / "checkpoint.json"
-    if checkpoint_path.exists():
-        try:
-            with open(checkpoint_path, "r") as f:
-                checkpoint_data = json.load(f)
-            checkpoint_data = [r for r in checkpoint_data if r.get("filename") != filename]
-            with open(checkpoint_path, "w") as f:
-                json.dump(checkpoint_data, f, indent=2)
-        except Exception as e:
-            logger.error(f"Failed to update checkpoint for retry of {filename}: {e}")
+    # Remove the checkpoint entry so the image gets re-processed
+    try:
+        store = checkpoints.get(batch_path)
+        await asyncio.to_thread(store.remove, filename)
+        await asyncio.to_thread(store.close)
+        await asyncio.to_thread(results_store.remove, batch_name, filename)
+    except Exception as e:
+        logger.error(f"Failed to update checkpoint for retry of {filename}: {e}")
 
     # Clear any stale cancel event so the retry doesn't abort immediately
     ws_manager.clear_cancel_event(batch_name)
 
-    background_tasks.add_task(run_ocr_task, batch_name)
-    return {"message": f"Retry started for {filename}", "batch_name": batch_name}
+    job_id = _enqueue_run(batch_name)
+    return {"message": f"Retry started for {filename}", "batch_name": batch_name, "job_id": job_id}
 
 
 @router.post("/{batch_name}/retry")
-async def retry_batch(batch_name: str, background_tasks: BackgroundTasks):
+async def retry_batch(batch_name: str):
     """
     Retries processing for failed cards in a batch.
     Moves files from _errors back to main batch dir and starts processing.
@@ -287,5 +475,5 @@ async def retry_batch(batch_name: str, background_tasks: BackgroundTasks):
     # Clear any stale cancel event before starting the retry
     ws_manager.clear_cancel_event(batch_name)
 
-    background_tasks.add_task(run_ocr_task, batch_name, retry_errors=True)
-    return {"message": "Retry processing started", "batch_name": batch_name}
+    job_id = _enqueue_run(batch_name, retry_errors=True)
+    return {"message": "Retry processing started", "batch_name": batch_name, "job_id": job_id}
@@ -1,9 +1,85 @@
 from fastapi import APIRouter
+from typing import Any, Callable, Dict, Tuple
 from app.models.schemas import HealthCheck
 from app.core.config import settings
+from app.services.circuit_breaker import circuit_breakers
+from app.services.hedging import hedging
+from app.services.history_index import history_index
+from app.services.job_queue import job_queue
+from app.services.job_runner import job_runner
+from app.services.metadata_store import metadata_store
+from app.services.results_store import results_store
+from app.services.scheduler import card_scheduler
+from app.services.structured_output import structured_output
+from app.services.upload_index import upload_index
 
 router = APIRouter()
 
 @router.get("/", response_model=HealthCheck)
 def get_health():
     return HealthCheck(status="OK", version=settings.VERSION)
+
+
+
+def _jobs_stats() -> Dict[str, Any]:
+    return {**job_queue.stats(), "runner": job_runner.stats()}
+
+
+# /health/<name>: the stats callable of a component and the endpoint's description
+DIAGNOSTICS: Dict[str, Tuple[Callable[[], Any], str]] = {
+    "parse-stats": (
+        structured_output.stats,
+        "Parse outcomes per provider endpoint, structured output vs. prompt-only JSON, incl. repaired answers.",
+    ),
+    "circuits": (
+        circuit_breakers.stats,
+        "Circuit-breaker state, rolling error rate and latency per provider endpoint.",
+    ),
+    "hedging": (
+        hedging.stats,
+        "Hedged requests per provider endpoint: requests, hedges sent and the current hedge delay.",
+    ),
+    "scheduler": (
+        card_scheduler.stats,
+        "Card-worker budget shared by all running batches and each batch's priority, weight and share.",
+    ),
+    "jobs": (
+        _jobs_stats,
+        "Durable job queue: jobs per status, queued and running jobs with lease and card-task counts.",
+    ),
+    "results": (
+        results_store.stats,
+        "Indexed results store: cards and batches, successes, errors per class and when checkpoints were imported.",
+    ),
+    "history-index": (
+        history_index.stats,
+        "Per-batch counters behind /history: batches, totals, pending write-behind and drift corrections.",
+    ),
+    "metadata": (
+        metadata_store.stats,
+        "Write-behind metadata documents (batches.json, config.json, history index): loaded, pending, flushes.",
+    ),
+    "uploads": (
+        upload_index.stats,
+        "Upload index: hashed files in sessions and batches, duplicate uploads skipped, backfill time.",
+    ),
+}
+
+
+@router.get("/diagnostics")
+def get_diagnostics() -> Dict[str, Any]:
+    """All of the /health/<name> diagnostics in one response, keyed by name."""
+    return {name: stats() for name, (stats, _) in DIAGNOSTICS.items()}
+
+
+def _add_diagnostics_route(name: str, stats: Callable[[], Any], description: str) -> None:
+    def endpoint() -> Any:
+        return stats()
+
+    router.add_api_route(
+        f"/{name}", endpoint, methods=["GET"], name=f"get_{name.replace('-', '_')}", description=description
+    )
+
+
+for _name, (_stats, _description) in DIAGNOSTICS.items():
+    _add_diagnostics_route(_name, _stats, _description)
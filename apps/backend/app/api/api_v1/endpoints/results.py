@@ -0,0 +1,51 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, List, Literal, Optional
+from app.core.config import settings
+from app.models.schemas import ResultsPage
+from app.services.results_store import results_store
+
+router = APIRouter()
+
+
+@router.get("/", response_model=ResultsPage)
+async def query_results(
+    batch: Optional[List[str]] = Query(None, description="Batch names; all batches if omitted"),
+    success: Optional[bool] = None,
+    failed_only: bool = False,
+    error_class: Optional[List[str]] = Query(None, description="e.g. rate_limit, parse, http_4xx, unavailable"),
+    signatur: Optional[Literal["valid", "invalid", "missing"]] = None,
+    has_validation_errors: Optional[bool] = None,
+    field: Optional[List[str]] = Query(None, description='Extracted-field filters as "Field:text", e.g. "Komponist:Bach"'),
+    q: Optional[str] = Query(None, description="Substring of the filename or any extracted value"),
+    sort: str = Query("filename", description="batch, filename, success, error_class, duration, updated_at or data.<Field>"),
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(100, ge=1, le=settings.RESULTS_PAGE_SIZE_MAX),
+    offset: int = Query(0, ge=0),
+) -> Dict[str, Any]:
+    """
+    Card results across batches, filtered, sorted and paginated on the server.
+    """
+    field_filters: Dict[str, str] = {}
+    for item in field or []:
+        name, sep, value = item.partition(":")
+        if not sep or not name:
+            raise HTTPException(status_code=422, detail=f"Invalid field filter '{item}', expected 'Field:text'")
+        field_filters[name] = value
+    try:
+        return await asyncio.to_thread(
+            results_store.query,
+            batch_names=batch,
+            success=False if failed_only else success,
+            error_classes=error_class,
+            signatur=signatur,
+            has_validation_errors=has_validation_errors,
+            field_filters=field_filters,
+            search=q,
+            sort=sort,
+            descending=order == "desc",
+            limit=limit,
+            offset=offset,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
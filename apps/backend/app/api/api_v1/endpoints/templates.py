@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, status
-from typing import List
+from typing import Any, Dict, List
+from app.services.structured_output import build_extraction_schema
 from app.services.template_service import template_service
 from app.models.schemas import Template, TemplateCreate, TemplateUpdate
 
@@ -22,6 +23,26 @@ async def get_template(template_id: str):
         raise HTTPException(status_code=404, detail="Template not found")
     return template
 
+@router.get("/{template_id}/schema")
+async def get_template_schema(template_id: str) -> Dict[str, Any]:
+    """
+    JSON Schema of a template's fields, as sent to providers with structured output.
+    """
+    template = template_service.get_template(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return build_extraction_schema(template.fields)
+
+@router.get("/{template_id}/prompt")
+async def get_template_prompt(template_id: str) -> Dict[str, str]:
+    """
+    The prompt sent with every card of a batch using this template.
+    """
+    prompt = template_service.get_prompt(template_id)
+    if prompt is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"prompt": prompt}
+
 @router.post("/", response_model=Template, status_code=status.HTTP_201_CREATED)
 async def create_template(template_in: TemplateCreate):
     """
@@ -1,40 +1,147 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import List, Optional
-import shutil
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+import asyncio
+import hashlib
+import logging
+import time
 
+import aiofiles
+import aiofiles.os
+
+from app.core.config import settings
 from app.services.batch_manager import batch_manager
-from app.models.schemas import UploadResponse
+from app.services.upload_index import INCOMING_DIR, upload_index
+from app.models.schemas import UploadResponse, UploadedFile
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+async def _upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(settings.UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+
+async def _request_chunks(request: Request) -> AsyncIterator[bytes]:
+    """The request body in UPLOAD_CHUNK_BYTES pieces (the server hands it over in small ones)."""
+    buffer = bytearray()
+    async for piece in request.stream():
+        buffer += piece
+        if len(buffer) >= settings.UPLOAD_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _store_file(
+    chunks: AsyncIterator[bytes], session_id: str, session_path: Path, name: str, skip_duplicates: bool
+) -> UploadedFile:
+    """Streams one file into the session, hashing it on the way.
+
+    The file is written to .incoming/ first and renamed into the session once its hash is
+    recorded; a duplicate of a file in this session or a batch is removed instead. The
+    event loop only hashes (one chunk at a time); writes run on aiofiles' threads.
+    """
+    incoming = session_path / INCOMING_DIR
+    await aiofiles.os.makedirs(incoming, exist_ok=True)
+    part_path = incoming / name
+    digest = hashlib.sha256()
+    size = 0
+    started = time.perf_counter()
+    try:
+        async with aiofiles.open(part_path, "wb") as out:
+            async for chunk in chunks:
+                digest.update(chunk)
+                await out.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        existing = await asyncio.to_thread(upload_index.claim, session_id, name, sha256, size, skip_duplicates)
+        if existing is not None:
+            await aiofiles.os.remove(part_path)
+        else:
+            await aiofiles.os.replace(part_path, session_path / name)
+    except BaseException:
+        if part_path.exists():
+            part_path.unlink()
+        raise
+    seconds = time.perf_counter() - started
+    return UploadedFile(
+        filename=name,
+        size=size,
+        sha256=sha256,
+        seconds=round(seconds, 4),
+        mb_per_second=round(size / 1e6 / seconds, 2) if seconds > 0 else 0.0,
+        duplicate_of=f"{existing['location']}/{existing['owner']}/{existing['filename']}" if existing else None,
+    )
+
+
+def _response(session_id: str, results: List[UploadedFile]) -> UploadResponse:
+    stored = [r for r in results if r.duplicate_of is None]
+    skipped = [r for r in results if r.duplicate_of is not None]
+    total_bytes = sum(r.size for r in results)
+    total_seconds = sum(r.seconds for r in results)
+    if results:
+        logger.info(
+            f"Upload session {session_id}: {len(stored)} stored, {len(skipped)} duplicates skipped, "
+            f"{total_bytes / 1e6:.1f} MB at {total_bytes / 1e6 / max(total_seconds, 1e-6):.1f} MB/s"
+        )
+    message = f"Successfully uploaded {len(stored)} files."
+    if skipped:
+        message += f" Skipped {len(skipped)} duplicate(s)."
+    return UploadResponse(
+        session_id=session_id,
+        filenames=[r.filename for r in stored],
+        message=message,
+        files=stored,
+        skipped=skipped,
+    )
+
 
 @router.post("/", response_model=UploadResponse)
 async def upload_files(
     files: List[UploadFile] = File(...),
-    session_id: Optional[str] = Form(None)
+    session_id: Optional[str] = Form(None),
+    skip_duplicates: bool = Form(True),
 ):
     """
     Upload multiple images to a temporary session.
     If session_id is not provided, a new one is generated.
-    Returns session_id and filenames.
+    Files whose content is already in the session or an earlier batch are skipped
+    unless skip_duplicates is false.
+    Returns session_id and filenames, plus size, SHA-256 and ingest throughput per file.
     """
     if not session_id:
         session_id = batch_manager.generate_session_id()
 
     temp_session_path = batch_manager.get_temp_session_path(session_id)
-    filenames: list[str] = []
+    results: List[UploadedFile] = []
 
     for file in files:
-        name = file.filename or f"unnamed_{len(filenames)}"
-        file_path = temp_session_path / name
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        filenames.append(name)
+        name = Path(file.filename or "").name or f"unnamed_{len(results)}"
+        results.append(await _store_file(_upload_chunks(file), session_id, temp_session_path, name, skip_duplicates))
 
-    return UploadResponse(
-        session_id=session_id,
-        filenames=filenames,
-        message=f"Successfully uploaded {len(filenames)} files."
-    )
+    return _response(session_id, results)
+
+
+@router.put("/{session_id}/files/{filename}", response_model=UploadResponse)
+async def upload_file_stream(
+    session_id: str,
+    filename: str,
+    request: Request,
+    skip_duplicates: bool = True,
+):
+    """
+    Upload one image as the raw request body, streamed to disk without multipart buffering.
+    The session is created if it does not exist yet.
+    """
+    name = Path(filename).name
+    if not name or name != filename or Path(session_id).name != session_id:
+        raise HTTPException(status_code=422, detail=f"Invalid upload path '{session_id}/{filename}'")
+    temp_session_path = batch_manager.get_temp_session_path(session_id)
+    result = await _store_file(_request_chunks(request), session_id, temp_session_path, name, skip_duplicates)
+    return _response(session_id, [result])
 
 
 @router.delete("/{session_id}", status_code=204)
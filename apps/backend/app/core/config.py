@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -14,6 +14,8 @@ class Settings(BaseSettings):
     BATCHES_DIR: str = os.path.join(DATA_DIR, "batches")
     TEMPLATES_FILE: str = os.path.join(DATA_DIR, "templates.json")
     BATCHES_HISTORY_FILE: str = os.path.join(DATA_DIR, "batches.json")
+    HISTORY_INDEX_FILE: str = os.path.join(DATA_DIR, "history_index.json")
+    METADATA_FLUSH_SECONDS: float = 0.5  # write-behind delay of batches.json, config.json and the history index
     OUTPUT_BASE: str = "output_batches"
     
     # API Configuration — OpenRouter (default)
@@ -32,6 +34,137 @@ class Settings(BaseSettings):
     MAX_RETRIES: int = 4
     RETRY_DELAY_BASE: float = 1.0
     BATCH_SIZE_HINT: int = 500
+    REQUEST_TIMEOUT: float = 120.0
+    TEMPERATURE: float = 0.1
+    MAX_TOKENS: int = 4096
+
+    # Engine mode: "threaded" (requests + thread pool) or "async" (httpx on the event loop).
+    # Requests in flight are bounded by the smallest of ASYNC_MAX_IN_FLIGHT (async mode's
+    # connection pool), SCHEDULER_MAX_WORKERS (all batches) and, per endpoint,
+    # CONCURRENCY_MAX and RATE_LIMIT_MAX_CONCURRENT; a run starts no more network workers
+    # than that. Raise SCHEDULER_MAX_WORKERS together with the per-endpoint limits.
+    ENGINE_MODE: str = "threaded"
+    ASYNC_MAX_IN_FLIGHT: int = 200
+
+    # Structured output: send a JSON Schema of the fields as response_format.
+    # "auto" uses it until a provider rejects it, "on" always, "off" never (prompt-only JSON)
+    STRUCTURED_OUTPUT: str = "auto"
+
+    # Unparseable answers are repaired locally first; if that fails, ask the model once
+    # (text only, no image) to fix its own JSON before the card counts as failed
+    JSON_FIX_FOLLOWUP: bool = True
+
+    # Stream completions (SSE): push fields as they close and stop reading at the closing brace
+    STREAM_COMPLETIONS: bool = False
+
+    # Multi-card requests: pack up to N prepared cards into one VLM call (1 = one card per call)
+    CARDS_PER_REQUEST: int = 1
+    MULTI_CARD_MAX_TOKENS: int = 16384  # output cap for a packed request (MAX_TOKENS per card up to this)
+    MULTI_CARD_WAIT: float = 0.5  # seconds a partly filled pack waits for the next prepared card
+
+    # Bulk mode: overnight runs through an OpenAI-style batch API instead of live requests
+    BULK_API_BASE: Optional[str] = None  # None → provider endpoint without /chat/completions
+    BULK_ENDPOINT: str = "/v1/chat/completions"  # endpoint each batch job runs against
+    BULK_COMPLETION_WINDOW: str = "24h"
+    BULK_POLL_INTERVAL: float = 60.0
+    BULK_MAX_REQUESTS_PER_FILE: int = 50000
+    BULK_MAX_FILE_BYTES: int = 190 * 1024 * 1024  # providers cap input files at 200 MB
+
+    # Adaptive (AIMD) concurrency per provider endpoint; starts at MAX_WORKERS
+    ADAPTIVE_CONCURRENCY: bool = True
+    CONCURRENCY_MIN: int = 1
+    CONCURRENCY_MAX: int = 32
+    CONCURRENCY_DECREASE: float = 0.5
+    CONCURRENCY_LATENCY_TOLERANCE: float = 2.0
+
+    # Circuit breaker per provider endpoint: opens at CIRCUIT_ERROR_RATE failures among the
+    # requests of the last CIRCUIT_WINDOW_SECONDS (at least CIRCUIT_MIN_REQUESTS), reroutes
+    # cards to the batch's fallback providers for CIRCUIT_OPEN_SECONDS, then probes again
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_WINDOW_SECONDS: float = 60.0
+    CIRCUIT_MIN_REQUESTS: int = 5
+    CIRCUIT_ERROR_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 0.0  # successes slower than this count as failures, 0 = off
+    CIRCUIT_OPEN_SECONDS: float = 30.0
+    CIRCUIT_HALF_OPEN_PROBES: int = 1
+
+    # Process-wide card scheduler: at most SCHEDULER_MAX_WORKERS card requests in flight
+    # across all running batches, shared by priority and weighted fair queuing
+    SCHEDULER_MAX_WORKERS: int = 32
+    SCHEDULER_LARGEST_FIRST: bool = True  # send a batch's largest images first (shorter makespan)
+
+    # Durable job queue (SQLite): batch runs are leased by a runner that renews the lease
+    # every JOB_HEARTBEAT_SECONDS; runs whose lease expired (crash, restart) are resumed
+    JOB_QUEUE_DB: str = os.path.join(DATA_DIR, "jobs.sqlite3")
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_HEARTBEAT_SECONDS: float = 10.0
+    JOB_POLL_SECONDS: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 3  # leases a run may lose before it is marked failed
+    JOB_MAX_CONCURRENT: int = 4  # batch runs per runner process
+
+    # "embedded": the API process runs the OCR of its jobs itself. "external": the API only
+    # splits jobs into card tasks and observes; `python -m app.worker` processes run the cards
+    WORKER_MODE: str = "embedded"
+    WORKER_THREADS: int = 8  # cards in flight per worker process
+    WORKER_POLL_SECONDS: float = 0.5  # idle workers and the observing API poll the queue this often
+
+    # Hedged requests: a card still unanswered after the provider's rolling HEDGE_QUANTILE
+    # latency gets a duplicate request, the first answer wins. Hedges are capped at
+    # HEDGE_BUDGET_PERCENT of the requests sent to the endpoint
+    HEDGE_REQUESTS: bool = False
+    HEDGE_QUANTILE: float = 0.95
+    HEDGE_BUDGET_PERCENT: float = 5.0
+    HEDGE_MIN_SAMPLES: int = 20  # latencies needed before hedging starts
+    HEDGE_WINDOW: int = 500  # rolling number of latencies the quantile is taken from
+
+    # Global rate limit per (endpoint, API key), shared by all running batches
+    RATE_LIMIT_RPM: int = 0  # requests per minute, 0 = unlimited
+    RATE_LIMIT_MAX_CONCURRENT: int = 32
+    RATE_LIMIT_BURST: int = 0  # token bucket size, 0 = RATE_LIMIT_MAX_CONCURRENT
+
+    # Card results per batch: checkpoint.json snapshot + append-only journal, fsynced every
+    # CHECKPOINT_FSYNC_EVERY records or CHECKPOINT_FSYNC_SECONDS and compacted into the
+    # snapshot once it holds as many records as the snapshot (at least CHECKPOINT_COMPACT_MIN)
+    CHECKPOINT_FSYNC_EVERY: int = 50
+    CHECKPOINT_FSYNC_SECONDS: float = 1.0
+    CHECKPOINT_COMPACT_MIN: int = 1000
+
+    # Card results of all batches in SQLite for server-side filtering, sorting and paging
+    RESULTS_DB: str = os.path.join(DATA_DIR, "results.sqlite3")
+    RESULTS_PAGE_SIZE_MAX: int = 500
+    RESULTS_GZIP_MIN_BYTES: int = 1024  # smaller /results bodies are sent uncompressed
+
+    # Uploads are streamed to disk in UPLOAD_CHUNK_BYTES pieces and hashed on the way;
+    # content hashes of session and batch images live in UPLOAD_INDEX_DB for dedupe
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    UPLOAD_INDEX_DB: str = os.path.join(DATA_DIR, "uploads.sqlite3")
+
+    # Per-batch counters behind /history; idle batches are recounted from disk every
+    # HISTORY_RECONCILE_SECONDS
+    HISTORY_RECONCILE_SECONDS: float = 300.0
+
+    # Content-addressed cache of parsed model answers (image hash, prompt, model, size, temperature)
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_DIR: str = os.path.join(DATA_DIR, "cache", "extractions")
+    EXTRACTION_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Resized + base64-encoded images cached per batch in <batch>/_encoded/
+    ENCODED_IMAGE_CACHE_ENABLED: bool = True
+    PREENCODE_ON_CREATE: bool = True
+    JPEG_QUALITY: int = 85
+    FAST_RESIZE: bool = True  # JPEG draft (DCT-scaled) decoding before the final resample
+
+    # Optional scanner-bed border cropping before resize (see image_prep.find_card_bounds)
+    CROP_BORDERS: bool = False
+    CROP_THRESHOLD: int = 30  # grey-level distance from the background that counts as card
+    CROP_MIN_FILL: float = 0.02  # min share of card pixels for a row/column to belong to the card
+    CROP_PADDING: float = 0.01  # margin kept around the detected card, relative to the short side
+    CROP_MIN_AREA: float = 0.2  # reject detections keeping less than this share of the scan
+
+    # Image preparation stage (decode/resize/encode) ahead of the network stage
+    PREP_USE_PROCESSES: bool = True
+    PREP_WORKERS: int = max(1, (os.cpu_count() or 2) // 2)
+    PREP_QUEUE_DEPTH: int = 8
 
     # Extraction Configuration
     FIELD_KEYS: List[str] = [
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -16,8 +17,37 @@ async def lifespan(app: FastAPI):
     cleaned = batch_manager.cleanup_stale_sessions()
     if cleaned > 0:
         logger.info(f"Cleaned up {cleaned} stale temp session(s)")
+    from app.services.job_queue import job_queue
+    recovered = batch_manager.recover_history(job_queue.latest_statuses())
+    if recovered > 0:
+        logger.warning(f"Repaired {recovered} batch history entr(ies) after an unclean shutdown")
+
+    # Resume batch runs interrupted by the last shutdown and claim queued ones
+    from app.api.api_v1.endpoints.batches import run_ocr_task
+    from app.services.job_runner import job_runner
+    job_runner.start(run_ocr_task)
+
+    # Index the results of batches that predate the results store (once per database)
+    from app.services.results_store import results_store
+    import_task = asyncio.create_task(asyncio.to_thread(results_store.import_checkpoints, batch_manager.batches_dir))
+
+    # Hash the images of batches that predate the upload index, for duplicate detection (once)
+    from app.services.upload_index import upload_index
+    backfill_task = asyncio.create_task(asyncio.to_thread(upload_index.backfill))
+
+    # Write-behind and drift correction of the per-batch counters behind /history, once the
+    # import has the success counts of the old batches
+    from app.services.history_index import history_index
+    history_index.start(batch_manager.batches_dir, results_store.success_counts, after=import_task)
     yield
-    # Shutdown: nothing needed
+    # Shutdown: stop claiming; unfinished runs are resumed by the next start
+    await job_runner.stop()
+    await asyncio.gather(import_task, backfill_task, return_exceptions=True)
+    await history_index.stop()
+    from app.services.checkpoint import checkpoints
+    await asyncio.to_thread(checkpoints.close_all)
+    from app.services.metadata_store import metadata_store
+    await asyncio.to_thread(metadata_store.flush_all)
 
 
 app = FastAPI(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 
 class HealthCheck(BaseModel):
     status: str
@@ -14,6 +14,8 @@ class BatchHistoryItem(BaseModel):
     fields: List[str]
     has_errors: bool = False
     error_count: int = 0
+    success_count: int = 0  # successful cards in the checkpoint
+    updated_at: Optional[float] = None  # last change of the batch's counters or status (epoch seconds)
 
 class ExtractionResult(BaseModel):
     filename: str
@@ -22,6 +24,7 @@ class ExtractionResult(BaseModel):
     data: Optional[Dict[str, str]] = None
     error: Optional[str] = None
     duration: float
+    provider: Optional[str] = None  # Provider of the batch's fallback chain that answered the card
 
 class BatchConfig(BaseModel):
     fields: List[str]
@@ -45,10 +48,20 @@ class BatchHistory(BaseModel):
     files_count: int
     fields: List[str]
 
+class UploadedFile(BaseModel):
+    filename: str
+    size: int
+    sha256: str
+    seconds: float
+    mb_per_second: float
+    duplicate_of: Optional[str] = None  # "batch/<name>/<file>" or "session/<id>/<file>" if skipped
+
 class UploadResponse(BaseModel):
     session_id: str
-    filenames: List[str]
+    filenames: List[str]  # files stored in the session (duplicates skipped are not)
     message: str
+    files: List[UploadedFile] = []
+    skipped: List[UploadedFile] = []
 
 class Template(BaseModel):
     id: str
@@ -75,7 +88,35 @@ class BatchProgress(BaseModel):
     last_result: Optional[ExtractionResult] = None
     status: str # "running", "completed", "failed", "retrying"
     error: Optional[str] = None  # Human-readable error message for "failed" status
+    concurrency_limit: Optional[int] = None  # Current adaptive in-flight limit for the provider endpoint
+    cache_hits: Optional[int] = None  # Cards answered from the extraction cache in this run
+    cache_misses: Optional[int] = None  # Cards that needed a VLM call in this run
+    queue_depth: Optional[int] = None  # Prepared images waiting for the network stage
+    prep_seconds_avg: Optional[float] = None  # Mean decode/resize/encode time per card
+    network_seconds_avg: Optional[float] = None  # Mean API time per card
+    upload_bytes_before: Optional[int] = None  # Image bytes this run would have sent without cropping
+    upload_bytes_after: Optional[int] = None  # Image bytes actually sent after border cropping
+    cards_per_minute: Optional[float] = None  # Throughput of this run so far
+    prompt_tokens_per_card: Optional[float] = None  # Provider-reported prompt tokens, averaged per card
+    latency: Optional[Dict[str, Any]] = None  # Final update only: p50/p95/p99 of the single-card requests with and without hedging
+    parse_stats: Optional[Dict[str, Any]] = None  # Final update only: JSON parse outcomes and failure rates of the run's answers
 
 class BatchStartRequest(BaseModel):
     provider: str = "openrouter"  # "openrouter" | "ollama"
     model: Optional[str] = None   # None → provider default
+    bypass_cache: bool = False    # True → always call the VLM, ignore cached extractions
+    cards_per_request: Optional[int] = None  # None → CARDS_PER_REQUEST setting
+    execution_mode: str = "live"  # "live" | "bulk" (provider batch API, done within BULK_COMPLETION_WINDOW)
+    fallback_providers: List[str] = []  # tried in order when the provider is unavailable, e.g. ["ollama"]
+    priority: int = 0    # higher priorities get free worker slots first
+    weight: float = 1.0  # share of the worker budget among batches of the same priority
+
+class BatchScheduleUpdate(BaseModel):
+    priority: Optional[int] = None
+    weight: Optional[float] = None
+
+class ResultsPage(BaseModel):
+    total: int  # matching cards across all pages
+    limit: int
+    offset: int
+    items: List[Dict[str, Any]]  # card results as in the checkpoint, plus batch and error_class
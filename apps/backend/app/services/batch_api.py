@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Batch states after which the provider no longer changes the job
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchApiError(Exception):
+    """The batch endpoint rejected a request or answered with something unusable."""
+
+
+class BatchApiClient:
+    """Minimal client for an OpenAI-style batch API (/files and /batches endpoints).
+
+    Flow: upload a JSONL file of requests (purpose "batch"), create a batch job for it,
+    poll the job until it reaches a terminal state, then download its output file.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, base_url: str, api_key: str) -> None:
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        resp = await self.client.request(method, f"{self.base_url}{path}", headers=self.headers, **kwargs)
+        if resp.status_code >= 400:
+            raise BatchApiError(f"{method} {path}: HTTP {resp.status_code}: {resp.text[:250].strip()}")
+        return resp
+
+    async def _json(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        resp = await self._request(method, path, **kwargs)
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise BatchApiError(f"{method} {path}: invalid JSON response") from e
+
+    async def upload_file(self, path: Path) -> str:
+        """Uploads a JSONL request file; returns its file id.
+
+        The file is read in a worker thread (it is capped at BULK_MAX_FILE_BYTES), since
+        httpx would read an open file object synchronously on the event loop.
+        """
+        content = await asyncio.to_thread(path.read_bytes)
+        result = await self._json(
+            "POST", "/files",
+            data={"purpose": "batch"},
+            files={"file": (path.name, content, "application/jsonl")},
+        )
+        if "id" not in result:
+            raise BatchApiError(f"Upload of {path.name} returned no file id")
+        return result["id"]
+
+    async def create_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Dict[str, Any]:
+        result = await self._json(
+            "POST", "/batches",
+            json={"input_file_id": input_file_id, "endpoint": endpoint, "completion_window": completion_window},
+        )
+        if "id" not in result:
+            raise BatchApiError("Batch creation returned no batch id")
+        return result
+
+    async def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        return await self._json("GET", f"/batches/{batch_id}")
+
+    async def cancel_batch(self, batch_id: str) -> Dict[str, Any]:
+        return await self._json("POST", f"/batches/{batch_id}/cancel")
+
+    async def download_file(self, file_id: Optional[str], dest: Path) -> bool:
+        """Streams a file's content to dest; returns False if there is no such file."""
+        if not file_id:
+            return False
+        tmp = dest.with_suffix(dest.suffix + ".part")
+        async with self.client.stream("GET", f"{self.base_url}/files/{file_id}/content", headers=self.headers) as resp:
+            if resp.status_code >= 400:
+                await resp.aread()
+                raise BatchApiError(f"Download of {file_id}: HTTP {resp.status_code}: {resp.text[:250].strip()}")
+            # File operations run in worker threads to keep the event loop free
+            f = await asyncio.to_thread(open, tmp, "wb")
+            try:
+                async for chunk in resp.aiter_bytes():
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+        await asyncio.to_thread(tmp.replace, dest)
+        return True
@@ -1,18 +1,22 @@
-import json
 import re
 import shutil
 import time
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.core.config import settings
+from app.services.history_index import IMAGE_EXTENSIONS, history_index
+from app.services.metadata_store import JsonDocument, metadata_store
+from app.services.results_store import results_store
+from app.services.upload_index import upload_index
 
 class BatchManager:
     def __init__(self, data_dir: str = settings.DATA_DIR):
         self.data_dir = Path(data_dir)
         self.temp_dir = Path(settings.TEMP_DIR)
         self.batches_dir = Path(settings.BATCHES_DIR)
+        self.history = metadata_store.document(Path(settings.BATCHES_HISTORY_FILE), list)
         
         # Ensure directories exist
         self.temp_dir.mkdir(parents=True, exist_ok=True)
@@ -33,7 +37,7 @@ class BatchManager:
         Naming convention: [Custom Name]_[Human Readable Timestamp]_[Unique ID]
         """
         temp_path = self.get_temp_session_path(session_id)
-        if not temp_path.exists() or not any(temp_path.iterdir()):
+        if not temp_path.exists() or not any(item.is_file() for item in temp_path.iterdir()):
             raise ValueError(f"No files found for session {session_id}")
 
         # Sanitize custom_name: replace characters illegal on Windows (< > : " / \ | ? *)
@@ -52,107 +56,116 @@ class BatchManager:
             "prompt_template": prompt_template,
             "created_at": datetime.now().isoformat()
         }
-        with open(batch_path / "config.json", "w") as f:
-            json.dump(config_data, f, indent=2)
+        self.get_config(batch_name).update(lambda config: config.update(config_data))
 
         # Move files
+        images = 0
         for item in temp_path.iterdir():
             if item.is_file():
                 shutil.move(str(item), str(batch_path / item.name))
+                images += item.suffix.lower() in IMAGE_EXTENSIONS
 
         # Cleanup temp session directory
         shutil.rmtree(str(temp_path))
+        upload_index.assign(session_id, batch_name)
 
         # Record History
         self._record_history(batch_name, custom_name, fields)
+        history_index.create(batch_name, files=images)
 
         return batch_name
 
+    def get_config(self, batch_name: str) -> JsonDocument:
+        """The batch's config.json (fields, prompt, provider choice, schedule)."""
+        return metadata_store.document(self.get_batch_path(batch_name) / "config.json")
+
     def _record_history(self, batch_name: str, custom_name: str, fields: Optional[List[str]] = None):
-        history_file = Path(settings.BATCHES_HISTORY_FILE)
-        history = []
-        if history_file.exists():
-            try:
-                with open(history_file, "r") as f:
-                    history = json.load(f)
-            except Exception:
-                history = []
-        
-        history.append({
+        self.history.update(lambda history: history.append({
             "batch_name": batch_name,
             "custom_name": custom_name,
             "created_at": datetime.now().isoformat(),
             "status": "uploaded",
             "progress": 0,
             "fields": fields or settings.FIELD_KEYS
-        })
-        
-        with open(history_file, "w") as f:
-            json.dump(history, f, indent=2)
+        }))
 
     def update_batch_status(self, batch_name: str, status: str) -> None:
         """Update the status field of a batch in batches.json."""
-        history_file = Path(settings.BATCHES_HISTORY_FILE)
-        if not history_file.exists():
-            return
-        try:
-            with open(history_file, "r") as f:
-                history = json.load(f)
+        history_index.update(batch_name, status=status)
+
+        def _set_status(history: list) -> None:
             for entry in history:
                 if entry.get("batch_name") == batch_name:
                     entry["status"] = status
                     break
-            with open(history_file, "w") as f:
-                json.dump(history, f, indent=2)
-        except Exception:
-            pass  # non-critical — status display is cosmetic
+
+        self.history.update(_set_status)
+
+    def recover_history(self, job_statuses: Optional[Dict[str, str]] = None) -> int:
+        """Repairs the history after a crash that lost write-behind changes; returns the
+        number of entries added or corrected.
+
+        Batches with a directory but no entry are re-added from their config.json. With
+        job_statuses (latest job status per batch), entries still shown as queued or
+        running get the final status of their last job.
+        """
+        history = self.history.read()
+        known = {entry.get("batch_name") for entry in history}
+        corrected = 0
+        for entry in history:
+            job_status = (job_statuses or {}).get(entry.get("batch_name", ""))
+            if entry.get("status") in ("queued", "running") and job_status in ("completed", "cancelled", "failed"):
+                self.update_batch_status(entry["batch_name"], job_status)
+                corrected += 1
+        missing = [d for d in sorted(self.batches_dir.iterdir()) if d.is_dir() and d.name not in known]
+        recovered = []
+        for batch_path in missing:
+            config = self.get_config(batch_path.name).read()
+            counters = history_index.get(batch_path.name) or {}
+            recovered.append({
+                "batch_name": batch_path.name,
+                "custom_name": config.get("custom_name", batch_path.name),
+                "created_at": config.get("created_at", datetime.fromtimestamp(batch_path.stat().st_mtime).isoformat()),
+                "status": counters.get("status", "uploaded"),
+                "progress": 0,
+                "fields": config.get("fields", settings.FIELD_KEYS),
+            })
+        if recovered:
+            self.history.update(lambda history: history.extend(recovered))
+        if recovered or corrected:
+            self.history.flush()
+        return len(recovered) + corrected
 
     def get_history(self) -> list:
-        """Read batches.json and return enriched batch history entries."""
-        history_file = Path(settings.BATCHES_HISTORY_FILE)
-        if not history_file.exists():
-            return []
+        """Return batch history entries (batches.json) enriched from the history index.
 
-        try:
-            with open(history_file, "r") as f:
-                history = json.load(f)
-        except Exception:
-            return []
+        Batches not in the index yet (created before it) are counted from disk once.
+        """
+        history = self.history.read()
+        index = history_index.all()
 
-        image_extensions = {".jpg", ".jpeg", ".png", ".tiff", ".tif"}
         enriched = []
         for entry in history:
             batch_name = entry.get("batch_name", "")
-            batch_path = self.batches_dir / batch_name
-
-            # files_count: count image files live if directory exists, else use stored value
-            if batch_path.exists():
-                files_count = len([
-                    f for f in batch_path.iterdir()
-                    if f.is_file() and f.suffix.lower() in image_extensions
-                ])
-            else:
-                files_count = entry.get("files_count", 0)
-
-            # has_errors / error_count
-            error_dir = batch_path / "_errors"
-            if error_dir.exists():
-                error_files = [f for f in error_dir.iterdir() if f.is_file()]
-                has_errors = len(error_files) > 0
-                error_count = len(error_files)
-            else:
-                has_errors = False
-                error_count = 0
+            counters = index.get(batch_name)
+            if counters is None and batch_name:
+                successes = results_store.success_counts(batch_name).get(batch_name, 0)
+                counters = history_index.reconcile_batch(self.batches_dir / batch_name, successes)
+            if counters is None:
+                # Directory is gone: use the stored value
+                counters = {"files": entry.get("files_count", 0), "errors": 0, "successes": 0}
 
             enriched.append({
                 "batch_name": batch_name,
                 "custom_name": entry.get("custom_name", batch_name),
                 "created_at": entry.get("created_at", ""),
                 "status": entry.get("status", "uploaded"),
-                "files_count": files_count,
+                "files_count": counters["files"],
                 "fields": entry.get("fields", []),
-                "has_errors": has_errors,
-                "error_count": error_count,
+                "has_errors": counters["errors"] > 0,
+                "error_count": counters["errors"],
+                "success_count": counters["successes"],
+                "updated_at": counters.get("updated_at"),
             })
 
         return enriched
@@ -161,33 +174,25 @@ class BatchManager:
         """Delete a batch directory and remove its entry from batches.json.
         Returns True if found and deleted, False if not found."""
         batch_path = self.batches_dir / batch_name
-        history_file = Path(settings.BATCHES_HISTORY_FILE)
 
-        # Load history
-        history = []
-        if history_file.exists():
-            try:
-                with open(history_file, "r") as f:
-                    history = json.load(f)
-            except Exception:
-                history = []
+        def _remove_entry(history: list) -> bool:
+            original_length = len(history)
+            history[:] = [e for e in history if e.get("batch_name") != batch_name]
+            return len(history) < original_length
 
         # Check if batch exists in history or on disk
-        original_length = len(history)
-        history = [e for e in history if e.get("batch_name") != batch_name]
-        found_in_history = len(history) < original_length
+        found_in_history = self.history.update(_remove_entry)
         found_on_disk = batch_path.exists()
 
         if not found_in_history and not found_on_disk:
             return False
 
         # Delete directory if it exists
+        metadata_store.drop(batch_path / "config.json")
         if found_on_disk:
             shutil.rmtree(str(batch_path))
-
-        # Save updated history
-        with open(history_file, "w") as f:
-            json.dump(history, f, indent=2)
+        history_index.remove(batch_name)
+        upload_index.remove_batch(batch_name)
 
         return True
 
@@ -205,6 +210,7 @@ class BatchManager:
                     age = now - entry.stat().st_mtime
                     if age > max_age_seconds:
                         shutil.rmtree(str(entry))
+                        upload_index.remove_session(entry.name)
                         cleaned += 1
                 except OSError:
                     pass
@@ -216,6 +222,7 @@ class BatchManager:
         session_path = self.temp_dir / session_id
         if session_path.exists():
             shutil.rmtree(str(session_path))
+            upload_index.remove_session(session_id)
             return True
         return False
 
@@ -0,0 +1,322 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.metadata_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = "checkpoint.json"
+JOURNAL_NAME = "checkpoint.journal.jsonl"
+META_NAME = "checkpoint.meta.json"
+
+
+def _is_success(record: Dict[str, Any]) -> bool:
+    return bool(record.get("success")) and not record.get("_deleted")
+
+
+class CheckpointStore:
+    """Card results of one batch: a snapshot (checkpoint.json) plus an append-only journal.
+
+    Each finished card is appended to checkpoint.journal.jsonl as one JSON line and
+    flushed, so a crashed process loses nothing; the journal is fsynced every
+    CHECKPOINT_FSYNC_EVERY records or CHECKPOINT_FSYNC_SECONDS, whichever comes first.
+    Once the journal holds as many records as the snapshot had when it was written (at
+    least CHECKPOINT_COMPACT_MIN), it is compacted: the merged state is written to a
+    temp file, fsynced and renamed over checkpoint.json, then the journal is truncated.
+    The snapshot thus at least doubles between compactions (10k cards: compactions at
+    1k, 2k, 4k and 8k records plus one at close), which keeps the bytes written linear
+    and the journal no longer than the snapshot.
+    Readers take snapshot + journal, the last record of a filename wins and a torn last
+    line is ignored, so replaying a journal that already went into the snapshot is
+    harmless.
+
+    Every record carries a per-batch sequence number (_seq); the highest one is the
+    checkpoint's version. Removals are journaled as tombstones ({"filename",
+    "_deleted", "_seq"}) so readers polling with `since` learn about them. Compaction
+    drops the tombstones, so checkpoint.json only ever holds current results; the
+    version and the highest dropped _seq are kept in checkpoint.meta.json. A reader
+    whose `since` is older than that gets the full set instead of a delta (read_since).
+    Results written before sequence numbers count as _seq 0.
+    """
+
+    def __init__(self, batch_dir: Path) -> None:
+        self.batch_dir = batch_dir
+        self.snapshot_path = batch_dir / SNAPSHOT_NAME
+        self.journal_path = batch_dir / JOURNAL_NAME
+        self.meta_path = batch_dir / META_NAME
+        self._state: Optional[Dict[str, Dict[str, Any]]] = None  # loaded while a run writes
+        self._version = 0
+        self._pruned = 0  # highest _seq of a tombstone dropped by compaction
+        self._successes = 0
+        self._disk_version: Optional[Tuple[Tuple[int, int, int, int], int]] = None  # (file stats, version)
+        self._journal: Optional[Any] = None
+        self._journal_records = 0
+        self._journal_bytes = 0  # length of the journal up to its last complete record
+        self._snapshot_records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    # --- reading ----------------------------------------------------------
+
+    def _read_disk(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot + journal incl. tombstones; sets the version."""
+        state: Dict[str, Dict[str, Any]] = {}
+        meta: Dict[str, Any] = {}
+        if self.meta_path.exists():
+            try:
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except ValueError as e:
+                logger.error(f"Ignoring unreadable {self.meta_path}: {e}")
+        if self.snapshot_path.exists():
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except ValueError as e:
+                # Left by an older version that rewrote the file in place; keep it for inspection
+                aside = self.snapshot_path.with_name(f"checkpoint.corrupt-{int(time.time())}.json")
+                os.replace(self.snapshot_path, aside)
+                logger.error(f"Unreadable checkpoint in {self.batch_dir.name} moved to {aside.name}: {e}")
+                snapshot = []
+            for res in snapshot:
+                state[res["filename"]] = res
+        self._snapshot_records = len(state)
+        self._journal_records = 0
+        self._journal_bytes = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated")
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Ignoring torn record at the end of {self.journal_path}")
+                        break
+                    self._journal_records += 1
+                    self._journal_bytes += len(line)
+                    state.pop(record["filename"], None)  # keep the order of the latest write
+                    state[record["filename"]] = record
+        self._pruned = meta.get("pruned", 0)
+        self._version = max(
+            meta.get("version", 0), max((rec.get("_seq", 0) for rec in state.values()), default=0)
+        )
+        self._successes = sum(1 for rec in state.values() if _is_success(rec))
+        return state
+
+    def _file_stats(self) -> Tuple[int, int, int, int]:
+        stats = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                st = path.stat()
+                stats.extend([st.st_mtime_ns, st.st_size])
+            except FileNotFoundError:
+                stats.extend([0, 0])
+        return stats[0], stats[1], stats[2], stats[3]
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Current results (snapshot + journal), kept in memory for the following writes."""
+        with self._lock:
+            return [rec for rec in self._ensure_loaded().values() if not rec.get("_deleted")]
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Current results without keeping them in memory (for readers such as /results)."""
+        return self.read_since(None)[1]
+
+    def read_since(self, since: Optional[int]) -> Tuple[int, List[Dict[str, Any]], bool]:
+        """(version, records, full): with `since`, every record with a higher _seq,
+        tombstones included; otherwise, or if tombstones after `since` were already
+        dropped by compaction, all current results with full=True."""
+        with self._lock:
+            state = self._state
+            if state is None:
+                stats = self._file_stats()
+                state = self._read_disk()
+                self._disk_version = (stats, self._version)
+            if since is None or since < self._pruned:
+                return self._version, [rec for rec in state.values() if not rec.get("_deleted")], True
+            return self._version, [rec for rec in state.values() if rec.get("_seq", 0) > since], False
+
+    def version(self) -> int:
+        """Highest _seq; cheap while nothing changed on disk since the last read."""
+        with self._lock:
+            if self._state is not None:
+                return self._version
+            stats = self._file_stats()
+            if self._disk_version is None or self._disk_version[0] != stats:
+                self._read_disk()
+                self._disk_version = (stats, self._version)
+            return self._disk_version[1]
+
+    # --- writing ----------------------------------------------------------
+
+    def _ensure_loaded(self) -> Dict[str, Dict[str, Any]]:
+        if self._state is None:
+            self._state = self._read_disk()
+        return self._state
+
+    def _write_records(self, records: Iterable[Dict[str, Any]]) -> None:
+        if self._journal is None:
+            # Cut a torn record left by a crash, or the next record would be glued to it
+            if self.journal_path.exists() and self.journal_path.stat().st_size > self._journal_bytes:
+                os.truncate(self.journal_path, self._journal_bytes)
+            # Held across appends and released by close(), discard() or compaction
+            self._journal = open(self.journal_path, "ab")  # noqa: SIM115
+        count = 0
+        for record in records:
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            self._journal.write(line)
+            self._journal_bytes += len(line)
+            count += 1
+        self._journal.flush()
+        self._journal_records += count
+        self._unsynced += count
+        if (
+            self._unsynced >= settings.CHECKPOINT_FSYNC_EVERY
+            or time.monotonic() - self._last_sync >= settings.CHECKPOINT_FSYNC_SECONDS
+        ):
+            self._sync()
+        if self._journal_records >= max(settings.CHECKPOINT_COMPACT_MIN, self._snapshot_records):
+            self._compact()
+
+    def _sync(self) -> None:
+        if self._journal is not None and self._unsynced:
+            os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _release_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    @property
+    def successes(self) -> int:
+        """Successful cards; current while the store is loaded (during a run)."""
+        return self._successes
+
+    def _stamp(self, state: Dict[str, Dict[str, Any]], record: Dict[str, Any]) -> Dict[str, Any]:
+        self._version += 1
+        record = {**record, "_seq": self._version}
+        previous = state.pop(record["filename"], None)
+        self._successes += _is_success(record) - (previous is not None and _is_success(previous))
+        state[record["filename"]] = record
+        return record
+
+    def append(self, results: List[Dict[str, Any]]) -> None:
+        """Records finished cards; a later result for the same file replaces the earlier one."""
+        if not results:
+            return
+        with self._lock:
+            state = self._ensure_loaded()
+            self._write_records([self._stamp(state, res) for res in results])
+
+    def remove(self, filename: str) -> bool:
+        """Drops a card's result (e.g. before it is retried); False if there was none."""
+        with self._lock:
+            state = self._ensure_loaded()
+            if filename not in state or state[filename].get("_deleted"):
+                return False
+            self._write_records([self._stamp(state, {"filename": filename, "_deleted": True})])
+            return True
+
+    def reset(self) -> None:
+        """Starts over with no results (a run without resume)."""
+        with self._lock:
+            state = self._ensure_loaded()
+            for filename in [name for name, rec in state.items() if not rec.get("_deleted")]:
+                self._stamp(state, {"filename": filename, "_deleted": True})
+            self._compact()
+
+    def _compact(self) -> None:
+        """Writes the current results as the new snapshot and empties the journal.
+
+        Tombstones are dropped; the meta file is written first, so the version never
+        goes back even if the process dies before the snapshot is replaced.
+        """
+        state = self._ensure_loaded()
+        tombstones = [name for name, rec in state.items() if rec.get("_deleted")]
+        if tombstones:
+            self._pruned = max(self._pruned, max(state[name].get("_seq", 0) for name in tombstones))
+            for name in tombstones:
+                del state[name]
+        write_json_atomic(self.meta_path, {"version": self._version, "pruned": self._pruned}, indent=None)
+        records = list(state.values())
+        write_json_atomic(self.snapshot_path, records)
+        self._snapshot_records = len(records)
+        # Truncating after the rename: a crash in between only replays records the snapshot has
+        self._release_journal()
+        with open(self.journal_path, "w"):
+            pass
+        self._journal_records = 0
+        self._journal_bytes = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        """End of a run: compacts if anything was journaled and releases the journal and the memory."""
+        with self._lock:
+            if self._state is not None and self._journal_records:
+                self._compact()
+            self._sync()
+            self._release_journal()
+            self._state = None
+
+    def discard(self) -> None:
+        """Drops the in-memory state without writing (the batch is being deleted)."""
+        with self._lock:
+            self._release_journal()
+            self._state = None
+
+    @property
+    def holds_journal(self) -> bool:
+        """Whether the store holds the journal's file handle."""
+        return self._journal is not None
+
+
+class CheckpointRegistry:
+    """One CheckpointStore per batch directory, shared by the engine and the API."""
+
+    def __init__(self) -> None:
+        self._stores: Dict[Path, CheckpointStore] = {}
+        self._lock = threading.Lock()
+
+    def get(self, batch_dir: Path) -> CheckpointStore:
+        key = batch_dir.resolve()
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                store = CheckpointStore(batch_dir)
+                self._stores[key] = store
+            return store
+
+    def drop(self, batch_dir: Path) -> None:
+        """Forgets a deleted batch without writing anything."""
+        with self._lock:
+            store = self._stores.pop(batch_dir.resolve(), None)
+        if store is not None:
+            store.discard()
+
+    def close_all(self) -> int:
+        """Closes every store (shutdown): compacts journaled results and releases the
+        journal handles of runs that did not get to close their store. Returns the
+        number of stores that held a handle."""
+        with self._lock:
+            stores = list(self._stores.values())
+            self._stores.clear()
+        held = sum(store.holds_journal for store in stores)
+        for store in stores:
+            store.close()
+        return held
+
+
+checkpoints = CheckpointRegistry()
+atexit.register(checkpoints.close_all)
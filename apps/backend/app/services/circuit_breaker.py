@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.concurrency import OVERLOAD, SUCCESS, LimiterSlot
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderRoute(NamedTuple):
+    """One entry of a batch's provider chain."""
+    provider: str
+    endpoint: str
+    model: str
+    api_key: str
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for a single provider endpoint.
+
+    Closed: requests pass; outcomes of the last CIRCUIT_WINDOW_SECONDS are kept, and
+    once at least CIRCUIT_MIN_REQUESTS are in the window and the share of failures
+    (429, 5xx, timeouts, connection errors and — if CIRCUIT_SLOW_CALL_SECONDS is set —
+    slow successes) reaches CIRCUIT_ERROR_RATE, the circuit opens.
+    Open: allow() refuses for CIRCUIT_OPEN_SECONDS, so callers can reroute at once.
+    Half-open: up to CIRCUIT_HALF_OPEN_PROBES requests are let through; a success closes
+    the circuit, a failure opens it again. A probe that ends inconclusively (a 4xx other
+    than 429) gives its slot back, so the next request probes instead.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        window: float,
+        min_requests: int,
+        error_rate: float,
+        slow_call: float,
+        open_seconds: float,
+        half_open_probes: int,
+    ) -> None:
+        self.endpoint = endpoint
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._opened_count = 0
+        # (timestamp, failed, latency) of the requests in the rolling window
+        self._events: Deque[Tuple[float, bool, float]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        """State after a possible open -> half-open timeout (caller holds the lock)."""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"Circuit for {self.endpoint} half-open — probing")
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in half-open state this takes a probe slot."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, outcome: str, latency: float) -> None:
+        """Feeds one finished request (outcome as classified by the concurrency limiter)."""
+        if outcome not in (SUCCESS, OVERLOAD):
+            # Other 4xx say nothing about the provider's health; a probe frees its slot
+            with self._lock:
+                if self._current_state(time.monotonic()) == HALF_OPEN and self._probes > 0:
+                    self._probes -= 1
+            return
+        failed = outcome == OVERLOAD or (self.slow_call > 0 and latency > self.slow_call)
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == OPEN:
+                return
+            if state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._events.clear()
+                    logger.info(f"Circuit for {self.endpoint} closed again")
+                return
+
+            self._events.append((now, failed, latency))
+            while self._events and now - self._events[0][0] > self.window:
+                self._events.popleft()
+            if len(self._events) >= self.min_requests:
+                failures = sum(1 for _, f, _ in self._events if f)
+                if failures / len(self._events) >= self.error_rate:
+                    self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._opened_count += 1
+        self._events.clear()
+        logger.warning(f"Circuit for {self.endpoint} opened — rerouting for {self.open_seconds:.0f}s")
+
+    @contextmanager
+    def track(self, slot: LimiterSlot) -> Iterator[None]:
+        """Records the limiter slot's outcome once the request is done (also on exceptions)."""
+        try:
+            yield
+        finally:
+            self.record(slot.outcome, slot.elapsed)
+
+    @asynccontextmanager
+    async def track_async(self, slot: LimiterSlot) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            self.record(slot.outcome, slot.elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            events = [e for e in self._events if now - e[0] <= self.window]
+        failures = sum(1 for _, f, _ in events if f)
+        return {
+            "endpoint": self.endpoint,
+            "state": state,
+            "requests_in_window": len(events),
+            "error_rate": round(failures / len(events), 4) if events else 0.0,
+            "latency_avg": round(sum(e[2] for e in events) / len(events), 3) if events else None,
+            "times_opened": self._opened_count,
+        }
+
+
+class CircuitBreakerRegistry:
+    """Process-wide registry of one CircuitBreaker per provider endpoint."""
+
+    def __init__(self) -> None:
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    endpoint,
+                    window=settings.CIRCUIT_WINDOW_SECONDS,
+                    min_requests=settings.CIRCUIT_MIN_REQUESTS,
+                    # A rate above 1 can never be reached: the breaker only observes
+                    error_rate=settings.CIRCUIT_ERROR_RATE if settings.CIRCUIT_BREAKER_ENABLED else 2.0,
+                    slow_call=settings.CIRCUIT_SLOW_CALL_SECONDS,
+                    open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+                    half_open_probes=settings.CIRCUIT_HALF_OPEN_PROBES,
+                )
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [b.snapshot() for b in breakers]
+
+
+def provider_unavailable(error: Optional[str]) -> bool:
+    """Errors after which the next provider of the chain should be tried."""
+    return error is not None and error.startswith(("Circuit offen", "Max. Versuche"))
+
+
+circuit_breakers = CircuitBreakerRegistry()
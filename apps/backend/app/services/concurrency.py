@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Outcomes reported back to the limiter when a request slot is released
+SUCCESS = "success"    # 2xx — may grow the limit if latency is healthy
+OVERLOAD = "overload"  # 429, 5xx, timeouts, connection errors — shrink the limit
+IGNORE = "ignore"      # other 4xx — says nothing about provider capacity
+
+
+def classify_status(status_code: int) -> str:
+    if status_code == 429 or status_code >= 500:
+        return OVERLOAD
+    if status_code >= 400:
+        return IGNORE
+    return SUCCESS
+
+
+class LimiterSlot:
+    """One in-flight request. Defaults to OVERLOAD so exceptions count as failures."""
+
+    def __init__(self) -> None:
+        self.outcome = OVERLOAD
+        self.started = time.monotonic()
+
+    def record(self, status_code: int) -> None:
+        self.outcome = classify_status(status_code)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for a single provider endpoint.
+
+    The limit grows by ~1 per window of successful requests (additive increase) while
+    latency stays within LATENCY_TOLERANCE of the observed baseline, and is multiplied
+    by CONCURRENCY_DECREASE on 429/5xx/timeouts (multiplicative decrease) — at most
+    once per smoothed round-trip so a burst of failures does not collapse it to the floor.
+    Usable from worker threads (acquire) and from the event loop (acquire_async).
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ) -> None:
+        self.endpoint = endpoint
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+
+        self._baseline_latency: Optional[float] = None
+        self._smoothed_latency: Optional[float] = None
+        self._last_decrease = 0.0
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _wake(self) -> None:
+        """Wakes as many waiters as there are free slots (caller holds the lock)."""
+        free = int(self.limit) - self.in_flight
+        if free <= 0:
+            return
+        self._cond.notify(free)
+        while free > 0 and self._async_waiters:
+            loop, fut = self._async_waiters.popleft()
+            loop.call_soon_threadsafe(_resolve_future, fut)
+            free -= 1
+
+    def acquire(self) -> None:
+        with self._cond:
+            while not self._has_capacity():
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._has_capacity():
+                    self.in_flight += 1
+                    return
+                fut = loop.create_future()
+                self._async_waiters.append((loop, fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._async_waiters.remove((loop, fut))
+                    except ValueError:
+                        # Already woken — pass the wake-up on so the slot is not lost
+                        self._wake()
+                raise
+
+    def release(self, outcome: str, latency: float) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+
+            if outcome == OVERLOAD:
+                window = self._smoothed_latency or 1.0
+                if now - self._last_decrease >= window:
+                    old = self.limit
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                    self._last_decrease = now
+                    if int(old) != int(self.limit):
+                        logger.info(f"Concurrency for {self.endpoint} reduced {int(old)} -> {int(self.limit)}")
+            elif outcome == SUCCESS:
+                baseline = self._observe_latency(latency)
+                if latency <= baseline * self.latency_tolerance:
+                    self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+            self._wake()
+
+    def _observe_latency(self, latency: float) -> float:
+        """Updates smoothed and baseline latency; returns the new baseline."""
+        if self._smoothed_latency is None:
+            self._smoothed_latency = latency
+        else:
+            self._smoothed_latency = 0.8 * self._smoothed_latency + 0.2 * latency
+
+        # Baseline follows the fastest responses immediately and drifts up slowly,
+        # so a permanently slower model does not freeze the limit forever.
+        if self._baseline_latency is None or latency < self._baseline_latency:
+            self._baseline_latency = latency
+        else:
+            self._baseline_latency = 0.99 * self._baseline_latency + 0.01 * latency
+        return self._baseline_latency
+
+    @contextmanager
+    def slot(self) -> Iterator[LimiterSlot]:
+        self.acquire()
+        s = LimiterSlot()
+        try:
+            yield s
+        finally:
+            self.release(s.outcome, s.elapsed)
+
+    @asynccontextmanager
+    async def slot_async(self) -> AsyncIterator[LimiterSlot]:
+        await self.acquire_async()
+        s = LimiterSlot()
+        try:
+            yield s
+        finally:
+            self.release(s.outcome, s.elapsed)
+
+
+def _resolve_future(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class ConcurrencyController:
+    """Process-wide registry of one AdaptiveLimiter per provider endpoint."""
+
+    def __init__(self) -> None:
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> AdaptiveLimiter:
+        with self._lock:
+            limiter = self._limiters.get(endpoint)
+            if limiter is None:
+                if settings.ADAPTIVE_CONCURRENCY:
+                    limiter = AdaptiveLimiter(
+                        endpoint,
+                        initial=settings.MAX_WORKERS,
+                        min_limit=settings.CONCURRENCY_MIN,
+                        max_limit=settings.CONCURRENCY_MAX,
+                        decrease=settings.CONCURRENCY_DECREASE,
+                        latency_tolerance=settings.CONCURRENCY_LATENCY_TOLERANCE,
+                    )
+                else:
+                    # Static limit: behaves like the former fixed worker count
+                    limiter = AdaptiveLimiter(
+                        endpoint,
+                        initial=settings.MAX_WORKERS,
+                        min_limit=settings.MAX_WORKERS,
+                        max_limit=settings.MAX_WORKERS,
+                    )
+                self._limiters[endpoint] = limiter
+            return limiter
+
+    def current_limit(self, endpoint: str) -> int:
+        return self.get(endpoint).current_limit
+
+
+concurrency_controller = ConcurrencyController()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """Persistent, content-addressed cache of parsed VLM answers.
+
+    Entries live as small JSON files under EXTRACTION_CACHE_DIR, sharded by the first
+    two hex digits of the key. File mtimes serve as LRU clock: a hit touches the file,
+    and when the cache grows past max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir: str = settings.EXTRACTION_CACHE_DIR, max_bytes: int = settings.EXTRACTION_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # computed lazily on first write
+
+    @staticmethod
+    def make_key(image_path: Path, prompt: str, model: str, max_size: Optional[int], temperature: float) -> str:
+        """SHA-256 over the image bytes plus everything that influences the answer."""
+        h = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        image_digest = h.hexdigest()
+        params = json.dumps(
+            {"image": image_digest, "prompt": prompt, "model": model, "max_size": max_size, "temperature": temperature},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # mark as recently used
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, key: str, data: Any) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique temp name: two cards with identical content may be stored at once
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"Failed to write extraction cache entry: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(payload)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+
+    def _evict(self) -> None:
+        """Removes least recently used entries until the cache is below 90% of max_bytes."""
+        entries = []
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                continue
+        entries.sort(key=lambda e: e[0])
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        self._total_bytes = total
+        if removed:
+            logger.info(f"Extraction cache evicted {removed} entries ({total} bytes remaining)")
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,194 @@
+import logging
+import math
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..1) of values, None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q * len(ordered)))
+    return ordered[rank - 1]
+
+
+class HedgePolicy:
+    """Decides when a card's request gets a duplicate, for a single provider endpoint.
+
+    Keeps the latencies of the last HEDGE_WINDOW card requests (including the wait for
+    a rate-limit and concurrency slot); once HEDGE_MIN_SAMPLES are known, a request
+    still running after their HEDGE_QUANTILE is hedged — as long as hedges stay within
+    HEDGE_BUDGET_PERCENT of the requests sent to the endpoint.
+    """
+
+    def __init__(self, endpoint: str, window: int, min_samples: int, quantile: float, budget_percent: float) -> None:
+        self.endpoint = endpoint
+        self.min_samples = min_samples
+        self.quantile = quantile
+        self.budget = budget_percent / 100
+        self.requests = 0
+        self.hedges = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a running request gets hedged; None until enough latencies are known."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return percentile(self._latencies, self.quantile)
+
+    def try_hedge(self) -> bool:
+        """Takes one hedge from the budget, if any is left."""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            requests, hedges = self.requests, self.hedges
+        return {
+            "endpoint": self.endpoint,
+            "requests": requests,
+            "hedges": hedges,
+            "hedge_rate": round(hedges / requests, 4) if requests else 0.0,
+            "hedge_after": percentile(latencies, self.quantile) if len(latencies) >= self.min_samples else None,
+        }
+
+
+class LatencyReport:
+    """Request latencies of one batch run: until the answer (with hedging) and of the
+    first request alone (without hedging).
+
+    A first request that loses to its hedge is counted with the time it had run when
+    the hedge won — a lower bound — until set_primary() reports its real latency.
+    """
+
+    def __init__(self) -> None:
+        self.answered: List[float] = []
+        self.primary: List[float] = []
+        self.lower_bounds: Set[int] = set()
+        self.hedged = 0
+        self.hedge_won = 0
+        self._lock = threading.Lock()
+
+    def add(self, answered: float, primary: float, hedged: bool = False, hedge_won: bool = False) -> int:
+        """Adds one card request; returns its index for set_primary."""
+        with self._lock:
+            self.answered.append(answered)
+            self.primary.append(primary)
+            self.hedged += hedged
+            self.hedge_won += hedge_won
+            index = len(self.primary) - 1
+            if hedge_won:
+                self.lower_bounds.add(index)
+            return index
+
+    def set_primary(self, index: int, seconds: float) -> None:
+        with self._lock:
+            self.primary[index] = seconds
+            self.lower_bounds.discard(index)
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        """p50/p95/p99 in seconds with hedging (until the answer) and without (first request
+        alone), for the run's final progress update; None if the run sent no requests."""
+        with self._lock:
+            answered, primary = list(self.answered), list(self.primary)
+            lower_bounds, hedged, won = len(self.lower_bounds), self.hedged, self.hedge_won
+        if not answered:
+            return None
+
+        def _quantiles(values: List[float]) -> Dict[str, float]:
+            return {f"p{round(q * 100)}": round(percentile(values, q) or 0.0, 3) for q in (0.5, 0.95, 0.99)}
+
+        return {
+            "requests": len(answered),
+            "hedged": hedged,
+            "hedge_won": won,
+            "with_hedging": _quantiles(answered),
+            "without_hedging": _quantiles(primary),
+            "lower_bounds": lower_bounds,
+        }
+
+    def summary(self) -> str:
+        with self._lock:
+            answered, primary = list(self.answered), list(self.primary)
+            lower_bounds, hedged, won = len(self.lower_bounds), self.hedged, self.hedge_won
+        if not answered:
+            return "no requests"
+
+        def _quantiles(values: List[float]) -> str:
+            return "/".join(f"{percentile(values, q) or 0.0:.2f}" for q in (0.5, 0.95, 0.99))
+
+        text = f"p50/p95/p99 {_quantiles(answered)}s over {len(answered)} requests"
+        if hedged:
+            text += (
+                f" with hedging ({hedged} hedged, {won} won by the hedge); without hedging {_quantiles(primary)}s"
+            )
+            if lower_bounds:
+                text += f" ({lower_bounds} cancelled or unfinished first requests counted as lower bounds)"
+        return text
+
+
+class HedgeRegistry:
+    """Process-wide registry of one HedgePolicy per provider endpoint and one
+    LatencyReport per batch run of this process (open_report ... pop_report)."""
+
+    def __init__(self) -> None:
+        self._policies: Dict[str, HedgePolicy] = {}
+        self._reports: Dict[str, LatencyReport] = {}
+        self._lock = threading.Lock()
+
+    def open_report(self, batch_name: str) -> None:
+        """Starts collecting the latencies of a batch run; the run pops the report when it ends."""
+        with self._lock:
+            self._reports[batch_name] = LatencyReport()
+
+    def report(self, batch_name: str) -> LatencyReport:
+        """The batch run's report, or a detached one if no run in this process owns the batch
+        (cards run by app.worker), so nothing accumulates for batches nobody reports on."""
+        with self._lock:
+            return self._reports.get(batch_name) or LatencyReport()
+
+    def pop_report(self, batch_name: str) -> LatencyReport:
+        with self._lock:
+            return self._reports.pop(batch_name, None) or LatencyReport()
+
+    def get(self, endpoint: str) -> HedgePolicy:
+        with self._lock:
+            policy = self._policies.get(endpoint)
+            if policy is None:
+                policy = HedgePolicy(
+                    endpoint,
+                    window=settings.HEDGE_WINDOW,
+                    min_samples=settings.HEDGE_MIN_SAMPLES,
+                    quantile=settings.HEDGE_QUANTILE,
+                    budget_percent=settings.HEDGE_BUDGET_PERCENT,
+                )
+                self._policies[endpoint] = policy
+            return policy
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            policies = list(self._policies.values())
+        return [p.snapshot() for p in policies]
+
+
+hedging = HedgeRegistry()
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.metadata_store import metadata_store
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tiff", ".tif"}
+
+# Batches whose directories change under a run; the reconciler leaves them to the run's own updates
+_ACTIVE_STATUSES = {"queued", "running", "retrying"}
+
+
+def scan_batch_dir(batch_dir: Path) -> Tuple[int, int]:
+    """(images waiting in the batch directory, files in _errors/) counted from disk."""
+    files = errors = 0
+    with os.scandir(batch_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                files += 1
+    error_dir = batch_dir / "_errors"
+    if error_dir.is_dir():
+        with os.scandir(error_dir) as entries:
+            errors = sum(1 for entry in entries if entry.is_file())
+    return files, errors
+
+
+class HistoryIndex:
+    """Per-batch counters for the history page, kept in memory and in HISTORY_INDEX_FILE.
+
+    Each entry holds files (images in the batch directory), errors (files in _errors/),
+    successes (successful cards in the checkpoint), status and updated_at. The create,
+    run, retry and delete paths update the entries as they change things, so /history
+    needs no directory scans. The index is a metadata_store document, written behind
+    and atomically. A reconciler rescans idle batches every HISTORY_RECONCILE_SECONDS
+    and corrects drift (files moved by hand, a crash before the last flush).
+    """
+
+    def __init__(self, index_path: str = settings.HISTORY_INDEX_FILE) -> None:
+        self.doc = metadata_store.document(Path(index_path), dict)
+        self._task: Optional[asyncio.Task] = None
+        self.corrections = 0
+
+    @staticmethod
+    def _touch(entry: Dict[str, Any]) -> None:
+        entry["updated_at"] = time.time()
+
+    # --- updates ----------------------------------------------------------
+
+    def get(self, batch_name: str) -> Optional[Dict[str, Any]]:
+        with self.doc.view() as entries:
+            entry = entries.get(batch_name)
+            return dict(entry) if entry is not None else None
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Copies of all entries by batch name."""
+        with self.doc.view() as entries:
+            return {name: dict(entry) for name, entry in entries.items()}
+
+    def create(self, batch_name: str, files: int, status: str = "uploaded") -> None:
+        """Entry of a new batch (create_batch knows its file count)."""
+        def _create(entries: Dict[str, Any]) -> None:
+            entry = {"files": files, "errors": 0, "successes": 0, "status": status}
+            self._touch(entry)
+            entries[batch_name] = entry
+
+        self.doc.update(_create)
+
+    def update(self, batch_name: str, **values: Any) -> None:
+        """Sets successes or status of a batch; batches without an entry are counted on first access."""
+        with self.doc.view() as entries:
+            entry = entries.get(batch_name)
+            if entry is None or all(entry.get(k) == v for k, v in values.items()):
+                return
+
+        def _set(entries: Dict[str, Any]) -> None:
+            entry = entries.get(batch_name)
+            if entry is not None:
+                entry.update(values)
+                self._touch(entry)
+
+        self.doc.update(_set)
+
+    def adjust(self, batch_name: str, files: int = 0, errors: int = 0) -> None:
+        """Applies a change of the file counts (a card moved to or from _errors/)."""
+        def _adjust(entries: Dict[str, Any]) -> None:
+            entry = entries.get(batch_name)
+            if entry is None:
+                return  # counted from disk on first access
+            entry["files"] = max(0, entry["files"] + files)
+            entry["errors"] = max(0, entry["errors"] + errors)
+            self._touch(entry)
+
+        self.doc.update(_adjust)
+
+    def remove(self, batch_name: str) -> None:
+        self.doc.update(lambda entries: entries.pop(batch_name, None))
+
+    # --- reconciliation ---------------------------------------------------
+
+    def reconcile_batch(self, batch_dir: Path, successes: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Recounts a batch from disk; returns its entry, None if the directory is gone."""
+        try:
+            files, errors = scan_batch_dir(batch_dir)
+        except FileNotFoundError:
+            return None
+
+        def _recount(entries: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+            """(the entry, a copy of it before a drift correction or None)."""
+            entry = entries.get(batch_dir.name)
+            drifted = None
+            if entry is None:
+                entry = {"files": files, "errors": errors, "successes": successes or 0}
+                self._touch(entry)
+                entries[batch_dir.name] = entry
+            elif (entry["files"], entry["errors"]) != (files, errors) or (
+                successes is not None and entry["successes"] != successes
+            ):
+                drifted = dict(entry)
+                entry.update(files=files, errors=errors)
+                if successes is not None:
+                    entry["successes"] = successes
+                self._touch(entry)
+            return dict(entry), drifted
+
+        entry, drifted = self.doc.update(_recount)
+        if drifted is not None:
+            logger.info(
+                f"History index drift for {batch_dir.name}: files {drifted['files']}->{files}, "
+                f"errors {drifted['errors']}->{errors}, successes {drifted['successes']}->{successes}"
+            )
+            self.corrections += 1
+        return entry
+
+    def reconcile(self, batches_dir: Path, success_counts: Dict[str, int]) -> int:
+        """Recounts all idle batches and drops entries of deleted ones; returns the number scanned."""
+        names = {d.name for d in batches_dir.iterdir() if d.is_dir()} if batches_dir.exists() else set()
+        with self.doc.view() as entries:
+            gone = [n for n in entries if n not in names]
+            active = {n for n, e in entries.items() if e.get("status") in _ACTIVE_STATUSES}
+        if gone:
+            def _drop(entries: Dict[str, Any]) -> None:
+                for name in gone:
+                    entries.pop(name, None)
+
+            self.doc.update(_drop)
+        scanned = 0
+        for name in sorted(names - active):
+            self.reconcile_batch(batches_dir / name, success_counts.get(name, 0))
+            scanned += 1
+        return scanned
+
+    # --- background -------------------------------------------------------
+
+    def start(
+        self,
+        batches_dir: Path,
+        success_counts: Callable[[], Dict[str, int]],
+        after: Optional[asyncio.Future] = None,
+    ) -> None:
+        """Starts reconciliation on the running event loop.
+
+        success_counts() returns the successful cards per batch for the reconciler. With
+        after, the first pass waits until that task is done (the results store's import
+        of old checkpoints, without which their successes would be counted as 0).
+        """
+        self._task = asyncio.create_task(self._run(batches_dir, success_counts, after))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.doc.flush)
+
+    async def _run(
+        self, batches_dir: Path, success_counts: Callable[[], Dict[str, int]], after: Optional[asyncio.Future]
+    ) -> None:
+        if after is not None:
+            await asyncio.wait([after])  # not awaited directly: stopping must not cancel it
+        while True:
+            try:
+                counts = await asyncio.to_thread(success_counts)
+                await asyncio.to_thread(self.reconcile, batches_dir, counts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"History index reconciliation failed: {e}")
+            await asyncio.sleep(settings.HISTORY_RECONCILE_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.doc.view() as entries:
+            return {
+                "batches": len(entries),
+                "pending_write": self.doc.pending,
+                "corrections": self.corrections,
+                "files": sum(e["files"] for e in entries.values()),
+                "errors": sum(e["errors"] for e in entries.values()),
+                "successes": sum(e["successes"] for e in entries.values()),
+            }
+
+
+history_index = HistoryIndex()
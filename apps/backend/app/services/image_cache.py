@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENCODED_DIR_NAME = "_encoded"
+IMAGE_SUFFIXES = {".jpg", ".jpeg"}
+
+
+class EncodedImageCache:
+    """Ready-to-send base64 payloads stored next to each batch (<batch>/_encoded/).
+
+    Keyed by the source file's size + mtime and the encoding parameters, so a card is
+    resized and encoded once per (max_size, variant) no matter how often it is retried.
+    The variant string covers format, quality and preprocessing options. Preparation
+    stats (e.g. bytes saved by cropping) are kept in a .json sidecar. Entries disappear
+    together with the batch directory.
+    """
+
+    @staticmethod
+    def batch_dir_for(image_path: Path) -> Path:
+        # Failed cards live in <batch>/_errors/ — share the batch-level cache
+        parent = image_path.parent
+        return parent.parent if parent.name == "_errors" else parent
+
+    def _entry_path(self, image_path: Path, max_size: int, variant: str) -> Path:
+        st = image_path.stat()
+        raw_key = f"{image_path.name}|{st.st_size}|{st.st_mtime_ns}|{max_size}|{variant}"
+        digest = hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+        return self.batch_dir_for(image_path) / ENCODED_DIR_NAME / f"{digest}.b64"
+
+    def get_or_encode(
+        self,
+        image_path: Path,
+        max_size: int,
+        variant: str,
+        encode: Callable[[], Tuple[str, Dict[str, int]]],
+    ) -> Tuple[str, Dict[str, int]]:
+        """Returns the cached (payload, stats), or runs encode() and stores its result."""
+        entry = self._entry_path(image_path, max_size, variant)
+        stats_entry = entry.with_suffix(".json")
+        try:
+            encoded = entry.read_text(encoding="ascii")
+            stats: Dict[str, int] = {}
+            if stats_entry.exists():
+                stats = json.loads(stats_entry.read_text(encoding="utf-8"))
+            return encoded, stats
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable encoded-image cache entry for {image_path.name}: {e}")
+
+        encoded, stats = encode()
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            # Unique temp names: the background warm-up and a running batch may race.
+            # The sidecar is written first so a visible payload always has its stats.
+            suffix = uuid.uuid4().hex[:8]
+            if stats:
+                tmp_stats = stats_entry.with_suffix(f".{suffix}.tmp")
+                tmp_stats.write_text(json.dumps(stats), encoding="utf-8")
+                os.replace(tmp_stats, stats_entry)
+            tmp = entry.with_suffix(f".{suffix}.tmp")
+            tmp.write_text(encoded, encoding="ascii")
+            os.replace(tmp, entry)
+        except OSError as e:
+            logger.warning(f"Failed to store encoded image for {image_path.name}: {e}")
+        return encoded, stats
+
+    def warm(self, batch_dir: Path, max_size: int, encode: Callable[[Path, int], str]) -> int:
+        """Pre-encodes every card of a batch. Returns the number of cards processed."""
+        count = 0
+        for image_path in sorted(batch_dir.iterdir()):
+            if not image_path.is_file() or image_path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            try:
+                encode(image_path, max_size)
+                count += 1
+            except Exception as e:
+                logger.warning(f"Pre-encoding {image_path.name} failed: {e}")
+        logger.info(f"Pre-encoded {count} images for batch {batch_dir.name}")
+        return count
+
+
+image_cache = EncodedImageCache()
@@ -0,0 +1,165 @@
+"""Image preparation stage: resize, JPEG re-encode and base64.
+
+Kept free of engine state so it can run in a ProcessPoolExecutor — Pillow decoding of
+large scans is CPU-bound and would otherwise compete for the GIL with the network stage.
+"""
+import base64
+import io
+import logging
+import math
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+from app.services.image_cache import image_cache
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_size(width: int, height: int, max_size: int) -> Optional[Tuple[int, int]]:
+    """Target size exactly as Image.thumbnail((max_size, max_size)) computes it.
+
+    Returns None if the image already fits.
+    """
+    x, y = max_size, max_size
+    if x >= width and y >= height:
+        return None
+
+    def round_aspect(number: float, key) -> int:
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def downscale(img: Image.Image, max_size: int) -> Image.Image:
+    """Shrinks img to fit max_size x max_size.
+
+    With FAST_RESIZE, JPEGs are decoded directly at 1/2, 1/4 or 1/8 scale (DCT-domain
+    draft mode, never below the target size) and finished with a Lanczos resample.
+    Image.thumbnail only drafts down to twice the target, so a 5000px scan aimed at
+    1600px is fully decoded there. Output dimensions are identical in both modes.
+    """
+    if not settings.FAST_RESIZE:
+        img.thumbnail((max_size, max_size))
+        return img
+
+    target = thumbnail_size(img.width, img.height, max_size)
+    if target is None:
+        return img
+    img.draft(None, target)
+    return img.resize(target, Image.Resampling.LANCZOS)
+
+
+def find_card_bounds(img: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+    """Locates the index card on the scanner bed; returns a crop box or None.
+
+    Works on a small grayscale preview: the background tone is the median of the
+    outer frame, pixels differing from it by more than CROP_THRESHOLD count as card,
+    and the row/column projection profiles of that mask give the card bounds. Boxes
+    that would keep almost everything (nothing to gain) or too little (detection
+    probably failed) are rejected.
+    """
+    preview = img.convert("L")
+    preview.thumbnail((512, 512))
+    a = np.asarray(preview, dtype=np.int16)
+    h, w = a.shape
+    edge = max(1, int(min(h, w) * 0.02))
+    frame = np.concatenate([a[:edge].ravel(), a[-edge:].ravel(), a[:, :edge].ravel(), a[:, -edge:].ravel()])
+    background = np.median(frame)
+
+    mask = np.abs(a - background) > settings.CROP_THRESHOLD
+    rows = np.flatnonzero(mask.mean(axis=1) > settings.CROP_MIN_FILL)
+    cols = np.flatnonzero(mask.mean(axis=0) > settings.CROP_MIN_FILL)
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    pad = int(round(min(h, w) * settings.CROP_PADDING))
+    top, bottom = max(0, rows[0] - pad), min(h, rows[-1] + 1 + pad)
+    left, right = max(0, cols[0] - pad), min(w, cols[-1] + 1 + pad)
+
+    kept = ((bottom - top) * (right - left)) / (h * w)
+    if kept > 0.97 or kept < settings.CROP_MIN_AREA:
+        return None
+
+    sx, sy = img.width / w, img.height / h
+    return (
+        int(left * sx),
+        int(top * sy),
+        min(img.width, int(math.ceil(right * sx))),
+        min(img.height, int(math.ceil(bottom * sy))),
+    )
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def resize_and_encode(image_path: Path, max_size: int, quality: int) -> Tuple[str, Dict[str, int]]:
+    """Returns (base64 JPEG, stats).
+
+    With CROP_BORDERS the card bounds are detected on the decoded scan and the crop
+    keeps the scale the whole scan would have been sent at, so the payload (and the
+    vision tokens) shrink instead of the card being blown up to max_size. The stats
+    then hold the JPEG size without and with cropping (bytes_before / bytes_after).
+    """
+    img = Image.open(image_path)
+    if not settings.CROP_BORDERS:
+        return base64.b64encode(_encode_jpeg(downscale(img, max_size), quality)).decode("utf-8"), {}
+
+    # The target comes from the scan's own size: the drafted image is rounded up to
+    # whole DCT blocks, and its aspect ratio can give a size one pixel off
+    target = thumbnail_size(img.width, img.height, max_size) if settings.FAST_RESIZE else None
+    if target is not None:
+        img.draft(None, target)
+    img.load()
+
+    box = find_card_bounds(img)
+    full_width = img.width
+    resized = img.resize(target, Image.Resampling.LANCZOS) if target is not None else downscale(img, max_size)
+    uncropped = _encode_jpeg(resized, quality)
+    if box is None:
+        data = uncropped
+    else:
+        scale = resized.width / full_width
+        scaled_box = (
+            int(box[0] * scale),
+            int(box[1] * scale),
+            min(resized.width, int(math.ceil(box[2] * scale))),
+            min(resized.height, int(math.ceil(box[3] * scale))),
+        )
+        data = _encode_jpeg(resized.crop(scaled_box), quality)
+    return base64.b64encode(data).decode("utf-8"), {"bytes_before": len(uncropped), "bytes_after": len(data)}
+
+
+def prepare_image_with_stats(image_path: Path, max_size: Optional[int] = 1600) -> Tuple[str, Dict[str, int]]:
+    """Kodiert ein Bild als Base64 (Resize, optional Randbeschnitt; pro Batch gecacht)."""
+    if max_size:
+        try:
+            quality = settings.JPEG_QUALITY
+            if settings.ENCODED_IMAGE_CACHE_ENABLED:
+                variant = f"JPEG|{quality}|crop={int(settings.CROP_BORDERS)}"
+                return image_cache.get_or_encode(
+                    image_path, max_size, variant,
+                    lambda: resize_and_encode(image_path, max_size, quality),
+                )
+            return resize_and_encode(image_path, max_size, quality)
+        except Exception as e:
+            logger.warning(f"Resize failed for {image_path}: {e} — fallback to raw")
+
+    with open(image_path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8"), {}
+
+
+def prepare_image(image_path: Path, max_size: Optional[int] = 1600) -> str:
+    """Kodiert ein Bild als Base64; optional vorheriges Resize (pro Batch gecacht)."""
+    return prepare_image_with_stats(image_path, max_size)[0]
@@ -0,0 +1,506 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# Card task states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+CARD_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    retry_errors INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    dispatched INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_name, status);
+CREATE TABLE IF NOT EXISTS card_tasks (
+    job_id INTEGER NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    seq INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_cards_status ON card_tasks (job_id, status);
+"""
+
+# Columns added after the first release of the schema: (table, column, definition)
+_MIGRATIONS = [
+    ("jobs", "dispatched", "INTEGER NOT NULL DEFAULT 0"),
+    ("card_tasks", "seq", "INTEGER"),
+]
+
+
+class Job(NamedTuple):
+    """A claimed batch run."""
+    id: int
+    batch_name: str
+    retry_errors: bool
+    attempts: int
+
+
+class CardTask(NamedTuple):
+    """A card leased by an external worker."""
+    job_id: int
+    batch_name: str
+    filename: str
+    attempts: int
+
+
+def make_owner() -> str:
+    """Lease owner id of this process: host, pid and a random token (pids get reused)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_is_dead(owner: str, current_owner: str) -> bool:
+    """True if the owner was a process on this host that no longer runs."""
+    if owner == current_owner:
+        return False
+    host, _, rest = owner.partition(":")
+    pid_text = rest.partition(":")[0]
+    if host != socket.gethostname() or not pid_text.isdigit() or os.name != "posix":
+        return False
+    pid = int(pid_text)
+    if pid == os.getpid():
+        return True  # a previous incarnation with the same pid (e.g. pid 1 in a container)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class JobQueue:
+    """Durable queue of batch runs and their card tasks in a SQLite file (JOB_QUEUE_DB).
+
+    A job is claimed with a lease of JOB_LEASE_SECONDS that its runner renews by
+    heartbeat; a job whose lease ran out (crash, restart, deploy) is queued again and
+    resumed by the next runner, at most JOB_MAX_ATTEMPTS times. Card tasks record which
+    cards of a job are pending, in flight or finished — with their result, so a
+    resumed job does not send finished cards again even if the checkpoint was lost.
+    Cards are leased with their job when the runner processes the batch itself; once a
+    job is dispatched (WORKER_MODE "external"), its cards are leased one by one by
+    worker processes, each renewing its own card leases. Finished cards get a
+    per-job sequence number, so observers can fetch only what changed. Safe for
+    several threads and processes (WAL, one connection per call).
+    """
+
+    def __init__(self, db_path: str = settings.JOB_QUEUE_DB, lease_seconds: float = settings.JOB_LEASE_SECONDS):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                for table, column, definition in _MIGRATIONS:
+                    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction taking the database lock up front (no upgrade deadlocks)."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- jobs -------------------------------------------------------------
+
+    def enqueue(self, batch_name: str, retry_errors: bool = False) -> int:
+        """Queues a run of the batch; a run already waiting for the batch is reused."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE batch_name = ? AND status = ? ORDER BY id LIMIT 1",
+                (batch_name, QUEUED),
+            ).fetchone()
+            if row is not None:
+                if retry_errors:
+                    conn.execute("UPDATE jobs SET retry_errors = 1, updated_at = ? WHERE id = ?", (now, row["id"]))
+                return row["id"]
+            cur = conn.execute(
+                "INSERT INTO jobs (batch_name, status, retry_errors, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (batch_name, QUEUED, int(retry_errors), now, now),
+            )
+            logger.info(f"Queued job {cur.lastrowid} for batch {batch_name}")
+            return int(cur.lastrowid or 0)
+
+    def claim(self, owner: str) -> Optional[Job]:
+        """Leases the oldest queued job of a batch that is not running elsewhere."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT id, batch_name, retry_errors, attempts FROM jobs AS j
+                WHERE status = ? AND NOT EXISTS (
+                    SELECT 1 FROM jobs AS r WHERE r.batch_name = j.batch_name AND r.status = ?
+                )
+                ORDER BY id LIMIT 1
+                """,
+                (QUEUED, RUNNING),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated_at = ? "
+                "WHERE id = ?",
+                (RUNNING, owner, now + self.lease_seconds, now, row["id"]),
+            )
+            return Job(row["id"], row["batch_name"], bool(row["retry_errors"]), row["attempts"] + 1)
+
+    def heartbeat(self, job_id: int, owner: str) -> Optional[bool]:
+        """Renews the lease of the job and its in-flight cards.
+
+        Returns whether a cancel was requested, or None if the lease was lost.
+        """
+        now = time.time()
+        expires = now + self.lease_seconds
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, RUNNING, owner),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ?", (expires, now, job_id))
+            conn.execute(
+                "UPDATE card_tasks SET lease_expires = ? WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                (expires, job_id, LEASED, owner),
+            )
+            return bool(row["cancel_requested"])
+
+    def finish(self, job_id: int, owner: str, status: str, error: Optional[str] = None) -> bool:
+        """Ends a job held by owner; False if the lease had already been lost."""
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (status, error, now, job_id, RUNNING, owner),
+            )
+            if cur.rowcount:
+                conn.execute(
+                    "UPDATE card_tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND status = ?",
+                    (PENDING, now, job_id, LEASED),
+                )
+            return cur.rowcount > 0
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """Hands a job back to the queue unfinished (shutdown); the attempt does not count.
+        A job whose cancel was already requested ends as cancelled instead."""
+        now = time.time()
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, "
+                "attempts = MAX(attempts - 1, 0), lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (CANCELLED, QUEUED, now, job_id, RUNNING, owner),
+            )
+            if cur.rowcount:
+                # Only the cards leased with the job; those of external workers keep their lease
+                conn.execute(
+                    "UPDATE card_tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                    (PENDING, now, job_id, LEASED, owner),
+                )
+            return cur.rowcount > 0
+
+    def request_cancel(self, batch_name: str) -> Dict[str, int]:
+        """Cancels queued runs of the batch and flags running ones for their runner."""
+        now = time.time()
+        with self._transaction() as conn:
+            dropped = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE batch_name = ? AND status = ?",
+                (CANCELLED, now, batch_name, QUEUED),
+            ).rowcount
+            flagged = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE batch_name = ? AND status = ?",
+                (now, batch_name, RUNNING),
+            ).rowcount
+        return {"queued_cancelled": dropped, "running_flagged": flagged}
+
+    def requeue_expired(self, current_owner: str, max_attempts: int = settings.JOB_MAX_ATTEMPTS) -> List[Job]:
+        """Queues running jobs again whose lease ran out or whose owner process is gone.
+
+        Jobs that already used max_attempts are failed instead (a run that keeps taking
+        its process down must not loop forever). Returns the requeued jobs.
+        """
+        now = time.time()
+        requeued: List[Job] = []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, batch_name, retry_errors, attempts, lease_owner, lease_expires FROM jobs WHERE status = ?",
+                (RUNNING,),
+            ).fetchall()
+            for row in rows:
+                leased = row["lease_expires"] is not None and row["lease_expires"] >= now
+                if leased and not _owner_is_dead(row["lease_owner"] or "", current_owner):
+                    continue
+                conn.execute(
+                    "UPDATE card_tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                    (PENDING, now, row["id"], LEASED, row["lease_owner"]),
+                )
+                if row["attempts"] >= max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                        "WHERE id = ?",
+                        (FAILED, f"Lease lost {row['attempts']} times", now, row["id"]),
+                    )
+                    logger.error(f"Job {row['id']} for batch {row['batch_name']} failed after {row['attempts']} attempts")
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ?",
+                    (QUEUED, now, row["id"]),
+                )
+                requeued.append(Job(row["id"], row["batch_name"], bool(row["retry_errors"]), row["attempts"]))
+                logger.warning(f"Lease of job {row['id']} for batch {row['batch_name']} expired or its runner is gone — queued again")
+
+            # Cards of dispatched jobs whose worker stopped renewing its lease
+            cards = conn.execute(
+                "SELECT c.job_id, j.batch_name, c.filename, c.attempts FROM card_tasks AS c "
+                "JOIN jobs AS j ON j.id = c.job_id "
+                "WHERE c.status = ? AND c.lease_expires < ? AND j.status = ? AND j.dispatched = 1",
+                (LEASED, now, RUNNING),
+            ).fetchall()
+            for card in cards:
+                if card["attempts"] >= max_attempts:
+                    result = {
+                        "filename": card["filename"],
+                        "batch": card["batch_name"],
+                        "success": False,
+                        "error": f"Worker ausgefallen ({card['attempts']} Versuche)",
+                        "duration": 0.0,
+                    }
+                    self._finish_card(conn, card["job_id"], result, now)
+                    continue
+                conn.execute(
+                    "UPDATE card_tasks SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE job_id = ? AND filename = ?",
+                    (PENDING, now, card["job_id"], card["filename"]),
+                )
+            if cards:
+                logger.warning(f"{len(cards)} card leases of lost workers expired")
+        return requeued
+
+    # --- card tasks -------------------------------------------------------
+
+    def add_cards(self, job_id: int, filenames: List[str]) -> None:
+        """Registers the job's cards; cards already known keep their state."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO card_tasks (job_id, filename, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(job_id, name, PENDING, now) for name in filenames],
+            )
+
+    def lease_cards(self, job_id: int, filenames: List[str]) -> None:
+        """Marks cards as in flight under the job's lease; renewed with the job's heartbeat."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE card_tasks SET status = ?, attempts = attempts + 1, "
+                "lease_owner = (SELECT lease_owner FROM jobs WHERE id = ?), lease_expires = ?, updated_at = ? "
+                "WHERE job_id = ? AND filename = ? AND status = ?",
+                [(LEASED, job_id, now + self.lease_seconds, now, job_id, name, PENDING) for name in filenames],
+            )
+
+    def complete_card(self, job_id: int, result: Dict[str, Any], owner: Optional[str] = None) -> bool:
+        """Stores a card's result. With owner (a worker), the result is only taken while
+        the card is not leased by someone else — a late answer after the lease moved on
+        is dropped, one for a card that was handed back is still welcome."""
+        now = time.time()
+        with self._transaction() as conn:
+            if owner is not None:
+                row = conn.execute(
+                    "SELECT status, lease_owner FROM card_tasks WHERE job_id = ? AND filename = ?",
+                    (job_id, result["filename"]),
+                ).fetchone()
+                if row is None or row["status"] in (DONE, CARD_FAILED):
+                    return False
+                if row["status"] == LEASED and row["lease_owner"] != owner:
+                    return False
+            self._finish_card(conn, job_id, result, now)
+            return True
+
+    def _finish_card(self, conn: sqlite3.Connection, job_id: int, result: Dict[str, Any], now: float) -> None:
+        status = DONE if result.get("success", False) else CARD_FAILED
+        conn.execute(
+            "UPDATE card_tasks SET status = ?, result = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?, "
+            "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM card_tasks WHERE job_id = ?) "
+            "WHERE job_id = ? AND filename = ?",
+            (status, json.dumps(result, ensure_ascii=False), now, job_id, job_id, result["filename"]),
+        )
+
+    def finished_cards(self, job_id: int) -> Dict[str, Dict[str, Any]]:
+        """Results of the job's cards that are done or failed, by filename."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT filename, result FROM card_tasks WHERE job_id = ? AND status IN (?, ?) AND result IS NOT NULL",
+                (job_id, DONE, CARD_FAILED),
+            ).fetchall()
+        return {row["filename"]: json.loads(row["result"]) for row in rows}
+
+    def finished_since(self, job_id: int, after_seq: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        """(sequence number, result) of the job's cards finished after after_seq, in order."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, result FROM card_tasks WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq),
+            ).fetchall()
+        return [(row["seq"], json.loads(row["result"])) for row in rows]
+
+    def open_cards(self, job_id: int) -> int:
+        """Cards of the job that are pending or in flight."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS n FROM card_tasks WHERE job_id = ? AND status IN (?, ?)", (job_id, PENDING, LEASED)
+            ).fetchone()
+        return int(row["n"])
+
+    # --- external workers -------------------------------------------------
+
+    def dispatch(self, job_id: int) -> None:
+        """Opens the job's pending cards to external workers."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET dispatched = 1, updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def lease_pending_cards(self, owner: str, limit: int) -> List[CardTask]:
+        """Leases up to limit pending cards of dispatched, running jobs (oldest job first)."""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT c.job_id, j.batch_name, c.filename, c.attempts FROM card_tasks AS c "
+                "JOIN jobs AS j ON j.id = c.job_id "
+                "WHERE c.status = ? AND j.status = ? AND j.dispatched = 1 AND j.cancel_requested = 0 "
+                "ORDER BY j.id, c.filename LIMIT ?",
+                (PENDING, RUNNING, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE card_tasks SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, "
+                "updated_at = ? WHERE job_id = ? AND filename = ?",
+                [(LEASED, owner, now + self.lease_seconds, now, row["job_id"], row["filename"]) for row in rows],
+            )
+        return [CardTask(row["job_id"], row["batch_name"], row["filename"], row["attempts"] + 1) for row in rows]
+
+    def heartbeat_cards(self, owner: str) -> int:
+        """Renews the leases of all cards a worker holds; returns how many it still holds."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE card_tasks SET lease_expires = ? WHERE status = ? AND lease_owner = ?",
+                (now + self.lease_seconds, LEASED, owner),
+            ).rowcount
+
+    def release_cards(self, owner: str) -> int:
+        """Hands a stopping worker's cards back; the attempt does not count."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE card_tasks SET status = ?, attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE status = ? AND lease_owner = ?",
+                (PENDING, now, LEASED, owner),
+            ).rowcount
+
+    # --- observation ------------------------------------------------------
+
+    def latest_statuses(self) -> Dict[str, str]:
+        """Status of each batch's most recent job."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT batch_name, status FROM jobs WHERE id IN (SELECT MAX(id) FROM jobs GROUP BY batch_name)"
+            ).fetchall()
+        return {row["batch_name"]: row["status"] for row in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            jobs = {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            active = [
+                {
+                    "job_id": row["id"],
+                    "batch_name": row["batch_name"],
+                    "status": row["status"],
+                    "attempts": row["attempts"],
+                    "lease_owner": row["lease_owner"],
+                    "lease_remaining": round(row["lease_expires"] - time.time(), 1) if row["lease_expires"] else None,
+                    "cancel_requested": bool(row["cancel_requested"]),
+                    "cards": {
+                        c["status"]: c["n"]
+                        for c in conn.execute(
+                            "SELECT status, COUNT(*) AS n FROM card_tasks WHERE job_id = ? GROUP BY status", (row["id"],)
+                        )
+                    },
+                }
+                for row in conn.execute(
+                    "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY id", (QUEUED, RUNNING)
+                ).fetchall()
+            ]
+            workers = {
+                row["lease_owner"]: row["n"]
+                for row in conn.execute(
+                    "SELECT c.lease_owner, COUNT(*) AS n FROM card_tasks AS c JOIN jobs AS j ON j.id = c.job_id "
+                    "WHERE c.status = ? AND j.dispatched = 1 GROUP BY c.lease_owner",
+                    (LEASED,),
+                )
+            }
+        return {"jobs": jobs, "active": active, "workers_in_flight": workers}
+
+
+job_queue = JobQueue()
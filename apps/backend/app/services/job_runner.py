@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.batch_manager import batch_manager
+from app.services.job_queue import FAILED, Job, JobQueue, job_queue, make_owner
+from app.services.ws_manager import ws_manager
+
+logger = logging.getLogger(__name__)
+
+# handler(batch_name, retry_errors=..., job_id=...) -> final status of the run
+JobHandler = Callable[..., Awaitable[str]]
+
+
+class JobRunner:
+    """Claims queued jobs from the durable job queue and runs them on the event loop.
+
+    Up to JOB_MAX_CONCURRENT jobs run at once. Each holds a lease that a heartbeat task
+    renews every JOB_HEARTBEAT_SECONDS; the heartbeat also forwards cancel requests
+    made through the queue and stops the run if the lease was lost to another runner.
+    Expired leases of other (crashed) runners are swept back into the queue, so batches
+    interrupted by a restart resume from their last checkpoint.
+    """
+
+    def __init__(self, queue: JobQueue) -> None:
+        self.queue = queue
+        self.owner = make_owner()
+        self._handler: Optional[JobHandler] = None
+        self._running: Dict[int, asyncio.Task] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self, handler: JobHandler) -> None:
+        """Starts claiming jobs on the running event loop (called from the app's lifespan)."""
+        self._handler = handler
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run_loop())
+        logger.info(f"Job runner {self.owner} started")
+
+    async def stop(self) -> None:
+        """Stops claiming; running jobs are cancelled and handed back to the queue."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def wake(self) -> None:
+        """Claims newly queued jobs right away instead of at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run_loop(self) -> None:
+        assert self._wake is not None
+        last_sweep = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if loop.time() - last_sweep >= settings.JOB_HEARTBEAT_SECONDS:
+                    last_sweep = loop.time()
+                    for requeued in await asyncio.to_thread(self.queue.requeue_expired, self.owner):
+                        batch_manager.update_batch_status(requeued.batch_name, "queued")
+                while len(self._running) < settings.JOB_MAX_CONCURRENT:
+                    job = await asyncio.to_thread(self.queue.claim, self.owner)
+                    if job is None:
+                        break
+                    self._running[job.id] = asyncio.create_task(self._run_job(job))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Job runner loop error: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job: Job) -> None:
+        assert self._handler is not None
+        logger.info(f"Running job {job.id} for batch {job.batch_name} (attempt {job.attempts})")
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        status, error = FAILED, None
+        try:
+            # A resumed run must not pull the cards it already failed back out of _errors/
+            status = await self._handler(
+                job.batch_name, retry_errors=job.retry_errors and job.attempts == 1, job_id=job.id
+            )
+        except asyncio.CancelledError:
+            # Shutdown: hand the job back so the next runner resumes it right away
+            self.queue.release(job.id, self.owner)
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job.id} for batch {job.batch_name} failed: {e}")
+            error = str(e)
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job.id, None)
+        if not await asyncio.to_thread(self.queue.finish, job.id, self.owner, status, error):
+            logger.warning(f"Job {job.id} for batch {job.batch_name} finished after its lease was lost")
+        self.wake()
+
+    async def _heartbeat(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_SECONDS)
+            try:
+                cancel_requested = await asyncio.to_thread(self.queue.heartbeat, job.id, self.owner)
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job.id} failed: {e}")
+                continue
+            if cancel_requested is None:
+                logger.error(f"Job {job.id} for batch {job.batch_name} lost its lease — stopping this run")
+                ws_manager.cancel_batch(job.batch_name)
+                return
+            if cancel_requested:
+                ws_manager.cancel_batch(job.batch_name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "running_jobs": sorted(self._running)}
+
+
+job_runner = JobRunner(job_queue)
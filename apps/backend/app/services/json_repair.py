@@ -0,0 +1,130 @@
+"""Tolerant parsing of malformed JSON answers from the VLM.
+
+Handles the failure modes seen in practice: duplicated or unbalanced code fences,
+trailing commas, single-quoted strings, unterminated strings, missing commas between
+members and output truncated at max_tokens (open strings and brackets are closed,
+a dangling key gets an empty value).
+"""
+import json
+import re
+from typing import Any, Iterator, List, Optional
+
+FENCED_BLOCK = re.compile(r"```[a-zA-Z]*\s*(.*?)```", re.DOTALL)
+# After a line break inside a string: does the next line start a new member or close the value?
+NEXT_MEMBER = re.compile(r"""\s*(?:["'][^"'\n]*["']\s*:|[}\]])""")
+DANGLING_KEY = re.compile(r'[{,]\s*"(?:[^"\\]|\\.)*"\s*$')
+
+
+def repair_json(content: str) -> Optional[Any]:
+    """Returns the parsed value of a malformed answer, or None if it cannot be repaired."""
+    for candidate in _candidates(content):
+        for text in (candidate, _normalize(candidate)):
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+def _candidates(content: str) -> Iterator[str]:
+    """Fenced blocks first (the first of duplicated fences wins), then the unfenced text."""
+    for block in FENCED_BLOCK.findall(content):
+        block = block.strip()
+        if block:
+            yield block
+    unfenced = re.sub(r"```[a-zA-Z]*", "", content)
+    starts = [i for i in (unfenced.find("{"), unfenced.find("[")) if i != -1]
+    if starts:
+        yield unfenced[min(starts):].strip()
+
+
+def _last_significant(out: List[str]) -> str:
+    for chunk in reversed(out):
+        stripped = chunk.strip()
+        if stripped:
+            return stripped[-1]
+    return ""
+
+
+def _missing_comma(out: List[str]) -> bool:
+    """Whether the value about to start directly follows a complete value or member."""
+    last = _last_significant(out)
+    return last in ('"', "}", "]") or last.isalnum()
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    while out and not out[-1].strip():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _normalize(text: str) -> str:
+    """Rewrites text into strict JSON as far as its structure allows."""
+    out: List[str] = []
+    stack: List[str] = []
+    quote = ""  # delimiter of the string being read, "" outside strings
+    escape = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if escape:
+                if ch == "'":
+                    out[-1] = ch  # \' is not a JSON escape: keep the bare quote
+                else:
+                    out.append(ch)
+                escape = False
+            elif ch == "\\":
+                out.append(ch)
+                escape = True
+            elif ch == quote:
+                out.append('"')
+                quote = ""
+            elif ch == '"':
+                out.append('\\"')  # double quote inside a single-quoted string
+            elif ch == "\n":
+                if NEXT_MEMBER.match(text, i + 1):
+                    out.append('"')  # the model forgot the closing quote
+                    quote = ""
+                else:
+                    out.append("\\n")
+            elif ch in "\r\t":
+                out.append("\\r" if ch == "\r" else "\\t")
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            if _missing_comma(out):
+                out.append(",")  # missing comma between members
+            out.append('"')
+            quote = ch
+        elif ch in "{[":
+            if _missing_comma(out):
+                out.append(",")  # missing comma between array elements
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack and stack[-1] == ch:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # ignore whatever follows the value
+        else:
+            out.append(ch)
+        i += 1
+
+    # Truncated output: close the open string and containers
+    if quote:
+        if escape:
+            out.pop()
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    while stack:
+        repaired = repaired.rstrip().rstrip(",")
+        if repaired.endswith(":"):
+            repaired += ' ""'
+        elif stack[-1] == "}" and DANGLING_KEY.search(repaired):
+            repaired += ': ""'
+        repaired += stack.pop()
+    return repaired
@@ -0,0 +1,243 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: flushes are serialized within the process only
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def write_json_atomic(path: Path, value: Any, indent: Optional[int] = 2) -> None:
+    """Writes value as JSON to a temp file next to path, fsyncs it and renames it over path,
+    so readers and a crash only ever see the old or the new complete file. The temp name
+    is unique per call, so concurrent writers never share a half-written temp file."""
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock on path's sidecar .lock file, held across processes."""
+    with open(path.with_name(path.name + ".lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class JsonDocument:
+    """A small JSON file (batches.json, a batch's config.json) kept in memory.
+
+    Reads are served from memory; updates run under a lock on the in-memory value and
+    are written behind: the first change schedules a flush METADATA_FLUSH_SECONDS later,
+    so a burst of changes costs one write. A flush writes a temp file, fsyncs it and
+    renames it over the document, so the file on disk is always a complete version.
+    If another process changed the file and nothing is pending here, the next read
+    reloads it. Processes sharing a file (several API workers, WORKER_MODE=external)
+    each write behind their own copy, so a flush takes a lock on the file's .lock
+    sidecar and, if the file changed since it was loaded, rereads it and replays the
+    update() functions pending here on top before writing. Without fcntl (Windows)
+    there is no cross-process lock and the last writer wins. An unreadable file is
+    moved aside and the document starts from its default
+    (batch_manager.recover_history rebuilds missing history entries).
+    """
+
+    def __init__(self, path: Path, default: Callable[[], Any], flush_delay: float) -> None:
+        self.path = path
+        self._default = default
+        self._flush_delay = flush_delay
+        self._value: Any = None
+        self._loaded = False
+        self._disk_stat: Optional[Tuple[int, int, int]] = None
+        self._dirty = False
+        # update() functions applied since the last flush, replayed on a file changed by another process
+        self._pending: List[Callable[[Any], Any]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self.flushes = 0
+        # Bumped on every load and edit, so callers can cache values derived from the document
+        self.generation = 0
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        # Every write renames a new file into place, so the inode changes even within one mtime tick
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self) -> None:
+        stat = self._stat()
+        value = self._default()
+        if stat is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except ValueError as e:
+                aside = self.path.with_name(f"{self.path.stem}.corrupt-{int(time.time())}{self.path.suffix}")
+                os.replace(self.path, aside)
+                logger.error(f"Unreadable {self.path}, moved to {aside.name}: {e}")
+                stat = None
+        self._value = value
+        self._disk_stat = stat
+        self._loaded = True
+        self.generation += 1
+
+    def _current(self) -> Any:
+        """In-memory value, reloaded if the file changed on disk and nothing is pending (lock held)."""
+        if not self._loaded or (not self._dirty and self._stat() != self._disk_stat):
+            self._load()
+        return self._value
+
+    def read(self) -> Any:
+        """A copy of the current value."""
+        with self._lock:
+            return copy.deepcopy(self._current())
+
+    @contextmanager
+    def view(self) -> Iterator[Any]:
+        """The current value itself, under the lock; must not be modified or kept."""
+        with self._lock:
+            yield self._current()
+
+    def update(self, fn: Callable[[Any], T]) -> T:
+        """Runs fn on the value under the lock (fn mutates it in place) and schedules a flush.
+
+        fn is kept until the flush and run again if another process changed the file
+        meanwhile, so it must derive everything from the value it is given.
+        """
+        with self._lock:
+            result = fn(self._current())
+            self._pending.append(fn)
+            self._dirty = True
+            self.generation += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self._flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return result
+
+    def _merge(self) -> None:
+        """Reloads the file another process changed and replays the pending updates on it (lock held)."""
+        pending = self._pending
+        self._load()
+        for fn in pending:
+            try:
+                fn(self._value)
+            except Exception as e:
+                logger.error(f"Dropped an update of {self.path} that failed on the reloaded file: {e}")
+
+    def flush(self) -> bool:
+        """Writes pending changes now; returns whether there were any."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return False
+            try:
+                with _file_lock(self.path):
+                    if self._stat() != self._disk_stat:
+                        self._merge()
+                    write_json_atomic(self.path, self._value)
+                    self._disk_stat = self._stat()
+            except FileNotFoundError:
+                # The directory is gone (batch deleted); nothing left to persist
+                self._dirty = False
+                self._pending = []
+                return False
+            except Exception as e:
+                logger.error(f"Failed to write {self.path}: {e}")
+                self._timer = threading.Timer(self._flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return False
+            self._dirty = False
+            self._pending = []
+            self.flushes += 1
+            return True
+
+    @property
+    def pending(self) -> bool:
+        """Changes not yet written."""
+        return self._dirty
+
+    def discard(self) -> None:
+        """Drops pending changes (the file is being deleted)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty = False
+            self._pending = []
+            self._loaded = False
+            self._value = None
+
+
+class MetadataStore:
+    """One JsonDocument per file, shared by everything in the process that reads or writes it."""
+
+    def __init__(self, flush_delay: float = settings.METADATA_FLUSH_SECONDS) -> None:
+        self.flush_delay = flush_delay
+        self._docs: Dict[Path, JsonDocument] = {}
+        self._lock = threading.Lock()
+
+    def document(self, path: Path, default: Callable[[], Any] = dict) -> JsonDocument:
+        key = path.resolve()
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is None:
+                doc = JsonDocument(path, default, self.flush_delay)
+                self._docs[key] = doc
+            return doc
+
+    def drop(self, path: Path) -> None:
+        """Forgets a document without writing it (its directory is being deleted)."""
+        with self._lock:
+            doc = self._docs.pop(path.resolve(), None)
+        if doc is not None:
+            doc.discard()
+
+    def flush_all(self) -> int:
+        """Writes all pending changes (shutdown); returns the documents written."""
+        with self._lock:
+            docs = list(self._docs.values())
+        return sum(doc.flush() for doc in docs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            docs = list(self._docs.values())
+        return {
+            "documents": len(docs),
+            "pending": sum(doc.pending for doc in docs),
+            "flushes": sum(doc.flushes for doc in docs),
+        }
+
+
+metadata_store = MetadataStore()
+atexit.register(metadata_store.flush_all)
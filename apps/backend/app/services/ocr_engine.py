@@ -1,42 +1,87 @@
 import asyncio
-import base64
-import io
+import functools
+import itertools
 import json
 import logging
+import multiprocessing
 import random
 import re
+import shutil
 import threading
 import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Awaitable, Dict, Generator, List, Optional, Tuple, Callable
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 
+import httpx
 import requests
-from PIL import Image
 from app.core.config import settings
+from app.services.batch_api import TERMINAL_STATES, BatchApiClient, BatchApiError
+from app.services.checkpoint import CheckpointStore, checkpoints
+from app.services.circuit_breaker import OPEN, CircuitBreaker, ProviderRoute, circuit_breakers, provider_unavailable
+from app.services.concurrency import AdaptiveLimiter, concurrency_controller
+from app.services.extraction_cache import extraction_cache
+from app.services.hedging import HedgePolicy, LatencyReport, hedging
+from app.services.history_index import history_index
+from app.services.image_cache import image_cache
+from app.services.image_prep import prepare_image, prepare_image_with_stats
+from app.services.job_queue import job_queue
+from app.services.metadata_store import write_json_atomic
+from app.services.prompts import render_prompt
+from app.services.json_repair import repair_json
+from app.services.rate_limiter import TokenBucket, rate_limiter
+from app.services.results_store import results_store
+from app.services.scheduler import card_scheduler
+from app.services.stream_parser import StreamedCompletion
+from app.services.structured_output import response_format_for, structured_output
 
 logger = logging.getLogger(__name__)
 
+# (data, error, token usage) of one card request, as passed through hedging
+CallOutcome = Tuple[Optional[Dict], Optional[str], Dict[str, Any]]
+# (response body, error) of a chat-completion request
+CompletionReply = Tuple[Optional[Dict[str, Any]], Optional[str]]
+# (seconds to wait before retrying, final error): exactly one of them is set
+RetryDecision = Tuple[Optional[float], Optional[str]]
+# Requests of one API call as a generator: yields _post_completion arguments, is sent their
+# CompletionReply and returns the call's outcome (see _run_requests)
+RequestPlan = Generator[Dict[str, Any], CompletionReply, Any]
+
 class OcrEngine:
     def __init__(self, api_key: Optional[str] = None):
         self.session = requests.Session()
         self.session.headers.update({"Content-Type": "application/json"})
         self.api_key = api_key or settings.OPENROUTER_API_KEY
+        self._prep_pool: Optional[Executor] = None
+        self._prep_pool_lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._network_pool: Optional[ThreadPoolExecutor] = None
+        # First requests of the async engine left running after their hedge answered
+        self._background: set = set()
         
     def _encode_image_to_base64(self, image_path: Path, max_size: Optional[int] = 1600) -> str:
-        """Kodiert ein Bild als Base64; optional vorheriges Resize."""
-        if max_size:
-            try:
-                img = Image.open(image_path)
-                img.thumbnail((max_size, max_size))
-                buf = io.BytesIO()
-                img.save(buf, format="JPEG", quality=85)
-                return base64.b64encode(buf.getvalue()).decode("utf-8")
-            except Exception as e:
-                logger.warning(f"Resize failed for {image_path}: {e} — fallback to raw")
-        
-        with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+        """Kodiert ein Bild als Base64; optional vorheriges Resize (siehe image_prep)."""
+        return prepare_image(image_path, max_size)
+
+    def warm_image_cache(self, batch_dir: Path, max_size: int = 1600) -> int:
+        """Pre-encodes all cards of a batch so the first run starts with a warm cache."""
+        if not settings.ENCODED_IMAGE_CACHE_ENABLED:
+            return 0
+        return image_cache.warm(batch_dir, max_size, prepare_image)
+
+    def _get_prep_pool(self) -> Executor:
+        """Lazily created pool for the image preparation stage, shared by all batches."""
+        with self._prep_pool_lock:
+            if self._prep_pool is None:
+                if settings.PREP_USE_PROCESSES:
+                    # spawn: never fork a process that runs an event loop and worker threads
+                    self._prep_pool = ProcessPoolExecutor(
+                        max_workers=settings.PREP_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._prep_pool = ThreadPoolExecutor(max_workers=settings.PREP_WORKERS)
+            return self._prep_pool
 
     def _extract_json_from_model_content(self, content: str) -> str:
         """Entfernt Markdown-Fences und extrahiert sauberes JSON (Objekt oder Array).
@@ -103,235 +148,1300 @@ class OcrEngine:
         ]
         return any(re.match(p, signature) for p in patterns)
 
-    def _generate_prompt(self, fields: List[str], template: Optional[str] = None) -> str:
-        """Generiert einen dynamischen Prompt basierend auf den gewünschten Feldern.
-
-        If template is provided, renders it by substituting {{fields}} with the fields block.
-        If {{fields}} is not present in the template, the fields block is appended.
-        If template is None, falls back to the default hardcoded German prompt.
-        """
-        fields_block = "\n".join([f"{i+1}. **{field}**: Extrahiere den Wert für das Feld '{field}'." for i, field in enumerate(fields)])
+    def _render_prompt(self, fields: Optional[List[str]], prompt_template: Optional[str] = None) -> str:
+        return render_prompt(tuple(fields) if fields else None, prompt_template)
 
-        if template is not None:
-            if "{{fields}}" in template:
-                return template.replace("{{fields}}", fields_block)
-            else:
-                return template + "\n\n" + fields_block
+    def _cache_lookup(
+        self,
+        image_path: Path,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+    ) -> Tuple[str, Optional[Any]]:
+        """Returns (cache key, cached parsed answer or None)."""
+        key = extraction_cache.make_key(
+            image_path,
+            self._render_prompt(fields, prompt_template),
+            model_name or settings.MODEL_NAME,
+            max_size,
+            settings.TEMPERATURE,
+        )
+        return key, extraction_cache.get(key)
 
-        return f"""Du bist ein Experte für die Digitalisierung historischer Archivkarteikarten.
+    def _build_payload(
+        self,
+        image_path: Path,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        prompt_template: Optional[str] = None,
+        model_name: Optional[str] = None,
+        base64_image: Optional[str] = None,
+        structured: bool = False,
+    ) -> Dict[str, Any]:
+        """Baut den Chat-Completion-Request (Prompt + Bild) für eine Karte.
 
-Deine Aufgabe ist es, die Informationen von der Karteikarte präzise zu extrahieren.
-Achte besonders auf die Handschrift und mögliche Streichungen.
+        With structured=True a JSON Schema of the fields is sent as response_format.
+        """
+        if base64_image is None:
+            base64_image = self._encode_image_to_base64(image_path, max_size=max_size)
+        prompt = self._render_prompt(fields, prompt_template)
 
-**Extrahiere folgende Felder:**
-{fields_block}
+        payload = {
+            "model": model_name or settings.MODEL_NAME,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    ]
+                }
+            ],
+            "temperature": settings.TEMPERATURE,
+            "max_tokens": settings.MAX_TOKENS
+        }
+        if structured:
+            payload["response_format"] = response_format_for(fields)
+        return payload
 
-Falls ein Feld nicht auf der Karte vorhanden ist oder nicht entziffert werden kann, verwende einen leeren String ("").
-Ändere nichts an der Schreibweise historischer Begriffe, außer bei offensichtlichen Tippfehlern.
+    def _render_multi_prompt(
+        self,
+        fields: Optional[List[str]],
+        prompt_template: Optional[str],
+        filenames: List[str],
+    ) -> str:
+        """Single-card prompt plus the instructions for answering several cards at once."""
+        file_list = "\n".join(f"- {name}" for name in filenames)
+        return self._render_prompt(fields, prompt_template) + f"""
+**MEHRERE KARTEN:** Diese Anfrage enthält {len(filenames)} verschiedene Karteikarten. Vor jedem Bild steht sein Dateiname:
+{file_list}
 
-**AUSGABEFORMAT:** Antworte NUR mit einem validen JSON-Objekt.
+Extrahiere die Felder für jede Karte getrennt. Antworte statt eines einzelnen Objekts NUR mit einem validen JSON-Array mit genau einem Objekt pro Karte, in derselben Reihenfolge wie die Bilder. Jedes Objekt enthält zusätzlich das Feld "Datei" mit dem Dateinamen der Karte.
 """
 
-    def _call_vlm_api_resilient(
+    def _build_multi_payload(
         self,
-        image_path: Path,
+        cards: List[Tuple[str, str]],
         fields: Optional[List[str]] = None,
-        max_size: Optional[int] = 1600,
         prompt_template: Optional[str] = None,
-        api_endpoint: Optional[str] = None,
         model_name: Optional[str] = None,
-        api_key: Optional[str] = None,
-    ) -> Tuple[Optional[Dict], Optional[str]]:
-        """Resilienter API-Aufruf: Session, exponential backoff with jitter."""
-        resolved_endpoint = api_endpoint or settings.API_ENDPOINT
-        resolved_model = model_name or settings.MODEL_NAME
-        resolved_key = api_key if api_key is not None else self.api_key
+    ) -> Dict[str, Any]:
+        """Baut einen Chat-Completion-Request für mehrere Karten: (Dateiname, Base64-Bild) je Karte."""
+        content: List[Dict[str, Any]] = [
+            {"type": "text", "text": self._render_multi_prompt(fields, prompt_template, [name for name, _ in cards])}
+        ]
+        for name, base64_image in cards:
+            content.append({"type": "text", "text": f"Datei: {name}"})
+            content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}})
 
-        if not resolved_key:
-            return None, "API Key missing"
+        return {
+            "model": model_name or settings.MODEL_NAME,
+            "messages": [{"role": "user", "content": content}],
+            "temperature": settings.TEMPERATURE,
+            "max_tokens": min(settings.MAX_TOKENS * len(cards), settings.MULTI_CARD_MAX_TOKENS),
+        }
+
+    def _split_multi_response(self, parsed: Any, filenames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Maps a multi-card answer back to its cards via the "Datei" field.
+
+        Accepts the requested array as well as an object keyed by filename, and matches
+        names with or without extension. Entries naming no requested card, non-objects
+        and cards claimed twice are dropped, so those cards fall back to single requests.
+        """
+        if isinstance(parsed, dict):
+            if "Datei" in parsed:
+                parsed = [parsed]
+            else:
+                parsed = [dict(v, Datei=k) for k, v in parsed.items() if isinstance(v, dict)]
+        if not isinstance(parsed, list):
+            return {}
+
+        lookup = {name: name for name in filenames}
+        lookup.update({Path(name).stem: name for name in filenames})
+        answered: Dict[str, Dict[str, Any]] = {}
+        duplicates = set()
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            name = lookup.get(str(item.get("Datei", "")).strip())
+            if name is None:
+                continue
+            if name in answered:
+                duplicates.add(name)
+            answered[name] = item
+        for name in duplicates:
+            del answered[name]
+        return answered
+
+    def _http_error_message(self, resp: Any) -> str:
+        """Formats an HTTP error (requests or httpx response) including a body excerpt."""
+        error_msg = f"HTTP {resp.status_code}"
+        try:
+            err_json = resp.json()
+            detail = (
+                err_json.get("error", {}).get("message")
+                or err_json.get("detail")
+                or ""
+            )
+            if detail:
+                error_msg += f": {str(detail)[:250]}"
+            else:
+                body = resp.text[:250].strip()
+                if body:
+                    error_msg += f": {body}"
+        except Exception:
+            body = resp.text[:250].strip()
+            if body:
+                error_msg += f": {body}"
+        return error_msg
 
-        base64_image = self._encode_image_to_base64(image_path, max_size=max_size)
-        headers = {"Authorization": f"Bearer {resolved_key}"}
+    def _schema_rejected(self, error: Optional[str]) -> bool:
+        """A 400/422 on a structured request: most likely the provider does not accept response_format."""
+        return error is not None and error.startswith(("HTTP 400", "HTTP 422"))
 
-        prompt = self._generate_prompt(fields, template=prompt_template) if fields else settings.EXTRACTION_PROMPT
+    def _circuit_tripped(self, breaker: CircuitBreaker, fail_fast: bool) -> bool:
+        """With a fallback provider at hand, a retry is not worth waiting for once the circuit opened."""
+        return fail_fast and breaker.state == OPEN
 
-        payload = {
-            "model": resolved_model,
+    def _circuit_error(self, endpoint: str) -> str:
+        return f"Circuit offen für {endpoint} – Anbieter vorübergehend gemieden"
+
+    def _route_chain(
+        self,
+        routes: Optional[List[ProviderRoute]],
+        api_endpoint: Optional[str],
+        model_name: Optional[str],
+        api_key: Optional[str],
+    ) -> List[ProviderRoute]:
+        """The provider chain to try in order; without one, just the given endpoint."""
+        if routes:
+            return routes
+        return [ProviderRoute(
+            "",
+            api_endpoint or settings.API_ENDPOINT,
+            model_name or settings.MODEL_NAME,
+            api_key if api_key is not None else self.api_key,
+        )]
+
+    def provider_chain(
+        self,
+        provider: Optional[str],
+        api_endpoint: Optional[str],
+        model_name: Optional[str],
+        api_key: Optional[str],
+        fallback_routes: Optional[List[ProviderRoute]],
+    ) -> Optional[List[ProviderRoute]]:
+        """Routes of a batch with fallback providers: its own provider (named provider, else
+        "primary") followed by fallback_routes; None without fallbacks."""
+        if not fallback_routes:
+            return None
+        primary = self._route_chain(None, api_endpoint, model_name, api_key)[0]
+        return [primary._replace(provider=provider or "primary")] + list(fallback_routes)
+
+    def _available_route(self, chain: List[ProviderRoute]) -> ProviderRoute:
+        """First route whose circuit is not open; the last one if all are."""
+        for route in chain[:-1]:
+            if circuit_breakers.get(route.endpoint).state != OPEN:
+                return route
+        return chain[-1]
+
+    def _network_cap(self, routes: Optional[List[ProviderRoute]]) -> int:
+        """Card requests one run can actually have in flight: the card scheduler's budget,
+        further bounded by the adaptive and rate limits of the run's endpoints."""
+        endpoints = len({route.endpoint for route in routes}) if routes else 1
+        cap = min(settings.SCHEDULER_MAX_WORKERS, settings.RATE_LIMIT_MAX_CONCURRENT * endpoints)
+        if settings.ADAPTIVE_CONCURRENCY:
+            cap = min(cap, settings.CONCURRENCY_MAX * endpoints)
+        return max(1, cap)
+
+    def _get_network_pool(self) -> ThreadPoolExecutor:
+        """Threads of the threaded engine, shared by all batches; the card scheduler keeps
+        at most SCHEDULER_MAX_WORKERS of them busy."""
+        with self._prep_pool_lock:
+            if self._network_pool is None:
+                self._network_pool = ThreadPoolExecutor(
+                    max_workers=settings.SCHEDULER_MAX_WORKERS, thread_name_prefix="card"
+                )
+            return self._network_pool
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        """Threads for hedged requests of the threaded engine (primary and duplicate)."""
+        with self._prep_pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=2 * settings.CONCURRENCY_MAX, thread_name_prefix="hedge"
+                )
+            return self._hedge_pool
+
+    HEDGE_RECHECK = 0.25  # seconds between checks while a request waits for its slot or latencies are unknown
+
+    def _hedge_due(self, policy: HedgePolicy, timing: Dict[str, float]) -> Tuple[bool, float]:
+        """(whether the running request is due for a hedge, seconds to wait before checking again).
+
+        The hedge delay counts from the moment the request was sent: a request still waiting
+        for a rate-limit or concurrency slot would only be duplicated into the same queue.
+        """
+        delay = policy.hedge_delay()
+        sent = timing.get("sent")
+        if delay is None or sent is None:
+            return False, self.HEDGE_RECHECK
+        remaining = sent + delay - time.monotonic()
+        return remaining <= 0, max(remaining, 0.0)
+
+    def _record_unhedged(self, policy: HedgePolicy, report: LatencyReport, sent: float) -> None:
+        """Records the latency of a request that answered without a duplicate."""
+        elapsed = time.monotonic() - sent
+        policy.record(elapsed)
+        report.add(elapsed, elapsed)
+
+    def _hedged_sync(
+        self, endpoint: str, batch_name: str, call: Callable[[Dict[str, float]], CallOutcome]
+    ) -> Tuple[CallOutcome, Dict[str, Any]]:
+        """Runs call(timing), with a duplicate once it outlives the endpoint's hedge delay (see HedgePolicy).
+
+        call writes the time its request was first sent into timing["sent"]. Returns the
+        first successful outcome — or the last failure — plus the hedge flags for the card
+        result; latencies go to the batch's LatencyReport. A requests call cannot be
+        aborted, so a losing first request finishes in the background and its answer is
+        discarded. The hedge delay is learned from the first requests alone, each with
+        its own latency, never from the answers a hedge sped up.
+        """
+        report = hedging.report(batch_name)
+        policy = hedging.get(endpoint)
+        start = time.monotonic()
+        timing: Dict[str, float] = {}
+        if not settings.HEDGE_REQUESTS:
+            outcome = call(timing)
+            self._record_unhedged(policy, report, timing.get("sent", start))
+            return outcome, {}
+
+        policy.count_request()
+        primary = self._get_hedge_pool().submit(self._timed_call, call, timing)
+        while True:
+            due, wait_for = self._hedge_due(policy, timing)
+            if due or wait([primary], timeout=wait_for)[0]:
+                break
+        sent = timing.get("sent", start)
+        if primary.done() or not policy.try_hedge():
+            outcome = primary.result()
+            self._record_unhedged(policy, report, sent)
+            return outcome, {}
+
+        hedge = self._get_hedge_pool().submit(call, {})
+        pending: set = {primary, hedge}
+        winner: Future = primary
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = primary if primary in done else next(iter(done))
+            if winner.result()[1] is None:
+                break  # first successful answer wins
+        index = self._record_hedged(policy, report, timing, sent, winner is hedge)
+        if index is not None:
+            primary.add_done_callback(lambda _: self._record_primary(policy, report, index, timing, sent))
+        return winner.result(), {"hedged": True, "hedge_won": winner is hedge}
+
+    async def _hedged_async(
+        self, endpoint: str, batch_name: str, call: Callable[[Dict[str, float]], Awaitable[CallOutcome]]
+    ) -> Tuple[CallOutcome, Dict[str, Any]]:
+        """Event-loop counterpart of _hedged_sync. A first request that loses to its hedge is
+        left to finish in the background so its own latency is learned; if the card's task
+        is cancelled, all of its requests are. The duplicate waits for its concurrency slot
+        like any other request, behind the cards already queued for one."""
+        report = hedging.report(batch_name)
+        policy = hedging.get(endpoint)
+        start = time.monotonic()
+        timing: Dict[str, float] = {}
+        if not settings.HEDGE_REQUESTS:
+            outcome = await call(timing)
+            self._record_unhedged(policy, report, timing.get("sent", start))
+            return outcome, {}
+
+        policy.count_request()
+        primary = asyncio.ensure_future(self._timed_call_async(call, timing))
+        tasks = {primary}
+        try:
+            while True:
+                due, wait_for = self._hedge_due(policy, timing)
+                if due or (await asyncio.wait(tasks, timeout=wait_for))[0]:
+                    break
+            sent = timing.get("sent", start)
+            if primary.done() or not policy.try_hedge():
+                outcome = await primary
+                self._record_unhedged(policy, report, sent)
+                return outcome, {}
+
+            hedge = asyncio.ensure_future(call({}))
+            tasks.add(hedge)
+            pending = set(tasks)
+            winner = primary
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = primary if primary in done else next(iter(done))
+                if winner.result()[1] is None:
+                    break
+            index = self._record_hedged(policy, report, timing, sent, winner is hedge)
+            if index is not None:
+                tasks.discard(primary)
+                self._background.add(primary)
+
+                def _primary_done(task: asyncio.Future) -> None:
+                    self._background.discard(task)
+                    if not task.cancelled():
+                        self._record_primary(policy, report, index, timing, sent)
+
+                primary.add_done_callback(_primary_done)
+            return winner.result(), {"hedged": True, "hedge_won": winner is hedge}
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _timed_call(self, call: Callable[[Dict[str, float]], CallOutcome], timing: Dict[str, float]) -> CallOutcome:
+        """Runs call(timing) and notes in timing["done"] when it finished."""
+        try:
+            return call(timing)
+        finally:
+            timing["done"] = time.monotonic()
+
+    async def _timed_call_async(
+        self, call: Callable[[Dict[str, float]], Awaitable[CallOutcome]], timing: Dict[str, float]
+    ) -> CallOutcome:
+        try:
+            return await call(timing)
+        finally:
+            timing["done"] = time.monotonic()
+
+    def _record_hedged(
+        self, policy: HedgePolicy, report: LatencyReport, timing: Dict[str, float], sent: float, hedge_won: bool
+    ) -> Optional[int]:
+        """Records a hedged request once it is answered; returns its report index while the
+        first request is still running (its latency follows via _record_primary)."""
+        elapsed = time.monotonic() - sent
+        if "done" not in timing:
+            return report.add(elapsed, elapsed, hedged=True, hedge_won=hedge_won)
+        primary = timing["done"] - sent
+        policy.record(primary)
+        index = report.add(elapsed, primary, hedged=True, hedge_won=hedge_won)
+        report.set_primary(index, primary)
+        return None
+
+    def _record_primary(
+        self, policy: HedgePolicy, report: LatencyReport, index: int, timing: Dict[str, float], sent: float
+    ) -> None:
+        """Records the latency of a first request that finished after its hedge answered."""
+        seconds = timing.get("done", time.monotonic()) - sent
+        policy.record(seconds)
+        report.set_primary(index, seconds)
+
+    def _retry_wait(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Backoff in seconds: Retry-After header if numeric, else exponential with jitter."""
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return (2 ** attempt) + random.uniform(0, 1)
+
+    def _parse_completion(self, result: Dict[str, Any], image_path: Path) -> Tuple[Optional[Any], Optional[str]]:
+        """Extracts and parses the JSON answer from a chat-completion response body."""
+        data, error, _ = self._parse_completion_outcome(result, image_path)
+        return data, error
+
+    def _parse_completion_outcome(
+        self, result: Dict[str, Any], image_path: Path
+    ) -> Tuple[Optional[Any], Optional[str], str]:
+        """Like _parse_completion, plus how the answer was obtained: "ok", "repaired" or "failed".
+
+        Invalid JSON goes through repair_json (fences, trailing commas, single quotes,
+        unterminated strings, truncation) before the answer counts as failed.
+        """
+        if "choices" in result and len(result["choices"]) > 0:
+            content = result["choices"][0]["message"]["content"] or ""
+            cleaned = self._extract_json_from_model_content(content)
+            try:
+                return json.loads(cleaned), None, "ok"
+            except json.JSONDecodeError:
+                pass
+            repaired = repair_json(content)
+            if repaired is not None:
+                logger.info(f"Repaired invalid JSON for {image_path.name}")
+                return repaired, None, "repaired"
+            raw_preview = cleaned[:120].replace("\n", " ")
+            logger.warning(f"JSON decode failed for {image_path.name}: {raw_preview}")
+            return None, f"JSON-Parsing fehlgeschlagen. Antwort: {raw_preview}", "failed"
+        return None, "Keine Antwort vom Modell (leere choices)", "failed"
+
+    def _build_fix_payload(
+        self, content: str, fields: Optional[List[str]], model_name: Optional[str], structured: bool
+    ) -> Dict[str, Any]:
+        """Text-only follow-up asking the model to turn its own invalid answer into valid JSON."""
+        keys = ", ".join(fields or settings.FIELD_KEYS)
+        payload: Dict[str, Any] = {
+            "model": model_name or settings.MODEL_NAME,
             "messages": [
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                    ]
+                    "content": (
+                        "Die folgende Antwort sollte ein valides JSON-Objekt mit den Feldern "
+                        f"{keys} sein, ist aber kein valides JSON. Gib exakt dieselben Daten als "
+                        "valides JSON-Objekt zurück, ohne Markdown und ohne weiteren Text.\n\n"
+                        f"{content}"
+                    ),
                 }
             ],
-            "temperature": 0.1,
-            "max_tokens": 4096
+            "temperature": 0.0,
+            "max_tokens": settings.MAX_TOKENS,
         }
+        if structured:
+            payload["response_format"] = response_format_for(fields)
+        return payload
+
+    def _fix_content(self, result: Dict[str, Any]) -> Optional[str]:
+        """The answer text to send back for fixing, if there is one and follow-ups are enabled."""
+        if not settings.JSON_FIX_FOLLOWUP or not result.get("choices"):
+            return None
+        return result["choices"][0]["message"].get("content") or None
+
+    def _completion_slots(
+        self, endpoint: str, api_key: str, payload: Dict[str, Any], stream: bool
+    ) -> Tuple[Dict[str, str], Dict[str, Any], TokenBucket, AdaptiveLimiter, CircuitBreaker]:
+        """(headers, payload, rate-limit bucket, concurrency limiter, circuit breaker) of a completion request."""
+        headers = {"Authorization": f"Bearer {api_key}"}
+        if stream:
+            payload = {**payload, "stream": True}
+        return (
+            headers,
+            payload,
+            rate_limiter.get(endpoint, api_key),
+            concurrency_controller.get(endpoint),
+            circuit_breakers.get(endpoint),
+        )
+
+    def _completion_body(self, resp: Any, streamed: Optional[StreamedCompletion]) -> CompletionReply:
+        """(response body, error) of a successful response (requests or httpx)."""
+        if streamed is not None:
+            if streamed.error:
+                return None, f"Stream-Fehler: {streamed.error}"
+            return streamed.to_response(), None
+        return resp.json(), None
+
+    def _backoff(self, wait: float, breaker: CircuitBreaker, endpoint: str, fail_fast: bool) -> RetryDecision:
+        if self._circuit_tripped(breaker, fail_fast):
+            return None, self._circuit_error(endpoint)
+        return wait, None
 
+    def _http_failure(
+        self, resp: Any, attempt: int, bucket: TokenBucket, breaker: CircuitBreaker, endpoint: str, fail_fast: bool
+    ) -> RetryDecision:
+        """Decides on an HTTP error response: (seconds to wait before the next attempt, None) or (None, final error)."""
+        error_msg = self._http_error_message(resp)
         max_retries = settings.MAX_RETRIES
-        attempt = 0
-        while attempt < max_retries:
-            try:
-                resp = self.session.post(resolved_endpoint, headers=headers, json=payload, timeout=120)
+        if resp.status_code == 401:
+            return None, "Ungültiger API Key (401)"
+        if resp.status_code == 429:
+            wait = self._retry_wait(attempt, resp.headers.get("Retry-After"))
+            logger.warning(f"Rate limit (429). Sleeping {wait:.1f}s (attempt {attempt + 1}/{max_retries})")
+            # Hold back every worker on this key, not just this one
+            bucket.pause(wait)
+            return self._backoff(wait, breaker, endpoint, fail_fast)
+        if resp.status_code >= 500:
+            # Server error — retry with backoff
+            wait = self._retry_wait(attempt)
+            logger.warning(f"{error_msg}. Retrying in {wait:.1f}s (attempt {attempt+1}/{max_retries})")
+            return self._backoff(wait, breaker, endpoint, fail_fast)
+        # 4xx client error (except 401/429) — no point retrying
+        return None, error_msg
 
-                # --- Explicit HTTP error handling with body capture ---
-                if resp.status_code >= 400:
-                    error_msg = f"HTTP {resp.status_code}"
-                    try:
-                        err_json = resp.json()
-                        detail = (
-                            err_json.get("error", {}).get("message")
-                            or err_json.get("detail")
-                            or ""
-                        )
-                        if detail:
-                            error_msg += f": {str(detail)[:250]}"
-                        else:
-                            body = resp.text[:250].strip()
-                            if body:
-                                error_msg += f": {body}"
-                    except Exception:
-                        body = resp.text[:250].strip()
-                        if body:
-                            error_msg += f": {body}"
-
-                    if resp.status_code == 401:
-                        return None, "Ungültiger API Key (401)"
-                    if resp.status_code == 429:
-                        ra = resp.headers.get("Retry-After")
-                        wait = float(ra) if ra and ra.isdigit() else (2 ** attempt) + random.random()
-                        logger.warning(f"Rate limit (429). Sleeping {wait:.1f}s (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(wait)
-                        attempt += 1
-                        continue
-                    if resp.status_code >= 500:
-                        # Server error — retry with backoff
-                        wait = (2 ** attempt) + random.uniform(0, 1)
-                        logger.warning(f"{error_msg}. Retrying in {wait:.1f}s (attempt {attempt+1}/{max_retries})")
-                        time.sleep(wait)
-                        attempt += 1
-                        continue
-                    # 4xx client error (except 401/429) — no point retrying
-                    return None, error_msg
+    def _transport_failure(
+        self, error: Exception, attempt: int, breaker: CircuitBreaker, endpoint: str, fail_fast: bool
+    ) -> RetryDecision:
+        """Like _http_failure, for a request that got no response (requests or httpx exception)."""
+        if isinstance(error, (requests.exceptions.ConnectionError, httpx.ConnectError)):
+            reason = f"Verbindungsfehler: {error}"
+        elif isinstance(error, (requests.exceptions.Timeout, httpx.TimeoutException)):
+            reason = "Timeout"
+        else:
+            reason = f"RequestException: {error}"
+        wait = self._retry_wait(attempt)
+        logger.warning(f"{reason}. Retrying in {wait:.1f}s (attempt {attempt+1}/{settings.MAX_RETRIES})")
+        return self._backoff(wait, breaker, endpoint, fail_fast)
 
-                result = resp.json()
-                if "choices" in result and len(result["choices"]) > 0:
-                    content = result["choices"][0]["message"]["content"]
-                    cleaned = self._extract_json_from_model_content(content)
-                    try:
-                        parsed = json.loads(cleaned)
-                    except json.JSONDecodeError:
-                        raw_preview = cleaned[:120].replace("\n", " ")
-                        logger.warning(f"JSON decode failed for {image_path.name}: {raw_preview}")
-                        return None, f"JSON-Parsing fehlgeschlagen. Antwort: {raw_preview}"
-                    return parsed, None
-                else:
-                    return None, "Keine Antwort vom Modell (leere choices)"
-            except requests.exceptions.ConnectionError as e:
-                wait = (2 ** attempt) + random.uniform(0, 1)
-                logger.warning(f"Verbindungsfehler: {e}. Retrying in {wait:.1f}s (attempt {attempt+1}/{max_retries})")
-                time.sleep(wait)
-                attempt += 1
-            except requests.exceptions.Timeout:
-                wait = (2 ** attempt) + random.uniform(0, 1)
-                logger.warning(f"Timeout. Retrying in {wait:.1f}s (attempt {attempt+1}/{max_retries})")
-                time.sleep(wait)
-                attempt += 1
+    def _post_completion(
+        self,
+        endpoint: str,
+        api_key: str,
+        payload: Dict[str, Any],
+        stream: bool = False,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        fail_fast: bool = False,
+        timing: Optional[Dict[str, float]] = None,
+    ) -> CompletionReply:
+        """POSTs a chat-completion request with retries; returns (response body, error).
+
+        With stream=True the answer is read as server-sent events (see StreamedCompletion):
+        on_field receives each field as soon as it closes, and the connection is dropped
+        once the JSON value is complete instead of waiting for trailing output.
+        Every attempt feeds the endpoint's circuit breaker; with fail_fast (a fallback
+        provider is available) an open circuit ends the call at once instead of backing off.
+        A timing dict receives the time the first attempt got its slot and was sent ("sent").
+        Retry decisions are shared with _post_completion_async (_http_failure, _transport_failure).
+        """
+        headers, payload, bucket, limiter, breaker = self._completion_slots(endpoint, api_key, payload, stream)
+        for attempt in range(settings.MAX_RETRIES):
+            if fail_fast and not breaker.allow():
+                return None, self._circuit_error(endpoint)
+            try:
+                streamed = StreamedCompletion(on_field) if stream else None
+                with bucket.slot(), limiter.slot() as slot, breaker.track(slot):
+                    if timing is not None:
+                        timing.setdefault("sent", time.monotonic())
+                    resp = self.session.post(
+                        endpoint, headers=headers, json=payload, timeout=settings.REQUEST_TIMEOUT, stream=stream
+                    )
+                    slot.record(resp.status_code)
+                    if streamed is not None and resp.status_code < 400:
+                        try:
+                            for line in resp.iter_lines():
+                                if line and streamed.feed_line(line.decode("utf-8")):
+                                    break
+                        finally:
+                            resp.close()
+                if resp.status_code < 400:
+                    return self._completion_body(resp, streamed)
+                wait, error = self._http_failure(resp, attempt, bucket, breaker, endpoint, fail_fast)
             except requests.exceptions.RequestException as e:
-                wait = (2 ** attempt) + random.uniform(0, 1)
-                logger.warning(f"RequestException: {e}. Retrying in {wait:.1f}s (attempt {attempt+1}/{max_retries})")
-                time.sleep(wait)
-                attempt += 1
+                wait, error = self._transport_failure(e, attempt, breaker, endpoint, fail_fast)
             except Exception as e:
-                logger.exception(f"Unexpected error in _call_vlm_api_resilient: {e}")
+                logger.exception(f"Unexpected error in _post_completion: {e}")
                 return None, str(e)
-        return None, f"Max. Versuche ({max_retries}) erreicht – API antwortet nicht"
+            if wait is None:
+                return None, error
+            time.sleep(wait)
+        return None, f"Max. Versuche ({settings.MAX_RETRIES}) erreicht – API antwortet nicht"
+
+    async def _post_completion_async(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        api_key: str,
+        payload: Dict[str, Any],
+        stream: bool = False,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        fail_fast: bool = False,
+        timing: Optional[Dict[str, float]] = None,
+    ) -> CompletionReply:
+        """Non-blocking counterpart of _post_completion (same retry, 429, 5xx and streaming semantics).
+
+        Backoff sleeps are awaited, so a waiting retry holds no thread.
+        """
+        headers, payload, bucket, limiter, breaker = self._completion_slots(endpoint, api_key, payload, stream)
+        for attempt in range(settings.MAX_RETRIES):
+            if fail_fast and not breaker.allow():
+                return None, self._circuit_error(endpoint)
+            try:
+                streamed = StreamedCompletion(on_field) if stream else None
+                async with bucket.slot_async(), limiter.slot_async() as slot, breaker.track_async(slot):
+                    if timing is not None:
+                        timing.setdefault("sent", time.monotonic())
+                    if streamed is None:
+                        resp = await client.post(endpoint, headers=headers, json=payload)
+                        slot.record(resp.status_code)
+                    else:
+                        async with client.stream("POST", endpoint, headers=headers, json=payload) as resp:
+                            slot.record(resp.status_code)
+                            if resp.status_code >= 400:
+                                await resp.aread()
+                            else:
+                                async for line in resp.aiter_lines():
+                                    if line and streamed.feed_line(line):
+                                        break
+                if resp.status_code < 400:
+                    return self._completion_body(resp, streamed)
+                wait, error = self._http_failure(resp, attempt, bucket, breaker, endpoint, fail_fast)
+            except httpx.RequestError as e:
+                wait, error = self._transport_failure(e, attempt, breaker, endpoint, fail_fast)
+            except Exception as e:
+                logger.exception(f"Unexpected error in _post_completion_async: {e}")
+                return None, str(e)
+            if wait is None:
+                return None, error
+            await asyncio.sleep(wait)
+        return None, f"Max. Versuche ({settings.MAX_RETRIES}) erreicht – API antwortet nicht"
+
+    def _resolve_target(self, api_endpoint: Optional[str], api_key: Optional[str]) -> Tuple[str, Optional[str]]:
+        """(endpoint, API key) of a call, defaulting to the configured ones."""
+        return api_endpoint or settings.API_ENDPOINT, api_key if api_key is not None else self.api_key
+
+    def _run_requests(self, plan: RequestPlan) -> Any:
+        """Sends the requests of a plan (see RequestPlan) with _post_completion; returns its outcome."""
+        try:
+            request = next(plan)
+            while True:
+                request = plan.send(self._post_completion(**request))
+        except StopIteration as done:
+            return done.value
+
+    async def _run_requests_async(self, client: httpx.AsyncClient, plan: RequestPlan) -> Any:
+        """Non-blocking counterpart of _run_requests."""
+        try:
+            request = next(plan)
+            while True:
+                request = plan.send(await self._post_completion_async(client, **request))
+        except StopIteration as done:
+            return done.value
 
-    def _process_card_sync(
+    def _card_requests(
+        self,
+        image_path: Path,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        api_endpoint: Optional[str],
+        model_name: Optional[str],
+        api_key: Optional[str],
+        base64_image: Optional[str],
+        usage: Optional[Dict[str, Any]],
+        on_field: Optional[Callable[[str, Any], None]],
+        fail_fast: bool,
+        timing: Optional[Dict[str, float]],
+        batch_name: Optional[str] = None,
+    ) -> RequestPlan:
+        """Request plan of one card; returns (data, error).
+
+        Sends the card with the response schema if the provider is expected to accept it,
+        prompt-only again if it rejects the schema, and — for an answer that stays invalid
+        JSON after repair_json — a follow-up asking the model to fix its own answer.
+        """
+        resolved_endpoint, resolved_key = self._resolve_target(api_endpoint, api_key)
+        if not resolved_key:
+            return None, "API Key missing"
+
+        resolved_model = model_name or settings.MODEL_NAME
+        structured = structured_output.wants_schema(resolved_endpoint, resolved_model)
+        payload = self._build_payload(
+            image_path, fields, max_size, prompt_template, model_name, base64_image, structured=structured
+        )
+        request = {
+            "endpoint": resolved_endpoint, "api_key": resolved_key, "payload": payload,
+            "stream": settings.STREAM_COMPLETIONS, "on_field": on_field, "fail_fast": fail_fast, "timing": timing,
+        }
+        result, error = yield request
+        if structured and self._schema_rejected(error):
+            logger.info(f"{resolved_endpoint} rejected the response schema ({error}) — retrying prompt-only")
+            payload.pop("response_format", None)
+            structured = False
+            if timing is not None:
+                timing.pop("sent", None)  # latency and hedge delay count from the request that answers
+            result, error = yield request
+            if not error:
+                structured_output.mark_unsupported(resolved_endpoint, resolved_model)
+        if error or result is None:
+            return None, error
+        if usage is not None:
+            usage.update(result.get("usage") or {})
+        data, error, outcome = self._parse_completion_outcome(result, image_path)
+        content = self._fix_content(result) if outcome == "failed" else None
+        if content:
+            logger.info(f"Asking the model to fix its JSON for {image_path.name}")
+            fix_payload = self._build_fix_payload(content, fields, model_name, structured)
+            fixed, fix_error = yield {
+                "endpoint": resolved_endpoint, "api_key": resolved_key, "payload": fix_payload, "fail_fast": fail_fast,
+            }
+            if fixed is not None and not fix_error:
+                fixed_data, fixed_error = self._parse_completion(fixed, image_path)
+                if fixed_error is None:
+                    data, error, outcome = fixed_data, None, "followup"
+        structured_output.record_parse(resolved_endpoint, structured, outcome, batch_name)
+        return data, error
+
+    def _call_vlm_api_resilient(
         self,
         image_path: Path,
-        batch_name: str,
         fields: Optional[List[str]] = None,
         max_size: Optional[int] = 1600,
         prompt_template: Optional[str] = None,
         api_endpoint: Optional[str] = None,
         model_name: Optional[str] = None,
         api_key: Optional[str] = None,
-    ) -> Dict[str, Any]:
-        """Synchronous card processing logic."""
-        start_time = time.time()
-        filename = image_path.name
-        try:
-            data, error = self._call_vlm_api_resilient(
-                image_path, fields=fields, max_size=max_size,
-                prompt_template=prompt_template,
-                api_endpoint=api_endpoint, model_name=model_name, api_key=api_key,
-            )
-            duration = time.time() - start_time
-
-            if error:
-                logger.error(f"[{batch_name}] {filename} -> {error}")
-                return {
-                    "filename": filename,
-                    "batch": batch_name,
-                    "success": False,
-                    "error": error,
-                    "duration": duration
-                }
+        base64_image: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        fail_fast: bool = False,
+        timing: Optional[Dict[str, float]] = None,
+        batch_name: Optional[str] = None,
+    ) -> Tuple[Optional[Dict], Optional[str]]:
+        """Resilienter API-Aufruf: Session, exponential backoff with jitter.
 
-            # Handle multi-entry pages (AI returned a JSON array, e.g. Findmittel)
-            if isinstance(data, list):
-                entry_count = len(data)
-                data = {
-                    "_entries": json.dumps(data, ensure_ascii=False),
-                    "_entry_count": str(entry_count),
-                    "Datei": filename,
-                    "Batch": batch_name,
-                }
-                return {
-                    "filename": filename,
-                    "batch": batch_name,
-                    "success": True,
-                    "data": data,
-                    "duration": time.time() - start_time,
-                    "validation_errors": [],
-                }
+        If a usage dict is passed, it receives the provider's token usage of the call, a
+        timing dict the time the request was first sent (see _post_completion).
+        With STREAM_COMPLETIONS, on_field receives each extracted field as it streams in.
+        The parse outcome is counted for the endpoint and, if given, the batch's run.
+        """
+        return self._run_requests(self._card_requests(
+            image_path, fields, max_size, prompt_template, api_endpoint, model_name, api_key,
+            base64_image, usage, on_field, fail_fast, timing, batch_name,
+        ))
 
-            # Enrich metadata (single-entry / dict response)
-            if data is None:
-                data = {}
-            data["Datei"] = filename
-            data["Batch"] = batch_name
+    async def _call_vlm_api_async(
+        self,
+        client: httpx.AsyncClient,
+        image_path: Path,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        base64_image: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        fail_fast: bool = False,
+        timing: Optional[Dict[str, float]] = None,
+        batch_name: Optional[str] = None,
+    ) -> Tuple[Optional[Dict], Optional[str]]:
+        """Non-blocking counterpart of _call_vlm_api_resilient.
+
+        If no pre-encoded image is passed, encoding (CPU-bound) runs in the default executor.
+        """
+        if base64_image is None:
+            base64_image = await asyncio.to_thread(self._encode_image_to_base64, image_path, max_size)
+        return await self._run_requests_async(client, self._card_requests(
+            image_path, fields, max_size, prompt_template, api_endpoint, model_name, api_key,
+            base64_image, usage, on_field, fail_fast, timing, batch_name,
+        ))
+
+    def _multi_requests(
+        self,
+        cards: List[Tuple[Path, str]],
+        fields: Optional[List[str]],
+        prompt_template: Optional[str],
+        api_endpoint: Optional[str],
+        model_name: Optional[str],
+        api_key: Optional[str],
+        fail_fast: bool,
+    ) -> RequestPlan:
+        """Request plan of a multi-card call; returns (answers by filename, error, token usage)."""
+        resolved_endpoint, resolved_key = self._resolve_target(api_endpoint, api_key)
+        if not resolved_key:
+            return {}, "API Key missing", {}
+
+        payload = self._build_multi_payload(
+            [(image_path.name, b64) for image_path, b64 in cards], fields, prompt_template, model_name
+        )
+        result, error = yield {
+            "endpoint": resolved_endpoint, "api_key": resolved_key, "payload": payload,
+            "stream": settings.STREAM_COMPLETIONS, "fail_fast": fail_fast,
+        }
+        return self._read_multi_completion(result, error, cards)
+
+    def _call_vlm_api_multi(
+        self,
+        cards: List[Tuple[Path, str]],
+        fields: Optional[List[str]] = None,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        fail_fast: bool = False,
+    ) -> Tuple[Dict[str, Dict[str, Any]], Optional[str], Dict[str, Any]]:
+        """One request for several prepared cards; returns (answers by filename, error, token usage)."""
+        return self._run_requests(self._multi_requests(
+            cards, fields, prompt_template, api_endpoint, model_name, api_key, fail_fast
+        ))
+
+    async def _call_vlm_api_multi_async(
+        self,
+        client: httpx.AsyncClient,
+        cards: List[Tuple[Path, str]],
+        fields: Optional[List[str]] = None,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        fail_fast: bool = False,
+    ) -> Tuple[Dict[str, Dict[str, Any]], Optional[str], Dict[str, Any]]:
+        """Non-blocking counterpart of _call_vlm_api_multi."""
+        return await self._run_requests_async(client, self._multi_requests(
+            cards, fields, prompt_template, api_endpoint, model_name, api_key, fail_fast
+        ))
+
+    def _read_multi_completion(
+        self,
+        result: Optional[Dict[str, Any]],
+        error: Optional[str],
+        cards: List[Tuple[Path, str]],
+    ) -> Tuple[Dict[str, Dict[str, Any]], Optional[str], Dict[str, Any]]:
+        if error or result is None:
+            return {}, error, {}
+        usage = result.get("usage") or {}
+        parsed, error = self._parse_completion(result, cards[0][0])
+        if error:
+            return {}, error, usage
+        return self._split_multi_response(parsed, [image_path.name for image_path, _ in cards]), None, usage
 
-            # Validation
-            ok, v_errors = self._validate_extraction(data)
+    def _build_card_result(
+        self,
+        filename: str,
+        batch_name: str,
+        data: Optional[Any],
+        error: Optional[str],
+        start_time: float,
+    ) -> Dict[str, Any]:
+        """Turns an API outcome into the result dict stored in the checkpoint."""
+        duration = time.time() - start_time
 
+        if error:
+            logger.error(f"[{batch_name}] {filename} -> {error}")
             return {
                 "filename": filename,
                 "batch": batch_name,
-                "success": True,
-                "data": data,
-                "duration": duration,
-                "has_komponist": bool(data.get("Komponist", "").strip()),
-                "has_signatur": bool(data.get("Signatur", "").strip()),
-                "valid_signatur": self._validate_signature(data.get("Signatur", "")),
-                "validation_errors": v_errors if not ok else []
+                "success": False,
+                "error": error,
+                "duration": duration
+            }
+
+        # Handle multi-entry pages (AI returned a JSON array, e.g. Findmittel)
+        if isinstance(data, list):
+            entry_count = len(data)
+            data = {
+                "_entries": json.dumps(data, ensure_ascii=False),
+                "_entry_count": str(entry_count),
+                "Datei": filename,
+                "Batch": batch_name,
             }
-        except Exception as e:
-            logger.exception(f"Unexpected error processing card {filename}: {e}")
             return {
                 "filename": filename,
                 "batch": batch_name,
-                "success": False,
-                "error": str(e),
-                "duration": time.time() - start_time
+                "success": True,
+                "data": data,
+                "duration": time.time() - start_time,
+                "validation_errors": [],
             }
 
+        # Enrich metadata (single-entry / dict response)
+        if data is None:
+            data = {}
+        data["Datei"] = filename
+        data["Batch"] = batch_name
+
+        # Validation
+        ok, v_errors = self._validate_extraction(data)
+
+        return {
+            "filename": filename,
+            "batch": batch_name,
+            "success": True,
+            "data": data,
+            "duration": duration,
+            "has_komponist": bool(data.get("Komponist", "").strip()),
+            "has_signatur": bool(data.get("Signatur", "").strip()),
+            "valid_signatur": self._validate_signature(data.get("Signatur", "")),
+            "validation_errors": v_errors if not ok else []
+        }
+
+    def _lookup_card(
+        self,
+        image_path: Path,
+        batch_name: str,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+        use_cache: bool,
+        start_time: float,
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """(extraction cache key or None, the card's result if the cache answers it)."""
+        if not (use_cache and settings.EXTRACTION_CACHE_ENABLED):
+            return None, None
+        cache_key, cached = self._cache_lookup(image_path, fields, max_size, prompt_template, model_name)
+        if cached is None:
+            return cache_key, None
+        res = self._build_card_result(image_path.name, batch_name, cached, None, start_time)
+        res["cached"] = True
+        return cache_key, res
+
+    def _try_next_route(self, filename: str, chain: List[ProviderRoute], n: int, error: Optional[str]) -> bool:
+        """Whether a card that chain[n] answered with error moves on to the next provider."""
+        if n == len(chain) - 1 or not provider_unavailable(error):
+            return False
+        logger.debug(f"{filename}: {chain[n].provider} unavailable ({error}) – trying {chain[n + 1].provider}")
+        return True
+
+    def _finish_card(
+        self,
+        filename: str,
+        batch_name: str,
+        route: ProviderRoute,
+        primary: bool,
+        outcome: CallOutcome,
+        hedge_info: Dict[str, Any],
+        cache_key: Optional[str],
+        start_time: float,
+    ) -> Dict[str, Any]:
+        """Caches the answer of the primary provider and builds the card's result."""
+        data, error, usage = outcome
+        # The cache key belongs to the primary model; fallback answers are not cached under it
+        if cache_key and not error and data is not None and primary:
+            extraction_cache.put(cache_key, data)
+        res = self._build_card_result(filename, batch_name, data, error, start_time)
+        if route.provider:
+            res["provider"] = route.provider
+        res.update(hedge_info)
+        if cache_key:
+            res["cached"] = False
+        if usage.get("prompt_tokens"):
+            res["prompt_tokens"] = usage["prompt_tokens"]
+        return res
+
+    def _card_failure(self, filename: str, batch_name: str, error: Exception, start_time: float) -> Dict[str, Any]:
+        logger.exception(f"Unexpected error processing card {filename}: {error}")
+        return {
+            "filename": filename,
+            "batch": batch_name,
+            "success": False,
+            "error": str(error),
+            "duration": time.time() - start_time
+        }
+
+    def process_card_sync(
+        self,
+        image_path: Path,
+        batch_name: str,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        use_cache: bool = True,
+        base64_image: Optional[str] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        routes: Optional[List[ProviderRoute]] = None,
+    ) -> Dict[str, Any]:
+        """Processes one card, blocking; the entry point for single cards outside a batch run (app.worker).
+
+        routes is the batch's ordered provider chain (see provider_chain): when a provider
+        is unavailable (circuit open or retries exhausted), the card moves on to the next one.
+        """
+        start_time = time.time()
+        filename = image_path.name
+        try:
+            cache_key, res = self._lookup_card(
+                image_path, batch_name, fields, max_size, prompt_template, model_name, use_cache, start_time
+            )
+            if res is not None:
+                return res
+
+            chain = self._route_chain(routes, api_endpoint, model_name, api_key)
+            chosen = chain[0]
+            for n, route in enumerate(chain):
+                chosen = route
+                last = n == len(chain) - 1
+
+                # Bound as defaults: the closure must not see later values of the loop variables
+                def _attempt(
+                    timing: Dict[str, float], route: ProviderRoute = route, last: bool = last
+                ) -> CallOutcome:
+                    usage: Dict[str, Any] = {}
+                    data, error = self._call_vlm_api_resilient(
+                        image_path, fields=fields, max_size=max_size,
+                        prompt_template=prompt_template,
+                        api_endpoint=route.endpoint, model_name=route.model, api_key=route.api_key,
+                        base64_image=base64_image, usage=usage, on_field=on_field, fail_fast=not last,
+                        timing=timing, batch_name=batch_name,
+                    )
+                    return data, error, usage
+
+                outcome, hedge_info = self._hedged_sync(route.endpoint, batch_name, _attempt)
+                if not self._try_next_route(filename, chain, n, outcome[1]):
+                    break
+            return self._finish_card(
+                filename, batch_name, chosen, chosen == chain[0], outcome, hedge_info, cache_key, start_time
+            )
+        except Exception as e:
+            return self._card_failure(filename, batch_name, e, start_time)
+
+    async def _process_card_async(
+        self,
+        client: httpx.AsyncClient,
+        image_path: Path,
+        batch_name: str,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        use_cache: bool = True,
+        base64_image: Optional[str] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        routes: Optional[List[ProviderRoute]] = None,
+    ) -> Dict[str, Any]:
+        """Event-loop card processing; returns the same result dict as process_card_sync."""
+        start_time = time.time()
+        filename = image_path.name
+        try:
+            cache_key, res = await asyncio.to_thread(
+                self._lookup_card, image_path, batch_name, fields, max_size, prompt_template, model_name,
+                use_cache, start_time,
+            )
+            if res is not None:
+                return res
+
+            chain = self._route_chain(routes, api_endpoint, model_name, api_key)
+            chosen = chain[0]
+            for n, route in enumerate(chain):
+                chosen = route
+                last = n == len(chain) - 1
+
+                async def _attempt(
+                    timing: Dict[str, float], route: ProviderRoute = route, last: bool = last
+                ) -> CallOutcome:
+                    usage: Dict[str, Any] = {}
+                    data, error = await self._call_vlm_api_async(
+                        client, image_path, fields=fields, max_size=max_size,
+                        prompt_template=prompt_template,
+                        api_endpoint=route.endpoint, model_name=route.model, api_key=route.api_key,
+                        base64_image=base64_image, usage=usage, on_field=on_field, fail_fast=not last,
+                        timing=timing, batch_name=batch_name,
+                    )
+                    return data, error, usage
+
+                outcome, hedge_info = await self._hedged_async(route.endpoint, batch_name, _attempt)
+                if not self._try_next_route(filename, chain, n, outcome[1]):
+                    break
+            return await asyncio.to_thread(
+                self._finish_card, filename, batch_name, chosen, chosen == chain[0], outcome, hedge_info, cache_key,
+                start_time,
+            )
+        except Exception as e:
+            return self._card_failure(filename, batch_name, e, start_time)
+
+    def _take_cached_cards(
+        self,
+        cards: List[Tuple[Path, str]],
+        batch_name: str,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+        results: Dict[str, Dict[str, Any]],
+    ) -> List[Tuple[Path, str]]:
+        """Answers cards from the extraction cache into results; returns the cards still to send."""
+        pending = []
+        for image_path, b64 in cards:
+            start_time = time.time()
+            cached = None
+            try:
+                _, cached = self._cache_lookup(image_path, fields, max_size, prompt_template, model_name)
+            except Exception as e:
+                logger.warning(f"Cache lookup failed for {image_path.name}: {e}")
+            if cached is None:
+                pending.append((image_path, b64))
+                continue
+            res = self._build_card_result(image_path.name, batch_name, cached, None, start_time)
+            res["cached"] = True
+            results[image_path.name] = res
+        return pending
+
+    def _take_multi_answers(
+        self,
+        cards: List[Tuple[Path, str]],
+        answered: Dict[str, Dict[str, Any]],
+        usage: Dict[str, Any],
+        batch_name: str,
+        start_time: float,
+        track_cache: bool,
+        results: Dict[str, Dict[str, Any]],
+    ) -> List[Tuple[Path, str]]:
+        """Turns a multi-card answer into per-card results; returns the cards it did not cover."""
+        prompt_tokens = usage.get("prompt_tokens")
+        missing = []
+        for image_path, b64 in cards:
+            data = answered.get(image_path.name)
+            if data is None:
+                missing.append((image_path, b64))
+                continue
+            res = self._build_card_result(image_path.name, batch_name, data, None, start_time)
+            res["cards_per_request"] = len(cards)
+            if prompt_tokens:
+                res["prompt_tokens"] = round(prompt_tokens / len(cards), 1)
+            if track_cache:
+                # Not stored: the answer belongs to the multi-card prompt, not to the cache key
+                res["cached"] = False
+            results[image_path.name] = res
+        return missing
+
+    def _settle_multi_answers(
+        self,
+        pending: List[Tuple[Path, str]],
+        route: ProviderRoute,
+        answered: Dict[str, Dict[str, Any]],
+        error: Optional[str],
+        usage: Dict[str, Any],
+        batch_name: str,
+        start_time: float,
+        track_cache: bool,
+        results: Dict[str, Dict[str, Any]],
+    ) -> List[Tuple[Path, str]]:
+        """Records the cards a multi-card request to route answered; returns those left for single requests."""
+        missing = self._take_multi_answers(pending, answered, usage, batch_name, start_time, track_cache, results)
+        if route.provider:
+            for image_path, _ in pending:
+                if image_path.name in results:
+                    results[image_path.name]["provider"] = route.provider
+        if missing:
+            reason = error or "cards missing from the answer"
+            logger.warning(f"[{batch_name}] Multi-card request covered {len(pending) - len(missing)}/{len(pending)} cards ({reason}) – retrying the rest one by one")
+        return missing
+
+    def _process_cards_multi_sync(
+        self,
+        cards: List[Tuple[Path, str]],
+        batch_name: str,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        use_cache: bool = True,
+        routes: Optional[List[ProviderRoute]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Processes several prepared cards (path, base64) with one VLM call.
+
+        Returns one result per card, in input order. Cards the combined answer does not
+        cover — request failed, answer unparsable, entry missing — are sent again as
+        single-card requests. The combined request goes to the first provider of routes
+        whose circuit is not open.
+        """
+        start_time = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        track_cache = use_cache and settings.EXTRACTION_CACHE_ENABLED
+        pending = cards
+        if track_cache:
+            pending = self._take_cached_cards(cards, batch_name, fields, max_size, prompt_template, model_name, results)
+
+        if len(pending) > 1:
+            chain = self._route_chain(routes, api_endpoint, model_name, api_key)
+            route = self._available_route(chain)
+            try:
+                answered, error, usage = self._call_vlm_api_multi(
+                    pending, fields=fields, prompt_template=prompt_template,
+                    api_endpoint=route.endpoint, model_name=route.model, api_key=route.api_key,
+                    fail_fast=route != chain[-1],
+                )
+            except Exception as e:
+                logger.exception(f"Unexpected error in multi-card request: {e}")
+                answered, error, usage = {}, str(e), {}
+            pending = self._settle_multi_answers(
+                pending, route, answered, error, usage, batch_name, start_time, track_cache, results
+            )
+
+        for image_path, b64 in pending:
+            results[image_path.name] = self.process_card_sync(
+                image_path, batch_name, fields, max_size, prompt_template,
+                api_endpoint, model_name, api_key, use_cache=use_cache, base64_image=b64, routes=routes,
+            )
+        return [results[image_path.name] for image_path, _ in cards]
+
+    async def _process_cards_multi_async(
+        self,
+        client: httpx.AsyncClient,
+        cards: List[Tuple[Path, str]],
+        batch_name: str,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        use_cache: bool = True,
+        routes: Optional[List[ProviderRoute]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Event-loop counterpart of _process_cards_multi_sync; fallbacks run concurrently."""
+        start_time = time.time()
+        results: Dict[str, Dict[str, Any]] = {}
+        track_cache = use_cache and settings.EXTRACTION_CACHE_ENABLED
+        pending = cards
+        if track_cache:
+            pending = await asyncio.to_thread(
+                self._take_cached_cards, cards, batch_name, fields, max_size, prompt_template, model_name, results
+            )
+
+        if len(pending) > 1:
+            chain = self._route_chain(routes, api_endpoint, model_name, api_key)
+            route = self._available_route(chain)
+            try:
+                answered, error, usage = await self._call_vlm_api_multi_async(
+                    client, pending, fields=fields, prompt_template=prompt_template,
+                    api_endpoint=route.endpoint, model_name=route.model, api_key=route.api_key,
+                    fail_fast=route != chain[-1],
+                )
+            except Exception as e:
+                logger.exception(f"Unexpected error in multi-card request: {e}")
+                answered, error, usage = {}, str(e), {}
+            pending = self._settle_multi_answers(
+                pending, route, answered, error, usage, batch_name, start_time, track_cache, results
+            )
+
+        singles = await asyncio.gather(*(
+            self._process_card_async(
+                client, image_path, batch_name, fields, max_size, prompt_template,
+                api_endpoint, model_name, api_key, use_cache=use_cache, base64_image=b64, routes=routes,
+            )
+            for image_path, b64 in pending
+        ))
+        for (image_path, _), res in zip(pending, singles):
+            results[image_path.name] = res
+        return [results[image_path.name] for image_path, _ in cards]
+
     async def process_card(self, image_path: Path, batch_name: str, fields: Optional[List[str]] = None, max_size: Optional[int] = 1600) -> Dict[str, Any]:
         """Async wrapper for process_card_sync."""
-        return await asyncio.to_thread(self._process_card_sync, image_path, batch_name, fields, max_size)
+        return await asyncio.to_thread(self.process_card_sync, image_path, batch_name, fields, max_size)
+
+    def _load_checkpoint(self, store: CheckpointStore, batch_name: str, resume: bool = True) -> Tuple[List[Dict[str, Any]], set]:
+        """Returns (checkpointed results, names of successfully processed cards); without resume the checkpoint is reset."""
+        completed_files: set = set()
+        results: List[Dict[str, Any]] = []
+        try:
+            if not resume:
+                store.reset()
+                history_index.update(batch_name, successes=0)
+                self._unindex_batch(batch_name)
+                return results, completed_files
+            results = store.load()
+            history_index.update(batch_name, successes=store.successes)
+            completed_files = {res["filename"] for res in results if res.get("success", False)}
+            if results:
+                logger.info(f"Resuming batch {batch_name}: {len(completed_files)} already successfully processed")
+        except Exception as e:
+            logger.error(f"Failed to read checkpoint for {batch_name}: {e}")
+        return results, completed_files
+
+    def _unindex_batch(self, batch_name: str) -> None:
+        try:
+            results_store.remove_batch(batch_name)
+        except Exception as e:
+            logger.error(f"Failed to clear indexed results of {batch_name}: {e}")
+
+    def _save_checkpoint(self, store: CheckpointStore, new_results: List[Dict[str, Any]], batch_name: str) -> None:
+        """Appends finished cards to the batch's checkpoint journal and the results store."""
+        try:
+            store.append(new_results)
+            history_index.update(batch_name, successes=store.successes)
+        except Exception as e:
+            logger.error(f"Failed to save checkpoint for {batch_name}: {e}")
+        try:
+            results_store.upsert(batch_name, new_results)
+        except Exception as e:
+            logger.error(f"Failed to index results of {batch_name}: {e}")
+
+    def _move_to_errors(self, img_path: Path, error_dir: Path) -> None:
+        try:
+            shutil.move(str(img_path), str(error_dir / img_path.name))
+            history_index.adjust(error_dir.parent.name, files=-1, errors=1)
+            logger.info(f"Moved failed card {img_path.name} to {error_dir}")
+        except Exception as e:
+            logger.error(f"Failed to move {img_path.name} to errors: {e}")
 
     async def process_batch(
         self,
@@ -345,9 +1455,31 @@ Falls ein Feld nicht auf der Karte vorhanden ist oder nicht entziffert werden ka
         api_endpoint: Optional[str] = None,
         model_name: Optional[str] = None,
         api_key: Optional[str] = None,
+        use_cache: bool = True,
+        cards_per_request: Optional[int] = None,
+        field_callback: Optional[Callable[[str, str, Dict[str, Any]], Any]] = None,
+        provider: Optional[str] = None,
+        fallback_routes: Optional[List[ProviderRoute]] = None,
+        priority: int = 0,
+        weight: float = 1.0,
+        job_id: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
-        """Processes an entire batch of images asynchronously using a thread pool."""
+        """Processes an entire batch: prep pool feeding either the thread pool or the async engine (see ENGINE_MODE).
+
+        With cards_per_request > 1 (default: CARDS_PER_REQUEST) prepared cards are packed
+        into multi-card requests; cards a packed answer misses are retried one by one.
+        With STREAM_COMPLETIONS, field_callback(batch_name, filename, {field: value}) is
+        called on the event loop for every field of a single-card answer as it streams in.
+        fallback_routes are tried in order after the primary provider (api_endpoint,
+        model_name, api_key, named provider) whenever a provider's circuit is open or
+        its retries are exhausted; each result records the provider that answered it.
+        Card requests of all batches share the card scheduler's worker budget; priority
+        and weight set this batch's share (see CardScheduler).
+        With job_id, the cards are tracked as card tasks of that job in the durable job
+        queue; cards the job already finished are not sent again when it is resumed.
+        """
         batch_name = batch_dir.name
+        pack_size = max(1, cards_per_request or settings.CARDS_PER_REQUEST)
         image_files = sorted(list(batch_dir.glob("*.jpg")) + list(batch_dir.glob("*.jpeg")))
 
         if not image_files:
@@ -359,105 +1491,839 @@ Falls ein Feld nicht auf der Karte vorhanden ist oder nicht entziffert werden ka
         error_dir.mkdir(parents=True, exist_ok=True)
 
         # Checkpoint handling
-        checkpoint_path = batch_dir / "checkpoint.json"
-        completed_files = set()
-        results = []
-        if resume and checkpoint_path.exists():
-            try:
-                with open(checkpoint_path, "r") as f:
-                    checkpoint_data = json.load(f)
-                    for res in checkpoint_data:
-                        results.append(res)
-                        if res.get("success", False):
-                            completed_files.add(res["filename"])
-                logger.info(f"Resuming batch {batch_name}: {len(completed_files)} already successfully processed")
-            except Exception as e:
-                logger.error(f"Failed to read checkpoint for {batch_name}: {e}")
+        store = checkpoints.get(batch_dir)
+        results, completed_files = self._load_checkpoint(store, batch_name, resume)
+        if job_id is not None:
+            # Results the job recorded before it was interrupted, even if the checkpoint missed them
+            finished = await asyncio.to_thread(job_queue.finished_cards, job_id)
+            if finished:
+                results = [r for r in results if r["filename"] not in finished] + list(finished.values())
+                completed_files |= {f.name for f in image_files} & set(finished)
+                logger.info(f"Resuming job {job_id} of batch {batch_name}: {len(finished)} cards already finished")
 
         files_to_process = [f for f in image_files if f.name not in completed_files]
         if not files_to_process:
             logger.info(f"Batch {batch_name} already fully processed")
+            await asyncio.to_thread(store.close)
             return results
+        if job_id is not None:
+            await asyncio.to_thread(job_queue.add_cards, job_id, [f.name for f in files_to_process])
+        if settings.SCHEDULER_LARGEST_FIRST:
+            # Longest jobs first: the big scans do not end up as stragglers at the end
+            files_to_process.sort(key=lambda f: f.stat().st_size, reverse=True)
 
         total = len(image_files)
         start_time = time.time()
 
-        # Helper to update checkpoint
-        def _save_checkpoint(current_results):
-            try:
-                with open(checkpoint_path, "w") as f:
-                    json.dump(current_results, f, indent=2)
-            except Exception as e:
-                logger.error(f"Failed to save checkpoint for {batch_name}: {e}")
+        # Use a dict to track results by filename to handle replacements (retries)
+        res_map = {r["filename"]: r for r in results}
+        cache_stats = {"hits": 0, "misses": 0}
+        byte_stats = {"before": 0, "after": 0}
+
+        def _record_result(img_path: Path, res: Dict[str, Any]) -> None:
+            """Moves failed cards to _errors/ and persists the checkpoint."""
+            if not res.get("success", False):
+                self._move_to_errors(img_path, error_dir)
+
+            if "cached" in res:
+                cache_stats["hits" if res["cached"] else "misses"] += 1
+            if "bytes_before" in res:
+                byte_stats["before"] += res["bytes_before"]
+                byte_stats["after"] += res["bytes_after"]
+
+            res_map[res["filename"]] = res
+            self._save_checkpoint(store, [res], batch_name)
+            if job_id is not None:
+                job_queue.complete_card(job_id, res)
+
+        stats = PipelineStats()
+
+        def _build_progress(i: int, res: Dict[str, Any]):
+            from app.models.schemas import BatchProgress, ExtractionResult
+
+            elapsed = time.time() - start_time
+            processed_count = i - len(completed_files)
+            avg_time = elapsed / processed_count if processed_count > 0 else 0
+            remaining_count = total - i
+            eta = avg_time * remaining_count
+
+            return BatchProgress(
+                batch_name=batch_name,
+                current=i,
+                total=total,
+                percentage=round((i / total) * 100, 2),
+                eta_seconds=round(eta, 1),
+                last_result=ExtractionResult(**res),
+                status="running",
+                concurrency_limit=concurrency_controller.current_limit(api_endpoint or settings.API_ENDPOINT),
+                cache_hits=cache_stats["hits"],
+                cache_misses=cache_stats["misses"],
+                queue_depth=stats.queue_depth,
+                prep_seconds_avg=stats.prep_avg,
+                network_seconds_avg=stats.network_avg,
+                upload_bytes_before=byte_stats["before"] if settings.CROP_BORDERS else None,
+                upload_bytes_after=byte_stats["after"] if settings.CROP_BORDERS else None,
+                cards_per_minute=stats.cards_per_minute,
+                prompt_tokens_per_card=stats.prompt_tokens_per_card,
+            )
+
+        counter = {"i": len(completed_files)}
+        last_result: Dict[str, Any] = {}
+        record_lock = asyncio.Lock()
+
+        async def _emit_progress(progress_data: Any) -> None:
+            if asyncio.iscoroutinefunction(progress_callback):
+                await progress_callback(batch_name, progress_data)
+            elif progress_callback:
+                progress_callback(batch_name, progress_data)
+
+        async def _handle_result(img: Path, res: Dict[str, Any]) -> bool:
+            """Records a finished card; returns False once the batch has been cancelled."""
+            async with record_lock:
+                await asyncio.to_thread(_record_result, img, res)
+                counter["i"] += 1
+                i = counter["i"]
+                last_result.clear()
+                last_result.update(res)
+
+            # Cooperative cancellation: check after each image + checkpoint save
+            if cancel_event and cancel_event.is_set():
+                logger.info(f"Batch {batch_name} cancelled by user after {i} images")
+                return False
+
+            if progress_callback:
+                await _emit_progress(_build_progress(i, res))
+            return True
 
-        # Capture the running event loop here (in the async context) before entering the thread
         loop = asyncio.get_running_loop()
+        card_args = (batch_name, fields, max_size, prompt_template, api_endpoint, model_name, api_key, use_cache)
+        routes = self.provider_chain(provider, api_endpoint, model_name, api_key, fallback_routes)
+        field_tasks: set = set()
 
-        # Use to_thread for the whole pool execution to avoid blocking the event loop
-        def _run_batch():
-            # Use a dict to track results by filename to handle replacements (retries)
-            res_map = {r["filename"]: r for r in results}
-
-            with ThreadPoolExecutor(max_workers=settings.MAX_WORKERS) as executor:
-                futures = {
-                    executor.submit(
-                        self._process_card_sync, img, batch_name, fields, max_size,
-                        prompt_template, api_endpoint, model_name, api_key
-                    ): img
-                    for img in files_to_process
-                }
-                for i, fut in enumerate(as_completed(futures), len(completed_files) + 1):
-                    res = fut.result()
+        async def _lease_cards(cards: List[Path]) -> None:
+            if job_id is not None:
+                await asyncio.to_thread(job_queue.lease_cards, job_id, [img.name for img in cards])
 
-                    # Error handling: move failed cards to _errors/
-                    if not res.get("success", False):
-                        img_path = futures[fut]
-                        try:
-                            import shutil
-                            shutil.move(str(img_path), str(error_dir / img_path.name))
-                            logger.info(f"Moved failed card {img_path.name} to {error_dir}")
-                        except Exception as e:
-                            logger.error(f"Failed to move {img_path.name} to errors: {e}")
-
-                    res_map[res["filename"]] = res
-                    current_results = list(res_map.values())
-                    _save_checkpoint(current_results)
-
-                    # Cooperative cancellation: check after each image + checkpoint save
-                    if cancel_event and cancel_event.is_set():
-                        logger.info(f"Batch {batch_name} cancelled by user after {i} images")
-                        break
+        def _field_emitter(filename: str) -> Optional[Callable[[str, Any], None]]:
+            """Thread-safe per-card on_field hook forwarding to field_callback on the loop."""
+            if field_callback is None or not settings.STREAM_COMPLETIONS:
+                return None
+
+            def _dispatch(key: str, value: Any) -> None:
+                outcome = field_callback(batch_name, filename, {key: value})
+                if asyncio.iscoroutine(outcome):
+                    task = asyncio.ensure_future(outcome)
+                    field_tasks.add(task)
+                    task.add_done_callback(field_tasks.discard)
+
+            def _on_field(key: str, value: Any) -> None:
+                loop.call_soon_threadsafe(_dispatch, key, value)
+
+            return _on_field
+
+        # Latencies and parse outcomes of this run's requests; cards of batches no run owns are not reported
+        hedging.open_report(batch_name)
+        structured_output.open_run(batch_name)
+        try:
+            if settings.ENGINE_MODE == "async":
+                limits = httpx.Limits(
+                    max_connections=settings.ASYNC_MAX_IN_FLIGHT,
+                    max_keepalive_connections=settings.ASYNC_MAX_IN_FLIGHT,
+                )
+                async with httpx.AsyncClient(
+                    timeout=settings.REQUEST_TIMEOUT,
+                    limits=limits,
+                    headers={"Content-Type": "application/json"},
+                ) as client:
 
-                    if progress_callback:
-                        elapsed = time.time() - start_time
-                        processed_count = i - len(completed_files)
-                        avg_time = elapsed / processed_count if processed_count > 0 else 0
-                        remaining_count = total - i
-                        eta = avg_time * remaining_count
-
-                        from app.models.schemas import BatchProgress, ExtractionResult
-
-                        # Prepare progress data
-                        progress_data = BatchProgress(
-                            batch_name=batch_name,
-                            current=i,
-                            total=total,
-                            percentage=round((i / total) * 100, 2),
-                            eta_seconds=round(eta, 1),
-                            last_result=ExtractionResult(**res),
-                            status="running"
+                    async def _run_cards_async(cards: List[Tuple[Path, str]]) -> List[Dict[str, Any]]:
+                        if len(cards) == 1:
+                            img, payload = cards[0]
+                            return [await self._process_card_async(
+                                client, img, *card_args, base64_image=payload, on_field=_field_emitter(img.name),
+                                routes=routes,
+                            )]
+                        return await self._process_cards_multi_async(client, cards, *card_args, routes=routes)
+
+                    await self._run_pipeline(
+                        files_to_process, max_size, min(settings.ASYNC_MAX_IN_FLIGHT, self._network_cap(routes)), pack_size,
+                        _run_cards_async, _handle_result, stats, batch_name, priority, weight, _lease_cards,
+                    )
+            else:
+                # Shared by all batches; the card scheduler and the adaptive limiter gate the HTTP calls
+                executor = self._get_network_pool()
+
+                async def _run_cards_threaded(cards: List[Tuple[Path, str]]) -> List[Dict[str, Any]]:
+                    if len(cards) == 1:
+                        img, payload = cards[0]
+                        call = functools.partial(
+                            self.process_card_sync, img, *card_args, base64_image=payload,
+                            on_field=_field_emitter(img.name), routes=routes,
                         )
+                        return [await loop.run_in_executor(executor, call)]
+                    return await loop.run_in_executor(
+                        executor, functools.partial(self._process_cards_multi_sync, cards, *card_args, routes=routes)
+                    )
+
+                await self._run_pipeline(
+                    files_to_process, max_size, self._network_cap(routes), pack_size,
+                    _run_cards_threaded, _handle_result, stats, batch_name, priority, weight, _lease_cards,
+                )
+        finally:
+            latency_report = hedging.pop_report(batch_name)
+            parse_stats = structured_output.pop_run(batch_name)
+
+        resolved_endpoint = api_endpoint or settings.API_ENDPOINT
+        logger.info(f"Parse failures on {resolved_endpoint}: {structured_output.summary(resolved_endpoint)}")
+        logger.info(f"Single-card request latency for {batch_name}: {latency_report.summary()}")
+        if progress_callback and last_result:
+            # The run's summary rides on a last update; the caller marks it completed or cancelled
+            final = _build_progress(counter["i"], last_result)
+            final.latency = latency_report.to_dict()
+            final.parse_stats = parse_stats
+            await _emit_progress(final)
+        if routes:
+            used: Dict[str, int] = {}
+            for res in res_map.values():
+                if res.get("provider"):
+                    used[res["provider"]] = used.get(res["provider"], 0) + 1
+            logger.info(f"[{batch_name}] Cards per provider: {used}")
+        await asyncio.to_thread(store.close)
+        return list(res_map.values())
+
+    async def _run_pipeline(
+        self,
+        files_to_process: List[Path],
+        max_size: Optional[int],
+        network_workers: int,
+        pack_size: int,
+        run_cards: Callable[[List[Tuple[Path, str]]], Awaitable[List[Dict[str, Any]]]],
+        handle_result: Callable[[Path, Dict[str, Any]], Awaitable[bool]],
+        stats: "PipelineStats",
+        batch_name: str,
+        priority: int = 0,
+        weight: float = 1.0,
+        on_dispatch: Optional[Callable[[List[Path]], Awaitable[None]]] = None,
+    ) -> None:
+        """Bounded two-stage pipeline: image preparation feeding the network stage.
+
+        PREP_WORKERS images are decoded/resized/encoded in the prep pool at a time and
+        handed over through a queue of PREP_QUEUE_DEPTH ready payloads, so at most
+        PREP_WORKERS + PREP_QUEUE_DEPTH encoded images are held in memory while the
+        network stage keeps up to network_workers requests in flight. With pack_size > 1
+        each network worker sends up to pack_size cards per request, so the number of
+        workers shrinks accordingly; a partly filled pack is sent once no further card
+        arrives within MULTI_CARD_WAIT. Every request waits for a slot of the process-wide
+        card scheduler, where the batch is registered with priority and weight;
+        on_dispatch(images) is awaited once a pack holds its slot, before it is sent.
+        """
+        loop = asyncio.get_running_loop()
+        prep_pool = self._get_prep_pool()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.PREP_QUEUE_DEPTH)
+        stop = asyncio.Event()
+        pending = iter(files_to_process)
+
+        async def _prepare_worker() -> None:
+            for img in pending:
+                t0 = time.monotonic()
+                payload, prep_stats = await loop.run_in_executor(prep_pool, prepare_image_with_stats, img, max_size)
+                stats.add_prep(time.monotonic() - t0)
+                await queue.put((img, payload, prep_stats))
+                stats.observe_queue(queue.qsize())
+
+        async def _producer() -> None:
+            await asyncio.gather(*(_prepare_worker() for _ in range(max(1, settings.PREP_WORKERS))))
+            for _ in range(consumer_count):
+                await queue.put(None)
+
+        pack_lock = asyncio.Lock()
+
+        async def _next_pack() -> Tuple[List[Tuple[Path, str, Dict[str, int]]], bool]:
+            """Collects up to pack_size prepared cards; the flag is set once the input is exhausted."""
+            # One pack fills at a time, otherwise idle workers would split it up
+            async with pack_lock:
+                item = await queue.get()
+                if item is None:
+                    return [], True
+                pack = [item]
+                while len(pack) < pack_size:
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=settings.MULTI_CARD_WAIT)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is None:
+                        return pack, True
+                    pack.append(item)
+                return pack, False
+
+        async def _consumer() -> None:
+            while True:
+                pack, exhausted = await _next_pack()
+                if pack:
+                    stats.observe_queue(queue.qsize())
+                    async with card_scheduler.slot(batch_name, len(pack)):
+                        if on_dispatch is not None:
+                            await on_dispatch([img for img, _, _ in pack])
+                        t0 = time.monotonic()
+                        results = await run_cards([(img, payload) for img, payload, _ in pack])
+                    per_card = (time.monotonic() - t0) / len(pack)
+                    for (img, _, prep_stats), res in zip(pack, results):
+                        stats.add_network(per_card)
+                        stats.add_card(res)
+                        res.update(prep_stats)
+                        if not await handle_result(img, res):
+                            stop.set()
+                            return
+                if exhausted:
+                    return
+
+        consumer_count = max(1, min(network_workers // pack_size, len(files_to_process)))
+        card_scheduler.register(batch_name, weight, priority)
+        tasks = [asyncio.create_task(_producer())]
+        tasks += [asyncio.create_task(_consumer()) for _ in range(consumer_count)]
+        finished: asyncio.Future[Any] = asyncio.gather(*tasks)
+        # Mark the outcome as retrieved; a cancelled run must not log "never retrieved"
+        finished.add_done_callback(lambda f: f.cancelled() or f.exception())
+        stopper: asyncio.Future[Any] = asyncio.create_task(stop.wait())
+        try:
+            await asyncio.wait([finished, stopper], return_when=asyncio.FIRST_COMPLETED)
+            if finished.done():
+                finished.result()
+        finally:
+            stopper.cancel()
+            finished.cancel()  # cancels the stage tasks still running
+            await asyncio.gather(*tasks, return_exceptions=True)
+            card_scheduler.unregister(batch_name)
+            logger.info(f"Pipeline stats for {batch_name}: {stats.summary()}")
+
+    async def process_batch_distributed(
+        self,
+        batch_dir: Path,
+        job_id: int,
+        progress_callback: Optional[Callable[[str, Any], Any]] = None,
+        resume: bool = True,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> List[Dict[str, Any]]:
+        """External-worker mode: the batch's cards are processed by `app.worker` processes.
+
+        The unfinished cards become card tasks of job_id and the job is dispatched; the
+        workers lease the cards, run them and store the results in the job queue. This
+        side only observes: every WORKER_POLL_SECONDS it takes the results finished since
+        the last poll, moves failed cards to _errors/, writes the checkpoint and reports
+        progress, until no card of the job is open. Cancelling stops the workers from
+        leasing further cards of the job; the cards they already hold are finished.
+        """
+        batch_name = batch_dir.name
+        image_files = sorted(list(batch_dir.glob("*.jpg")) + list(batch_dir.glob("*.jpeg")))
+
+        if not image_files:
+            logger.warning(f"No images found in {batch_dir}")
+            return []
+
+        error_dir = batch_dir / "_errors"
+        error_dir.mkdir(parents=True, exist_ok=True)
+        store = checkpoints.get(batch_dir)
+        results, completed_files = self._load_checkpoint(store, batch_name, resume)
+        res_map = {r["filename"]: r for r in results}
+
+        files_to_process = [f for f in image_files if f.name not in completed_files]
+        if files_to_process:
+            await asyncio.to_thread(job_queue.add_cards, job_id, [f.name for f in files_to_process])
+        await asyncio.to_thread(job_queue.dispatch, job_id)
+        logger.info(f"[{batch_name}] Job {job_id} dispatched to workers: {len(files_to_process)} cards")
+
+        total = len(image_files)
+        start_time = time.time()
+        started_open: Optional[int] = None
+        last_seq = 0
+
+        def _record_results(new_results: List[Dict[str, Any]]) -> None:
+            for res in new_results:
+                # A resumed observer sees results again whose card it already moved
+                if not res.get("success", False) and (batch_dir / res["filename"]).exists():
+                    self._move_to_errors(batch_dir / res["filename"], error_dir)
+                res_map[res["filename"]] = res
+            self._save_checkpoint(store, new_results, batch_name)
+
+        async def _report(current: int, open_count: int, last_result: Dict[str, Any]) -> None:
+            if not progress_callback:
+                return
+            from app.models.schemas import BatchProgress, ExtractionResult
+
+            done_here = (started_open or 0) - open_count
+            elapsed = time.time() - start_time
+            eta = elapsed / done_here * open_count if done_here > 0 else None
+            progress = BatchProgress(
+                batch_name=batch_name,
+                current=current,
+                total=total,
+                percentage=round((current / total) * 100, 2),
+                eta_seconds=round(eta, 1) if eta is not None else None,
+                last_result=ExtractionResult(**last_result),
+                status="running",
+            )
+            if asyncio.iscoroutinefunction(progress_callback):
+                await progress_callback(batch_name, progress)
+            else:
+                progress_callback(batch_name, progress)
+
+        while True:
+            finished = await asyncio.to_thread(job_queue.finished_since, job_id, last_seq)
+            open_count = await asyncio.to_thread(job_queue.open_cards, job_id)
+            if started_open is None:
+                started_open = open_count
+            if finished:
+                last_seq = finished[-1][0]
+                new_results = [res for _, res in finished]
+                await asyncio.to_thread(_record_results, new_results)
+                base = total - open_count - len(new_results)
+                for n, res in enumerate(new_results, start=1):
+                    await _report(min(total, base + n), open_count, res)
+            if open_count == 0:
+                break
+            if cancel_event and cancel_event.is_set():
+                logger.info(f"Batch {batch_name} cancelled by user, {open_count} cards left to the next run")
+                break
+            await self._sleep_unless_cancelled(settings.WORKER_POLL_SECONDS, cancel_event)
+
+        workers: Dict[str, int] = {}
+        for res in res_map.values():
+            if res.get("worker"):
+                workers[res["worker"]] = workers.get(res["worker"], 0) + 1
+        logger.info(f"[{batch_name}] Cards per worker: {workers}")
+        await asyncio.to_thread(store.close)
+        return list(res_map.values())
+
+    async def process_batch_bulk(
+        self,
+        batch_dir: Path,
+        fields: Optional[List[str]] = None,
+        max_size: Optional[int] = 1600,
+        progress_callback: Optional[Callable[[str, Any], Any]] = None,
+        resume: bool = True,
+        cancel_event: Optional[threading.Event] = None,
+        prompt_template: Optional[str] = None,
+        api_endpoint: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Bulk mode: runs a batch through the provider's batch API instead of live requests.
+
+        The card requests are written as JSONL files to <batch>/_bulk/, each file is
+        submitted as one batch job, the jobs are polled every BULK_POLL_INTERVAL seconds
+        and their output is ingested into the checkpoint. Job ids are kept in
+        <batch>/_bulk/jobs.json, so a restarted run resumes polling instead of submitting
+        (and paying for) the same cards again. Cancelling cancels the open jobs; cards
+        they did not finish stay unprocessed for the next run.
+        """
+        batch_name = batch_dir.name
+        image_files = sorted(list(batch_dir.glob("*.jpg")) + list(batch_dir.glob("*.jpeg")))
+
+        if not image_files:
+            logger.warning(f"No images found in {batch_dir}")
+            return []
+
+        resolved_endpoint = api_endpoint or settings.API_ENDPOINT
+        resolved_key = api_key if api_key is not None else self.api_key
+        if not resolved_key:
+            raise ValueError("API Key missing")
+        base_url = settings.BULK_API_BASE or resolved_endpoint.rsplit("/chat/completions", 1)[0]
+
+        error_dir = batch_dir / "_errors"
+        error_dir.mkdir(parents=True, exist_ok=True)
+        bulk_dir = batch_dir / "_bulk"
+        bulk_dir.mkdir(exist_ok=True)
+        jobs_path = bulk_dir / "jobs.json"
+
+        store = checkpoints.get(batch_dir)
+        results, completed_files = self._load_checkpoint(store, batch_name, resume)
+        res_map = {r["filename"]: r for r in results}
+        jobs = await asyncio.to_thread(self._load_bulk_jobs, jobs_path) if resume else []
+        submitted = {name for job in jobs if not job.get("ingested") for name in job["files"]}
+        total = len(image_files)
+
+        def _record_results(new_results: List[Dict[str, Any]]) -> None:
+            for res in new_results:
+                if not res.get("success", False):
+                    self._move_to_errors(batch_dir / res["filename"], error_dir)
+                res_map[res["filename"]] = res
+            self._save_checkpoint(store, new_results, batch_name)
+
+        async def _report(last_result: Optional[Dict[str, Any]] = None) -> None:
+            if not progress_callback:
+                return
+            from app.models.schemas import BatchProgress, ExtractionResult
+
+            # Cards finished remotely but not yet downloaded count as progress, too
+            running = sum(
+                (job.get("request_counts") or {}).get("completed", 0)
+                for job in jobs if not job.get("ingested")
+            )
+            current = min(total, len(res_map) + running)
+            progress = BatchProgress(
+                batch_name=batch_name,
+                current=current,
+                total=total,
+                percentage=round((current / total) * 100, 2),
+                last_result=ExtractionResult(**last_result) if last_result else None,
+                status="running",
+            )
+            if asyncio.iscoroutinefunction(progress_callback):
+                await progress_callback(batch_name, progress)
+            else:
+                progress_callback(batch_name, progress)
+
+        files_to_process = [f for f in image_files if f.name not in completed_files and f.name not in submitted]
+        if files_to_process and use_cache and settings.EXTRACTION_CACHE_ENABLED:
+            cached = await asyncio.to_thread(
+                self._bulk_cache_hits, files_to_process, batch_name, fields, max_size, prompt_template, model_name
+            )
+            if cached:
+                await asyncio.to_thread(_record_results, cached)
+                answered = {res["filename"] for res in cached}
+                files_to_process = [f for f in files_to_process if f.name not in answered]
+                logger.info(f"[{batch_name}] {len(cached)} cards answered from the extraction cache")
+
+        async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as client:
+            api = BatchApiClient(client, base_url, resolved_key)
+
+            if files_to_process:
+                request_files = await asyncio.to_thread(
+                    self._write_bulk_files, files_to_process, bulk_dir, fields, max_size, prompt_template, model_name
+                )
+                for path, names in request_files:
+                    file_id = await api.upload_file(path)
+                    batch = await api.create_batch(file_id, settings.BULK_ENDPOINT, settings.BULK_COMPLETION_WINDOW)
+                    jobs.append({
+                        "id": batch["id"],
+                        "input_file": path.name,
+                        "files": names,
+                        "status": batch.get("status"),
+                        "ingested": False,
+                    })
+                    await asyncio.to_thread(self._save_bulk_jobs, jobs_path, jobs)
+                    # The request file holds every image base64-encoded; the provider has its copy now
+                    path.unlink(missing_ok=True)
+                    logger.info(f"[{batch_name}] Submitted bulk job {batch['id']} with {len(names)} cards")
+
+            while True:
+                open_jobs = [job for job in jobs if not job.get("ingested")]
+                if not open_jobs:
+                    break
+                if cancel_event and cancel_event.is_set():
+                    for job in open_jobs:
+                        try:
+                            await api.cancel_batch(job["id"])
+                            job["status"] = "cancelling"
+                        except (httpx.HTTPError, BatchApiError) as e:
+                            logger.warning(f"[{batch_name}] Cancelling bulk job {job['id']} failed: {e}")
+                    await asyncio.to_thread(self._save_bulk_jobs, jobs_path, jobs)
+                    logger.info(f"Batch {batch_name} cancelled by user, {len(open_jobs)} bulk jobs cancelled")
+                    break
+
+                for job in open_jobs:
+                    try:
+                        batch = await api.get_batch(job["id"])
+                    except (httpx.HTTPError, BatchApiError) as e:
+                        logger.warning(f"[{batch_name}] Polling bulk job {job['id']} failed: {e}")
+                        continue
+                    job["status"] = batch.get("status")
+                    job["request_counts"] = batch.get("request_counts") or {}
+                    if job["status"] not in TERMINAL_STATES:
+                        continue
+                    new_results = await self._ingest_bulk_job(
+                        api, job, batch, bulk_dir, batch_dir, fields, max_size, prompt_template, model_name, use_cache
+                    )
+                    await asyncio.to_thread(_record_results, new_results)
+                    job["ingested"] = True
+                    logger.info(f"[{batch_name}] Bulk job {job['id']} {job['status']}: {len(new_results)} results ingested")
+                    if new_results:
+                        await _report(new_results[-1])
+                await asyncio.to_thread(self._save_bulk_jobs, jobs_path, jobs)
+                await _report()
+
+                if any(not job.get("ingested") for job in jobs):
+                    await self._sleep_unless_cancelled(settings.BULK_POLL_INTERVAL, cancel_event)
+
+        await asyncio.to_thread(store.close)
+        return list(res_map.values())
+
+    async def _sleep_unless_cancelled(self, seconds: float, cancel_event: Optional[threading.Event]) -> None:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if cancel_event and cancel_event.is_set():
+                return
+            await asyncio.sleep(min(1.0, deadline - time.monotonic()))
+
+    def _load_bulk_jobs(self, jobs_path: Path) -> List[Dict[str, Any]]:
+        if not jobs_path.exists():
+            return []
+        try:
+            with open(jobs_path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to read bulk jobs from {jobs_path}: {e}")
+            return []
+
+    def _save_bulk_jobs(self, jobs_path: Path, jobs: List[Dict[str, Any]]) -> None:
+        """Atomic and fsynced: losing a submitted job's id would orphan it at the provider."""
+        write_json_atomic(jobs_path, jobs)
+
+    def _bulk_cache_hits(
+        self,
+        files: List[Path],
+        batch_name: str,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        """Results for the cards the extraction cache can already answer."""
+        hits = []
+        for image_path in files:
+            start_time = time.time()
+            try:
+                _, cached = self._cache_lookup(image_path, fields, max_size, prompt_template, model_name)
+            except Exception as e:
+                logger.warning(f"Cache lookup failed for {image_path.name}: {e}")
+                continue
+            if cached is not None:
+                res = self._build_card_result(image_path.name, batch_name, cached, None, start_time)
+                res["cached"] = True
+                hits.append(res)
+        return hits
+
+    def _write_bulk_files(
+        self,
+        files: List[Path],
+        bulk_dir: Path,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+    ) -> List[Tuple[Path, List[str]]]:
+        """Writes one JSONL request line per card; returns [(file, card names)].
+
+        Images are encoded in the prep pool. A new file is started whenever the next
+        line would exceed BULK_MAX_REQUESTS_PER_FILE or BULK_MAX_FILE_BYTES.
+        """
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        written: List[Tuple[Path, List[str]]] = []
+        f = None
+        size = 0
+        names: List[str] = []
+        encoded = self._get_prep_pool().map(prepare_image, files, itertools.repeat(max_size), chunksize=4)
+        try:
+            for image_path, b64 in zip(files, encoded):
+                line = json.dumps({
+                    "custom_id": image_path.name,
+                    "method": "POST",
+                    "url": settings.BULK_ENDPOINT,
+                    "body": self._build_payload(image_path, fields, max_size, prompt_template, model_name, b64),
+                }, ensure_ascii=False).encode("utf-8") + b"\n"
+
+                full = len(names) >= settings.BULK_MAX_REQUESTS_PER_FILE or size + len(line) > settings.BULK_MAX_FILE_BYTES
+                if f is None or (names and full):
+                    if f is not None:
+                        f.close()
+                    path = bulk_dir / f"requests-{stamp}-{len(written) + 1:03}.jsonl"
+                    f = open(path, "wb")
+                    size = 0
+                    names = []
+                    written.append((path, names))
+                f.write(line)
+                size += len(line)
+                names.append(image_path.name)
+        finally:
+            if f is not None:
+                f.close()
+        return written
+
+    async def _ingest_bulk_job(
+        self,
+        api: BatchApiClient,
+        job: Dict[str, Any],
+        batch: Dict[str, Any],
+        bulk_dir: Path,
+        batch_dir: Path,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+        use_cache: bool,
+    ) -> List[Dict[str, Any]]:
+        """Downloads a finished job's output and error files and turns them into card results."""
+        paths = []
+        for kind in ("output_file_id", "error_file_id"):
+            dest = bulk_dir / f"{job['id']}-{kind.split('_')[0]}.jsonl"
+            try:
+                if await api.download_file(batch.get(kind), dest):
+                    paths.append(dest)
+            except (httpx.HTTPError, BatchApiError) as e:
+                logger.error(f"Download of {kind} for bulk job {job['id']} failed: {e}")
+
+        new_results = await asyncio.to_thread(
+            self._read_bulk_output, paths, job, batch_dir, fields, max_size, prompt_template, model_name, use_cache
+        )
+
+        if job["status"] == "failed":
+            # The job as a whole was rejected (e.g. invalid input file): fail its cards
+            errors = (batch.get("errors") or {}).get("data") or []
+            reason = errors[0].get("message", "") if errors else ""
+            seen = {res["filename"] for res in new_results}
+            for name in job["files"]:
+                if name not in seen:
+                    new_results.append(self._build_card_result(
+                        name, batch_dir.name, None, f"Batch-Job fehlgeschlagen: {reason}".strip(), time.time()
+                    ))
+        else:
+            missing = len(job["files"]) - len(new_results)
+            if missing:
+                logger.warning(f"Bulk job {job['id']} ({job['status']}) returned no result for {missing} cards; they stay unprocessed")
+        return new_results
+
+    def _read_bulk_output(
+        self,
+        paths: List[Path],
+        job: Dict[str, Any],
+        batch_dir: Path,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+        use_cache: bool,
+    ) -> List[Dict[str, Any]]:
+        wanted = set(job["files"])
+        results: Dict[str, Dict[str, Any]] = {}
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    name = item.get("custom_id")
+                    if name not in wanted or name in results:
+                        continue
+                    results[name] = self._bulk_card_result(
+                        item, batch_dir / name, batch_dir.name, fields, max_size, prompt_template, model_name, use_cache
+                    )
+                    results[name]["bulk_job"] = job["id"]
+        return list(results.values())
+
+    def _bulk_card_result(
+        self,
+        item: Dict[str, Any],
+        image_path: Path,
+        batch_name: str,
+        fields: Optional[List[str]],
+        max_size: Optional[int],
+        prompt_template: Optional[str],
+        model_name: Optional[str],
+        use_cache: bool,
+    ) -> Dict[str, Any]:
+        """Turns one line of a batch output/error file into a card result."""
+        start_time = time.time()
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        data = None
+        error: Optional[str]
+        if item.get("error"):
+            err = item["error"]
+            error = f"Batch-Fehler: {err.get('message', err) if isinstance(err, dict) else err}"
+        elif response.get("status_code") != 200:
+            detail = (body.get("error") or {}).get("message", "") if isinstance(body, dict) else ""
+            error = f"HTTP {response.get('status_code')}: {str(detail)[:250]}".rstrip(": ")
+        else:
+            data, error = self._parse_completion(body, image_path)
+            if not error and data is not None and use_cache and settings.EXTRACTION_CACHE_ENABLED:
+                try:
+                    key, _ = self._cache_lookup(image_path, fields, max_size, prompt_template, model_name)
+                    extraction_cache.put(key, data)
+                except OSError as e:
+                    logger.warning(f"Caching bulk result for {image_path.name} failed: {e}")
+
+        res = self._build_card_result(image_path.name, batch_name, data, error, start_time)
+        prompt_tokens = (body.get("usage") or {}).get("prompt_tokens") if isinstance(body, dict) else None
+        if prompt_tokens:
+            res["prompt_tokens"] = prompt_tokens
+        return res
+
+
+
+class PipelineStats:
+    """Stage timings and queue depth of the preparation/network pipeline."""
+
+    def __init__(self) -> None:
+        self.prep_count = 0
+        self.prep_seconds = 0.0
+        self.network_count = 0
+        self.network_seconds = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.started = time.monotonic()
+        self.cards_done = 0
+        # Sent cards and provider-reported prompt tokens, split by single vs. packed requests
+        self.mode_cards = {"single": 0, "multi": 0}
+        self.mode_tokens = {"single": 0.0, "multi": 0.0}
+        self.mode_token_cards = {"single": 0, "multi": 0}
+
+    def add_prep(self, seconds: float) -> None:
+        self.prep_count += 1
+        self.prep_seconds += seconds
+
+    def add_network(self, seconds: float) -> None:
+        self.network_count += 1
+        self.network_seconds += seconds
+
+    def add_card(self, res: Dict[str, Any]) -> None:
+        self.cards_done += 1
+        if res.get("cached"):
+            return
+        mode = "multi" if res.get("cards_per_request", 1) > 1 else "single"
+        self.mode_cards[mode] += 1
+        if res.get("prompt_tokens"):
+            self.mode_tokens[mode] += res["prompt_tokens"]
+            self.mode_token_cards[mode] += 1
+
+    def observe_queue(self, depth: int) -> None:
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    @property
+    def prep_avg(self) -> Optional[float]:
+        return round(self.prep_seconds / self.prep_count, 3) if self.prep_count else None
+
+    @property
+    def network_avg(self) -> Optional[float]:
+        return round(self.network_seconds / self.network_count, 3) if self.network_count else None
+
+    @property
+    def cards_per_minute(self) -> Optional[float]:
+        elapsed = time.monotonic() - self.started
+        return round(self.cards_done * 60 / elapsed, 1) if self.cards_done and elapsed > 0 else None
+
+    @property
+    def prompt_tokens_per_card(self) -> Optional[float]:
+        cards = sum(self.mode_token_cards.values())
+        return round(sum(self.mode_tokens.values()) / cards, 1) if cards else None
+
+    def _mode_summary(self, mode: str) -> str:
+        cards = self.mode_token_cards[mode]
+        tokens = f"{self.mode_tokens[mode] / cards:.0f} prompt tokens/card" if cards else "no token usage reported"
+        return f"{mode}-card {self.mode_cards[mode]} cards ({tokens})"
+
+    def summary(self) -> str:
+        text = (
+            f"prep {self.prep_count} cards avg {self.prep_avg}s, "
+            f"network {self.network_count} cards avg {self.network_avg}s, "
+            f"max queue depth {self.max_queue_depth}, "
+            f"{self.cards_per_minute} cards/min"
+        )
+        if self.mode_cards["multi"]:
+            text += f"; {self._mode_summary('multi')} vs. {self._mode_summary('single')}"
+        return text
 
-                        # Call the callback via the main loop's thread-safe method if it's async
-                        if asyncio.iscoroutinefunction(progress_callback):
-                            asyncio.run_coroutine_threadsafe(
-                                progress_callback(batch_name, progress_data),
-                                loop
-                            )
-                        else:
-                            progress_callback(batch_name, progress_data)
-            return list(res_map.values())
-
-        return await asyncio.to_thread(_run_batch)
 
 ocr_engine = OcrEngine()
@@ -0,0 +1,44 @@
+import functools
+from typing import Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+
+def generate_prompt(fields: Sequence[str], template: Optional[str] = None) -> str:
+    """Generiert einen dynamischen Prompt basierend auf den gewünschten Feldern.
+
+    If template is provided, renders it by substituting {{fields}} with the fields block.
+    If {{fields}} is not present in the template, the fields block is appended.
+    If template is None, falls back to the default hardcoded German prompt.
+    """
+    fields_block = "\n".join([f"{i+1}. **{field}**: Extrahiere den Wert für das Feld '{field}'." for i, field in enumerate(fields)])
+
+    if template is not None:
+        if "{{fields}}" in template:
+            return template.replace("{{fields}}", fields_block)
+        else:
+            return template + "\n\n" + fields_block
+
+    return f"""Du bist ein Experte für die Digitalisierung historischer Archivkarteikarten.
+
+Deine Aufgabe ist es, die Informationen von der Karteikarte präzise zu extrahieren.
+Achte besonders auf die Handschrift und mögliche Streichungen.
+
+**Extrahiere folgende Felder:**
+{fields_block}
+
+Falls ein Feld nicht auf der Karte vorhanden ist oder nicht entziffert werden kann, verwende einen leeren String ("").
+Ändere nichts an der Schreibweise historischer Begriffe, außer bei offensichtlichen Tippfehlern.
+
+**AUSGABEFORMAT:** Antworte NUR mit einem validen JSON-Objekt.
+"""
+
+
+@functools.lru_cache(maxsize=256)
+def render_prompt(fields: Optional[Tuple[str, ...]], template: Optional[str] = None) -> str:
+    """The prompt sent with each card, rendered once per (fields, template).
+
+    Without fields the configured EXTRACTION_PROMPT is used. Cached because every card
+    of a batch (and every cache lookup) asks for the same prompt.
+    """
+    return generate_prompt(fields, template) if fields else settings.EXTRACTION_PROMPT
@@ -0,0 +1,28 @@
+import logging
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.circuit_breaker import ProviderRoute
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_provider(provider: str, model: Optional[str] = None) -> Tuple[str, str, str]:
+    """Returns (api_endpoint, model_name, api_key) for the given provider."""
+    if provider == "ollama":
+        return settings.OLLAMA_API_ENDPOINT, model or settings.OLLAMA_MODEL_NAME, settings.OLLAMA_API_KEY
+    return settings.API_ENDPOINT, model or settings.MODEL_NAME, settings.OPENROUTER_API_KEY
+
+
+def resolve_fallbacks(provider: str, fallback_providers: List[str]) -> List[ProviderRoute]:
+    """Fallback chain in the given order; skips the primary provider and providers without API key."""
+    routes = []
+    for name in fallback_providers:
+        if name == provider:
+            continue
+        endpoint, model_name, api_key = resolve_provider(name)
+        if not api_key:
+            logger.warning(f"Fallback provider {name} has no API key configured – skipped")
+            continue
+        routes.append(ProviderRoute(name, endpoint, model_name, api_key))
+    return routes
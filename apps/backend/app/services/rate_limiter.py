@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Requests/minute and concurrent-request cap for one (endpoint, API key) pair.
+
+    Shared by every running batch, so three batches on the same key draw from the
+    same budget. pause() stops the whole bucket (e.g. on Retry-After) instead of
+    letting the other workers keep hitting the limit.
+    """
+
+    def __init__(self, name: str, rpm: int, max_concurrent: int, burst: int) -> None:
+        self.name = name
+        self.rate = rpm / 60.0 if rpm > 0 else 0.0  # tokens per second, 0 = unlimited
+        self.capacity = float(max(1, burst))
+        self.max_concurrent = max(1, max_concurrent)
+        self.tokens = self.capacity
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_refill = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def _try_take(self) -> Optional[float]:
+        """Takes a token and a concurrency slot (caller holds the lock).
+
+        Returns 0 on success, the number of seconds to wait for the next token or the
+        end of a pause, or None if the concurrency cap is reached (wait for a release).
+        """
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= self.max_concurrent:
+            return None
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self.tokens < 1.0:
+                return (1.0 - self.tokens) / self.rate
+            self.tokens -= 1.0
+        self.in_flight += 1
+        return 0.0
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._try_take()
+                if wait == 0.0:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                wait = self._try_take()
+                if wait == 0.0:
+                    return
+                fut: Optional[asyncio.Future] = None
+                if wait is None:
+                    fut = loop.create_future()
+                    self._async_waiters.append((loop, fut))
+            if fut is None:
+                await asyncio.sleep(wait or 0.0)
+                continue
+            try:
+                await fut
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._async_waiters.remove((loop, fut))
+                    except ValueError:
+                        self._wake_one()
+                raise
+
+    def _wake_one(self) -> None:
+        self._cond.notify()
+        if self._async_waiters:
+            loop, fut = self._async_waiters.popleft()
+            loop.call_soon_threadsafe(_resolve_future, fut)
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._wake_one()
+
+    def pause(self, seconds: float) -> None:
+        """Blocks new requests on this bucket for the given number of seconds."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self.paused_until:
+                self.paused_until = until
+                logger.warning(f"Rate limit bucket {self.name} paused for {seconds:.1f}s")
+
+    @contextmanager
+    def slot(self) -> Iterator["TokenBucket"]:
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self) -> AsyncIterator["TokenBucket"]:
+        await self.acquire_async()
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+def _resolve_future(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class RateLimiter:
+    """Process-wide registry of token buckets keyed by (endpoint, API key)."""
+
+    def __init__(self) -> None:
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str, api_key: str) -> TokenBucket:
+        # Only a digest of the key is kept, so it never shows up in logs
+        key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            bucket = self._buckets.get((endpoint, key_id))
+            if bucket is None:
+                bucket = TokenBucket(
+                    name=f"{endpoint}#{key_id}",
+                    rpm=settings.RATE_LIMIT_RPM,
+                    max_concurrent=settings.RATE_LIMIT_MAX_CONCURRENT,
+                    burst=settings.RATE_LIMIT_BURST or settings.RATE_LIMIT_MAX_CONCURRENT,
+                )
+                self._buckets[(endpoint, key_id)] = bucket
+            return bucket
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,307 @@
+import json
+import logging
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.checkpoint import CheckpointStore
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    batch_name TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    error_class TEXT,
+    has_signatur INTEGER,
+    valid_signatur INTEGER,
+    validation_errors INTEGER NOT NULL DEFAULT 0,
+    duration REAL,
+    provider TEXT,
+    result TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (batch_name, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_results_filename ON results (filename);
+CREATE INDEX IF NOT EXISTS idx_results_success ON results (batch_name, success);
+CREATE INDEX IF NOT EXISTS idx_results_error_class ON results (error_class, batch_name);
+CREATE INDEX IF NOT EXISTS idx_results_signatur ON results (valid_signatur, batch_name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Error messages of the engine and worker by class: (class, pattern), first match wins
+_ERROR_CLASSES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("auth", re.compile(r"API Key|\(401\)")),
+    ("circuit_open", re.compile(r"Circuit offen")),
+    ("rate_limit", re.compile(r"\b429\b")),
+    ("unavailable", re.compile(r"Max\. Versuche|antwortet nicht|Timeout", re.IGNORECASE)),
+    ("parse", re.compile(r"JSON-Parsing|Keine Antwort vom Modell|Stream-Fehler")),
+    ("http_5xx", re.compile(r"^HTTP 5\d\d")),
+    ("http_4xx", re.compile(r"^HTTP 4\d\d")),
+    ("batch_api", re.compile(r"^Batch-Fehler")),
+    ("file", re.compile(r"Datei nicht gefunden|cannot identify image|No such file", re.IGNORECASE)),
+    ("worker_lost", re.compile(r"Worker ausgefallen")),
+]
+
+# Sort keys of query(); anything else must name an extracted field ("data.Signatur")
+_SORT_COLUMNS = {
+    "batch": "batch_name",
+    "filename": "filename",
+    "success": "success",
+    "error_class": "error_class",
+    "duration": "duration",
+    "updated_at": "updated_at",
+}
+
+
+def error_class(error: Optional[str]) -> Optional[str]:
+    """Coarse class of a card error for filtering ("rate_limit", "parse", ...); None without error."""
+    if not error:
+        return None
+    for name, pattern in _ERROR_CLASSES:
+        if pattern.search(error):
+            return name
+    return "other"
+
+
+def _json_path(field: str) -> str:
+    return '$.data."' + field.replace('"', "") + '"'
+
+
+def _optional_flag(value: Any) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+class ResultsStore:
+    """Card results of all batches in one SQLite file (RESULTS_DB), for server-side queries.
+
+    Mirrors the batch checkpoints: the engine upserts every card it checkpoints and the
+    API removes retried cards and deleted batches. Success, error class and Signatur
+    validity are indexed columns; the full result is kept as JSON, so extracted fields
+    can be filtered and sorted with json_extract. Batches that existed before the store
+    are imported from their checkpoints once (import_checkpoints). Safe for several
+    threads and processes (WAL, one connection per call).
+    """
+
+    def __init__(self, db_path: str = settings.RESULTS_DB) -> None:
+        self.db_path = Path(db_path)
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            # A lost write is restored from the checkpoint by the next import; no fsync per card
+            conn.execute("PRAGMA synchronous = NORMAL")
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction taking the database lock up front (no upgrade deadlocks)."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- writing ----------------------------------------------------------
+
+    @staticmethod
+    def _row(batch_name: str, res: Dict[str, Any], now: float) -> Tuple[Any, ...]:
+        success = bool(res.get("success", False))
+        return (
+            batch_name,
+            res["filename"],
+            int(success),
+            None if success else error_class(res.get("error")) or "other",
+            _optional_flag(res.get("has_signatur")),
+            _optional_flag(res.get("valid_signatur")),
+            len(res.get("validation_errors") or []),
+            res.get("duration"),
+            res.get("provider"),
+            json.dumps(res, ensure_ascii=False),
+            now,
+        )
+
+    def _insert(self, conn: sqlite3.Connection, batch_name: str, results: Iterable[Dict[str, Any]], replace: bool) -> int:
+        now = time.time()
+        rows = [self._row(batch_name, res, now) for res in results]
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        conn.executemany(f"{verb} INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def upsert(self, batch_name: str, results: List[Dict[str, Any]]) -> None:
+        """Records finished cards; a later result for the same file replaces the earlier one."""
+        if not results:
+            return
+        with self._transaction() as conn:
+            self._insert(conn, batch_name, results, replace=True)
+
+    def remove(self, batch_name: str, filename: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM results WHERE batch_name = ? AND filename = ?", (batch_name, filename))
+
+    def remove_batch(self, batch_name: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM results WHERE batch_name = ?", (batch_name,))
+
+    def import_checkpoints(self, batches_dir: Path, force: bool = False) -> int:
+        """One-time bulk import of the checkpoints of existing batches; returns the cards imported.
+
+        Runs once per database unless forced. Cards already in the store (written by a
+        run in the meantime) are kept.
+        """
+        with self._connect() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'checkpoints_imported'").fetchone()
+        if done is not None and not force:
+            return 0
+        imported = 0
+        started = time.monotonic()
+        batch_dirs = sorted(d for d in batches_dir.iterdir() if d.is_dir()) if batches_dir.exists() else []
+        for batch_dir in batch_dirs:
+            try:
+                results = CheckpointStore(batch_dir).read()
+            except Exception as e:
+                logger.error(f"Skipping results import of {batch_dir.name}: {e}")
+                continue
+            if results:
+                with self._transaction() as conn:
+                    imported += self._insert(conn, batch_dir.name, results, replace=False)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('checkpoints_imported', ?)", (str(time.time()),)
+            )
+        logger.info(
+            f"Imported {imported} card results of {len(batch_dirs)} batches in {time.monotonic() - started:.1f}s"
+        )
+        return imported
+
+    # --- reading ----------------------------------------------------------
+
+    def query(
+        self,
+        batch_names: Optional[List[str]] = None,
+        success: Optional[bool] = None,
+        error_classes: Optional[List[str]] = None,
+        signatur: Optional[str] = None,
+        has_validation_errors: Optional[bool] = None,
+        field_filters: Optional[Dict[str, str]] = None,
+        search: Optional[str] = None,
+        sort: str = "filename",
+        descending: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """One page of matching results plus the total count.
+
+        signatur is "valid", "invalid" (present but not matching a known pattern) or
+        "missing"; field_filters match extracted fields by substring, search matches
+        the filename or any extracted value.
+        """
+        where: List[str] = []
+        params: List[Any] = []
+        if batch_names:
+            where.append(f"batch_name IN ({', '.join('?' * len(batch_names))})")
+            params.extend(batch_names)
+        if success is not None:
+            where.append("success = ?")
+            params.append(int(success))
+        if error_classes:
+            where.append(f"error_class IN ({', '.join('?' * len(error_classes))})")
+            params.extend(error_classes)
+        if signatur == "valid":
+            where.append("valid_signatur = 1")
+        elif signatur == "invalid":
+            where.append("valid_signatur = 0 AND has_signatur = 1")
+        elif signatur == "missing":
+            where.append("success = 1 AND has_signatur = 0")
+        elif signatur is not None:
+            raise ValueError(f"Unknown signatur filter: {signatur}")
+        if has_validation_errors is not None:
+            where.append("validation_errors > 0" if has_validation_errors else "validation_errors = 0")
+        for field, value in (field_filters or {}).items():
+            where.append("json_extract(result, ?) LIKE ?")
+            params.extend([_json_path(field), f"%{value}%"])
+        if search:
+            where.append("(filename LIKE ? OR json_extract(result, '$.data') LIKE ?)")
+            params.extend([f"%{search}%"] * 2)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        direction = "DESC" if descending else "ASC"
+        if sort in _SORT_COLUMNS:
+            order_sql = f"ORDER BY {_SORT_COLUMNS[sort]} {direction}"
+            order_params: List[Any] = []
+        elif sort.startswith("data.") and len(sort) > 5:
+            order_sql = f"ORDER BY json_extract(result, ?) {direction}"
+            order_params = [_json_path(sort[5:])]
+        else:
+            raise ValueError(f"Unknown sort key: {sort}")
+        order_sql += f", batch_name {direction}, filename {direction}"
+
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM results {where_sql}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT batch_name, error_class, result FROM results {where_sql} {order_sql} LIMIT ? OFFSET ?",
+                params + order_params + [limit, offset],
+            ).fetchall()
+        items = []
+        for row in rows:
+            res = json.loads(row["result"])
+            res.setdefault("batch", row["batch_name"])
+            res["error_class"] = row["error_class"]
+            items.append(res)
+        return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+    def success_counts(self, batch_name: Optional[str] = None) -> Dict[str, int]:
+        """Successful cards per batch (of one batch if given)."""
+        sql = "SELECT batch_name, COUNT(*) AS n FROM results WHERE success = 1"
+        params: List[Any] = []
+        if batch_name is not None:
+            sql += " AND batch_name = ?"
+            params.append(batch_name)
+        with self._connect() as conn:
+            return {row["batch_name"]: row["n"] for row in conn.execute(sql + " GROUP BY batch_name", params)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            totals = conn.execute(
+                "SELECT COUNT(*) AS cards, COUNT(DISTINCT batch_name) AS batches, "
+                "COALESCE(SUM(success), 0) AS succeeded FROM results"
+            ).fetchone()
+            errors = {
+                row["error_class"]: row["n"]
+                for row in conn.execute(
+                    "SELECT error_class, COUNT(*) AS n FROM results WHERE success = 0 GROUP BY error_class"
+                )
+            }
+            imported = conn.execute("SELECT value FROM meta WHERE key = 'checkpoints_imported'").fetchone()
+        return {
+            "cards": totals["cards"],
+            "batches": totals["batches"],
+            "succeeded": totals["succeeded"],
+            "errors_by_class": errors,
+            "checkpoints_imported_at": float(imported["value"]) if imported else None,
+        }
+
+
+results_store = ResultsStore()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    """A card request waiting for a worker slot; granted is set under the scheduler lock."""
+
+    __slots__ = ("loop", "future", "cards", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future, cards: int) -> None:
+        self.loop = loop
+        self.future = future
+        self.cards = cards
+        self.granted = False
+
+
+class _BatchShare:
+    def __init__(self, name: str, weight: float, priority: int) -> None:
+        self.name = name
+        self.weight = weight
+        self.priority = priority
+        self.tag = 0.0  # virtual start time of the batch's next request
+        self.in_flight = 0
+        self.cards_served = 0
+        self.waiters: Deque[_Waiter] = deque()
+
+
+class CardScheduler:
+    """Process-wide budget of in-flight card requests, shared fairly by all running batches.
+
+    At most SCHEDULER_MAX_WORKERS requests run at once, whatever the number of batches.
+    Free slots go to the waiting batches of the highest priority; among those, start-time
+    fair queuing by weight: each granted request advances its batch's virtual time by
+    cards / weight, and the batch with the smallest virtual time is served next. A batch
+    that was idle rejoins at the current virtual time instead of cashing in the share it
+    did not use. Usable from any event loop (one per batch in the worker, the API's own).
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._vtime = 0.0
+        self._batches: Dict[str, _BatchShare] = {}
+        self._lock = threading.Lock()
+
+    def register(self, batch_name: str, weight: float = 1.0, priority: int = 0) -> None:
+        with self._lock:
+            share = self._batches.get(batch_name)
+            if share is None:
+                share = _BatchShare(batch_name, max(weight, 0.01), priority)
+                share.tag = self._vtime
+                self._batches[batch_name] = share
+            else:
+                share.weight, share.priority = max(weight, 0.01), priority
+
+    def update(self, batch_name: str, weight: Optional[float] = None, priority: Optional[int] = None) -> bool:
+        """Changes a running batch's share; returns False if the batch is not running."""
+        with self._lock:
+            share = self._batches.get(batch_name)
+            if share is None:
+                return False
+            if weight is not None:
+                share.weight = max(weight, 0.01)
+            if priority is not None:
+                share.priority = priority
+            self._dispatch()
+            return True
+
+    def unregister(self, batch_name: str) -> None:
+        with self._lock:
+            share = self._batches.pop(batch_name, None)
+            if share is not None:
+                for waiter in share.waiters:
+                    waiter.loop.call_soon_threadsafe(_cancel_future, waiter.future)
+
+    async def acquire(self, batch_name: str, cards: int = 1) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            share = self._batches.get(batch_name)
+            if share is None:
+                raise RuntimeError(f"Batch {batch_name} is not registered with the scheduler")
+            if not share.waiters and share.in_flight == 0:
+                share.tag = max(share.tag, self._vtime)  # rejoining after an idle period
+            waiter = _Waiter(loop, loop.create_future(), cards)
+            share.waiters.append(waiter)
+            self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked(share)
+                else:
+                    try:
+                        share.waiters.remove(waiter)
+                    except ValueError:
+                        pass
+            raise
+
+    def release(self, batch_name: str) -> None:
+        with self._lock:
+            share = self._batches.get(batch_name)
+            if share is None:
+                self.in_flight = max(0, self.in_flight - 1)
+                self._dispatch()
+            else:
+                self._release_locked(share)
+
+    def _release_locked(self, share: _BatchShare) -> None:
+        share.in_flight = max(0, share.in_flight - 1)
+        self.in_flight = max(0, self.in_flight - 1)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grants free slots in priority, then virtual-time order (caller holds the lock)."""
+        while self.in_flight < self.max_workers:
+            waiting = [s for s in self._batches.values() if s.waiters]
+            if not waiting:
+                return
+            top = max(s.priority for s in waiting)
+            share = min((s for s in waiting if s.priority == top), key=lambda s: s.tag)
+            waiter = share.waiters.popleft()
+            waiter.granted = True
+            self._vtime = share.tag
+            share.tag += waiter.cards / share.weight
+            share.in_flight += 1
+            share.cards_served += waiter.cards
+            self.in_flight += 1
+            waiter.loop.call_soon_threadsafe(_resolve_future, waiter.future)
+
+    @asynccontextmanager
+    async def slot(self, batch_name: str, cards: int = 1) -> AsyncIterator[None]:
+        await self.acquire(batch_name, cards)
+        try:
+            yield
+        finally:
+            self.release(batch_name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches: List[Dict[str, Any]] = [
+                {
+                    "batch_name": s.name,
+                    "priority": s.priority,
+                    "weight": s.weight,
+                    "in_flight": s.in_flight,
+                    "waiting": len(s.waiters),
+                    "cards_served": s.cards_served,
+                }
+                for s in self._batches.values()
+            ]
+            return {"max_workers": self.max_workers, "in_flight": self.in_flight, "batches": batches}
+
+
+def _resolve_future(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+def _cancel_future(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.cancel()
+
+
+card_scheduler = CardScheduler(settings.SCHEDULER_MAX_WORKERS)
@@ -0,0 +1,140 @@
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJsonParser:
+    """Scans the JSON value a model streams back, chunk by chunk.
+
+    Text before the first '{' or '[' (prose, code fences) is skipped. For an object,
+    each top-level member is reported as soon as its value is closed; the value is
+    complete at the matching closing bracket, so the caller can stop reading even if
+    the model keeps emitting trailing text.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.end: Optional[int] = None  # index after the closing bracket
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._member_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    @property
+    def text(self) -> str:
+        """The JSON value seen so far, or everything fed if none has started."""
+        if self._start is None:
+            return self.buffer
+        return self.buffer[self._start:self.end]
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Adds streamed text; returns the (key, value) members closed by it."""
+        self.buffer += chunk
+        closed: List[Tuple[str, Any]] = []
+        while self._pos < len(self.buffer) and self.end is None:
+            ch = self.buffer[self._pos]
+            if self._start is None:
+                if ch in "{[":
+                    self._start = self._pos
+                    self._member_start = self._pos + 1
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_member(self._pos, closed)
+                    self.end = self._pos + 1
+            elif ch == "," and self._depth == 1:
+                self._close_member(self._pos, closed)
+                self._member_start = self._pos + 1
+            self._pos += 1
+        return closed
+
+    def _close_member(self, pos: int, closed: List[Tuple[str, Any]]) -> None:
+        if self._start is None or self.buffer[self._start] != "{":
+            return  # arrays (multi-entry pages, multi-card answers) have no fields to report
+        member = self.buffer[self._member_start:pos].strip()
+        if not member:
+            return
+        try:
+            closed.extend(json.loads("{" + member + "}").items())
+        except json.JSONDecodeError:
+            pass
+
+
+class StreamedCompletion:
+    """Collects a chat-completion server-sent-events stream into a regular response body.
+
+    feed_line() returns True once reading can stop: at "[DONE]", on an error event, or
+    as soon as the answer's JSON value is complete. on_field is called for every
+    top-level field the moment it closes.
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None) -> None:
+        self.parser = IncrementalJsonParser()
+        self.on_field = on_field
+        self.usage: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.cut_short = False
+
+    def feed_line(self, line: str) -> bool:
+        line = line.strip()
+        if not line.startswith("data:"):
+            return False  # blank keep-alives, comments, "event:" lines
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return True
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            return False
+
+        if event.get("error"):
+            err = event["error"]
+            self.error = str(err.get("message", err) if isinstance(err, dict) else err)[:250]
+            return True
+        if event.get("usage"):
+            self.usage = event["usage"]
+
+        choices = event.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        if delta:
+            for key, value in self.parser.feed(delta):
+                self._emit(key, value)
+        if self.parser.complete:
+            self.cut_short = True
+            return True
+        return False
+
+    def _emit(self, key: str, value: Any) -> None:
+        if self.on_field is None:
+            return
+        try:
+            self.on_field(key, value)
+        except Exception as e:
+            logger.warning(f"Field callback failed for {key}: {e}")
+
+    def to_response(self) -> Dict[str, Any]:
+        """Response body in the shape of a non-streamed chat completion."""
+        return {
+            "choices": [{"message": {"role": "assistant", "content": self.parser.text}}],
+            "usage": self.usage,
+        }
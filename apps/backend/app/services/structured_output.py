@@ -0,0 +1,119 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def build_extraction_schema(fields: Optional[List[str]]) -> Dict[str, Any]:
+    """JSON Schema for one card's answer: every field a string, all required, nothing else.
+
+    Without a fields list the default FIELD_KEYS (those of EXTRACTION_PROMPT) are used.
+    """
+    keys = list(fields or settings.FIELD_KEYS)
+    return {
+        "type": "object",
+        "properties": {key: {"type": "string"} for key in keys},
+        "required": keys,
+        "additionalProperties": False,
+    }
+
+
+def response_format_for(fields: Optional[List[str]]) -> Dict[str, Any]:
+    """OpenAI-style structured-output response_format for the given fields."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "karteikarte", "strict": True, "schema": build_extraction_schema(fields)},
+    }
+
+
+class StructuredOutputTracker:
+    """Decides per provider whether to send a JSON Schema and counts parse failures.
+
+    In "auto" mode every (endpoint, model) starts with structured output; once a
+    provider rejects the response_format and the plain request succeeds, that pair
+    stays on the prompt-only path for the lifetime of the process. Parse outcomes
+    are counted per endpoint and mode, so the failure rates of both paths can be
+    compared, including how many invalid answers were rescued by JSON repair.
+    A batch run of this process also gets its own counts (open_run ... pop_run).
+    """
+
+    OUTCOMES = ("ok", "repaired", "followup", "failed")
+
+    def __init__(self) -> None:
+        self._unsupported: Set[Tuple[str, str]] = set()
+        # (endpoint, "structured" | "prompt") -> count per outcome, in the order of OUTCOMES
+        self._counts: Dict[Tuple[str, str], List[int]] = {}
+        # batch name -> count per outcome, for the runs in progress
+        self._runs: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def wants_schema(self, endpoint: str, model: str) -> bool:
+        mode = settings.STRUCTURED_OUTPUT
+        if mode == "off":
+            return False
+        if mode == "on":
+            return True
+        with self._lock:
+            return (endpoint, model) not in self._unsupported
+
+    def mark_unsupported(self, endpoint: str, model: str) -> None:
+        with self._lock:
+            if (endpoint, model) not in self._unsupported:
+                self._unsupported.add((endpoint, model))
+                logger.info(f"Structured output not supported by {endpoint} ({model}) — using prompt-only JSON")
+
+    def record_parse(self, endpoint: str, structured: bool, outcome: str, batch_name: Optional[str] = None) -> None:
+        """Counts one answer: "ok" (valid JSON), "repaired" (fixed locally),
+        "followup" (fixed by the model on request) or "failed"."""
+        key = (endpoint, "structured" if structured else "prompt")
+        index = self.OUTCOMES.index(outcome)
+        with self._lock:
+            self._counts.setdefault(key, [0] * len(self.OUTCOMES))[index] += 1
+            run = self._runs.get(batch_name) if batch_name is not None else None
+            if run is not None:
+                run[index] += 1
+
+    def open_run(self, batch_name: str) -> None:
+        """Starts counting the answers of a batch run; the run pops its counts when it ends."""
+        with self._lock:
+            self._runs[batch_name] = [0] * len(self.OUTCOMES)
+
+    def pop_run(self, batch_name: str) -> Optional[Dict[str, Any]]:
+        """Outcomes and rates of the run's answers (as in stats()), None if it had none."""
+        with self._lock:
+            counts = self._runs.pop(batch_name, None)
+        if not counts or not sum(counts):
+            return None
+        return self._rates(counts)
+
+    @staticmethod
+    def _rates(counts: List[int]) -> Dict[str, Any]:
+        ok, repaired, followup, failed = counts
+        total = ok + repaired + followup + failed
+        return {
+            "responses": total,
+            "parse_failures": failed,
+            "repaired_locally": repaired,
+            "fixed_by_followup": followup,
+            "failure_rate": round(failed / total, 4) if total else 0.0,
+            "invalid_json_rate": round((repaired + followup + failed) / total, 4) if total else 0.0,
+        }
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._counts.items())
+        return [{"endpoint": endpoint, "mode": mode, **self._rates(counts)} for (endpoint, mode), counts in items]
+
+    def summary(self, endpoint: str) -> str:
+        parts = [
+            f"{s['mode']} {s['parse_failures']}/{s['responses']} ({s['failure_rate']:.1%}; "
+            f"{s['repaired_locally']} repaired, {s['fixed_by_followup']} via follow-up)"
+            for s in self.stats() if s["endpoint"] == endpoint
+        ]
+        return ", ".join(parts) or "no responses"
+
+
+structured_output = StructuredOutputTracker()
@@ -1,76 +1,90 @@
-import json
 import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.core.config import settings
 from app.models.schemas import Template, TemplateCreate, TemplateUpdate
+from app.services.metadata_store import metadata_store
+from app.services.prompts import render_prompt
 
 class TemplateService:
-    def __init__(self, templates_file: str = settings.TEMPLATES_FILE):
-        self.templates_file = Path(templates_file)
-        self._ensure_file_exists()
+    """Templates from TEMPLATES_FILE, parsed once and indexed by id.
 
-    def _ensure_file_exists(self):
-        if not self.templates_file.exists():
-            self.templates_file.parent.mkdir(parents=True, exist_ok=True)
-            with self.templates_file.open("w") as f:
-                json.dump([], f)
+    The file is a metadata_store document: a change on disk (inode, mtime or size) or a local
+    write bumps its generation, and the next access rebuilds the index and the rendered
+    prompt of every template. Writes are flushed right away, atomically.
+    """
 
-    def _read_templates(self) -> List[dict]:
-        with self.templates_file.open("r") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
+    def __init__(self, templates_file: str = settings.TEMPLATES_FILE):
+        self.templates_file = Path(templates_file)
+        self.doc = metadata_store.document(self.templates_file, list)
+        self._generation = -1
+        self._templates: Dict[str, Template] = {}
+        self._prompts: Dict[str, str] = {}
 
-    def _save_templates(self, templates: List[dict]):
-        with self.templates_file.open("w") as f:
-            json.dump(templates, f, indent=2)
+    def _index(self) -> Dict[str, Template]:
+        """Templates by id, rebuilt when the document changed; must not be modified."""
+        with self.doc.view() as templates:
+            if self._generation != self.doc.generation:
+                index = {t["id"]: Template(**t) for t in templates}
+                self._prompts = {
+                    template_id: render_prompt(tuple(t.fields) or None, t.prompt_template)
+                    for template_id, t in index.items()
+                }
+                self._templates = index
+                self._generation = self.doc.generation
+            return self._templates
 
     def list_templates(self) -> List[Template]:
-        templates_data = self._read_templates()
-        return [Template(**t) for t in templates_data]
+        return list(self._index().values())
 
     def get_template(self, template_id: str) -> Optional[Template]:
-        templates = self._read_templates()
-        for t in templates:
-            if t["id"] == template_id:
-                return Template(**t)
-        return None
+        return self._index().get(template_id)
+
+    def get_prompt(self, template_id: str) -> Optional[str]:
+        """The prompt a batch with this template sends (fields and prompt_template rendered)."""
+        with self.doc.view():
+            if template_id not in self._index():
+                return None
+            return self._prompts[template_id]
 
     def create_template(self, template_in: TemplateCreate) -> Template:
-        templates = self._read_templates()
         new_template = Template(
             id=str(uuid.uuid4()),
             name=template_in.name,
             fields=template_in.fields,
             prompt_template=template_in.prompt_template
         )
-        templates.append(new_template.dict())
-        self._save_templates(templates)
+        self.doc.update(lambda templates: templates.append(new_template.dict()))
+        self.doc.flush()
         return new_template
 
     def update_template(self, template_id: str, template_in: TemplateUpdate) -> Optional[Template]:
-        templates = self._read_templates()
-        for i, t in enumerate(templates):
-            if t["id"] == template_id:
-                if template_in.name is not None:
-                    templates[i]["name"] = template_in.name
-                if template_in.fields is not None:
-                    templates[i]["fields"] = template_in.fields
-                if template_in.prompt_template is not None:
-                    templates[i]["prompt_template"] = template_in.prompt_template
-                self._save_templates(templates)
-                return Template(**templates[i])
-        return None
+        if template_id not in self._index():
+            return None
+        def _apply(templates: List[dict]) -> Optional[Template]:
+            for t in templates:
+                if t["id"] == template_id:
+                    if template_in.name is not None:
+                        t["name"] = template_in.name
+                    if template_in.fields is not None:
+                        t["fields"] = template_in.fields
+                    if template_in.prompt_template is not None:
+                        t["prompt_template"] = template_in.prompt_template
+                    return Template(**t)
+            return None
+        template = self.doc.update(_apply)
+        self.doc.flush()
+        return template
 
     def delete_template(self, template_id: str) -> bool:
-        templates = self._read_templates()
-        initial_count = len(templates)
-        templates = [t for t in templates if t["id"] != template_id]
-        if len(templates) < initial_count:
-            self._save_templates(templates)
-            return True
-        return False
+        if template_id not in self._index():
+            return False
+        def _remove(templates: List[dict]) -> bool:
+            initial_count = len(templates)
+            templates[:] = [t for t in templates if t["id"] != template_id]
+            return len(templates) < initial_count
+        removed = self.doc.update(_remove)
+        self.doc.flush()
+        return removed
 
 template_service = TemplateService()
@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.services.history_index import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    location TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (location, owner, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+SESSION = "session"
+BATCH = "batch"
+INCOMING_DIR = ".incoming"  # uploads being written, inside the session directory
+
+
+def hash_file(path: Path, chunk_size: int = settings.UPLOAD_CHUNK_BYTES) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadIndex:
+    """SHA-256 of every uploaded image and where it lives, for skipping duplicate uploads.
+
+    A file is recorded under its upload session while it waits there and moves to its
+    batch with create_batch. Lookups check that the recorded file still exists (in the
+    batch or its _errors/, in the session or still in its .incoming/ between claim and
+    rename) and drop rows of files deleted behind the index's back, so deleted sessions
+    and batches never block a new upload, while a concurrent upload of the same content
+    sees the one that claimed it first. Images of batches that
+    predate the index are hashed once in the background (backfill).
+    """
+
+    def __init__(
+        self,
+        db_path: str = settings.UPLOAD_INDEX_DB,
+        temp_dir: str = settings.TEMP_DIR,
+        batches_dir: str = settings.BATCHES_DIR,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.temp_dir = Path(temp_dir)
+        self.batches_dir = Path(batches_dir)
+        self._initialized = False
+        self.duplicates_skipped = 0
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA synchronous = NORMAL")
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                self._initialized = True
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction taking the database lock up front (no upgrade deadlocks)."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _exists(self, location: str, owner: str, filename: str) -> bool:
+        if location == SESSION:
+            # A claimed upload waits in .incoming/ until it is renamed into the session
+            session_dir = self.temp_dir / owner
+            return (session_dir / filename).is_file() or (session_dir / INCOMING_DIR / filename).is_file()
+        batch_dir = self.batches_dir / owner
+        return (batch_dir / filename).is_file() or (batch_dir / "_errors" / filename).is_file()
+
+    # --- uploads ----------------------------------------------------------
+
+    def claim(self, session_id: str, filename: str, sha256: str, size: int, skip_duplicates: bool = True) -> Optional[Dict[str, str]]:
+        """Records an uploaded file under its session unless its content is already present.
+
+        Returns the existing copy ({"location", "owner", "filename"}) if skip_duplicates
+        and the same content is in this session or a batch, None once the file is recorded.
+        """
+        with self._transaction() as conn:
+            if skip_duplicates:
+                for row in conn.execute(
+                    "SELECT location, owner, filename FROM files WHERE sha256 = ?", (sha256,)
+                ).fetchall():
+                    if self._exists(row["location"], row["owner"], row["filename"]):
+                        self.duplicates_skipped += 1
+                        return dict(row)
+                    conn.execute(
+                        "DELETE FROM files WHERE location = ? AND owner = ? AND filename = ?",
+                        (row["location"], row["owner"], row["filename"]),
+                    )
+            conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (SESSION, session_id, filename, sha256, size, time.time()),
+            )
+        return None
+
+    def assign(self, session_id: str, batch_name: str) -> None:
+        """Moves the files of a session to the batch created from it."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE OR REPLACE files SET location = ?, owner = ? WHERE location = ? AND owner = ?",
+                (BATCH, batch_name, SESSION, session_id),
+            )
+
+    def remove_session(self, session_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM files WHERE location = ? AND owner = ?", (SESSION, session_id))
+
+    def remove_batch(self, batch_name: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM files WHERE location = ? AND owner = ?", (BATCH, batch_name))
+
+    # --- existing batches -------------------------------------------------
+
+    def backfill(self, force: bool = False) -> int:
+        """One-time hashing of the images of batches created before the index; returns the files added."""
+        with self._connect() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'batches_backfilled'").fetchone()
+        if done is not None and not force:
+            return 0
+        added = 0
+        started = time.monotonic()
+        batch_dirs = sorted(d for d in self.batches_dir.iterdir() if d.is_dir()) if self.batches_dir.exists() else []
+        for batch_dir in batch_dirs:
+            images = [
+                p for d in (batch_dir, batch_dir / "_errors") if d.is_dir()
+                for p in d.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+            ]
+            rows = []
+            for path in images:
+                try:
+                    rows.append((BATCH, batch_dir.name, path.name, hash_file(path), path.stat().st_size, time.time()))
+                except OSError as e:
+                    logger.error(f"Skipping upload index backfill of {path}: {e}")
+            if rows:
+                with self._transaction() as conn:
+                    conn.executemany("INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+                added += len(rows)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('batches_backfilled', ?)", (str(time.time()),)
+            )
+        logger.info(
+            f"Hashed {added} images of {len(batch_dirs)} batches for the upload index in {time.monotonic() - started:.1f}s"
+        )
+        return added
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            counts = {
+                row["location"]: {"files": row["files"], "owners": row["owners"], "bytes": row["bytes"]}
+                for row in conn.execute(
+                    "SELECT location, COUNT(*) AS files, COUNT(DISTINCT owner) AS owners, "
+                    "COALESCE(SUM(size), 0) AS bytes FROM files GROUP BY location"
+                )
+            }
+            backfilled = conn.execute("SELECT value FROM meta WHERE key = 'batches_backfilled'").fetchone()
+        return {
+            "batches": counts.get(BATCH, {"files": 0, "owners": 0, "bytes": 0}),
+            "sessions": counts.get(SESSION, {"files": 0, "owners": 0, "bytes": 0}),
+            "duplicates_skipped": self.duplicates_skipped,
+            "backfilled_at": float(backfilled["value"]) if backfilled else None,
+        }
+
+
+upload_index = UploadIndex()
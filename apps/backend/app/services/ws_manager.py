@@ -1,6 +1,7 @@
+import json
 import logging
 import threading
-from typing import Dict, List
+from typing import Any, Dict, List
 from fastapi import WebSocket
 from app.models.schemas import BatchProgress
 
@@ -49,6 +50,20 @@ class ConnectionManager:
                 except Exception as e:
                     logger.error(f"Error sending WebSocket message to client for batch {batch_id}: {e}")
 
+    async def broadcast_partial_result(self, batch_id: str, filename: str, fields: Dict[str, Any]):
+        """Pushes fields of a card still being streamed; not kept as batch state."""
+        if batch_id not in self.active_connections:
+            return
+        message = json.dumps(
+            {"type": "partial_result", "batch_name": batch_id, "filename": filename, "fields": fields},
+            ensure_ascii=False,
+        )
+        for connection in self.active_connections[batch_id]:
+            try:
+                await connection.send_text(message)
+            except Exception as e:
+                logger.error(f"Error sending partial result to client for batch {batch_id}: {e}")
+
     def clear_state(self, batch_id: str):
         if batch_id in self.batch_states:
             del self.batch_states[batch_id]
@@ -0,0 +1,144 @@
+"""Standalone OCR worker: leases card tasks from the job queue and runs them.
+
+Start one or more next to the API (with WORKER_MODE=external and the same DATA_DIR):
+
+    python -m app.worker [--threads N]
+
+Each worker keeps up to WORKER_THREADS cards in flight and renews its card leases
+every JOB_HEARTBEAT_SECONDS; cards of a worker that dies are handed to the others once
+their lease expires. Rate limits and the adaptive concurrency limit are per process, so
+with N workers set RATE_LIMIT_RPM to the provider's limit divided by N.
+"""
+import argparse
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.batch_manager import batch_manager
+from app.services.job_queue import CardTask, JobQueue, job_queue, make_owner
+from app.services.ocr_engine import ocr_engine
+from app.services.providers import resolve_fallbacks, resolve_provider
+
+logger = logging.getLogger(__name__)
+
+
+class CardWorker:
+    """Pulls cards of dispatched jobs from the queue and processes them with OcrEngine.process_card_sync."""
+
+    def __init__(self, queue: JobQueue, threads: int) -> None:
+        self.queue = queue
+        self.threads = max(1, threads)
+        self.owner = make_owner()
+        self.name = self.owner.rsplit(":", 1)[0]  # host:pid
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self._configs: Dict[int, Dict[str, Any]] = {}
+
+    def _card_kwargs(self, task: CardTask) -> Dict[str, Any]:
+        """Card parameters of a job from its batch's config.json, read once while the worker
+        holds cards of the job (see _forget_configs)."""
+        kwargs = self._configs.get(task.job_id)
+        if kwargs is None:
+            config: Dict[str, Any] = batch_manager.get_config(task.batch_name).read()
+            provider = config.get("provider", "openrouter")
+            api_endpoint, model_name, api_key = resolve_provider(provider, config.get("model"))
+            kwargs = {
+                "fields": config.get("fields"),
+                "prompt_template": config.get("prompt_template"),
+                "api_endpoint": api_endpoint,
+                "model_name": model_name,
+                "api_key": api_key,
+                "use_cache": not config.get("bypass_cache", False),
+                "routes": ocr_engine.provider_chain(
+                    provider, api_endpoint, model_name, api_key,
+                    resolve_fallbacks(provider, config.get("fallback_providers", [])),
+                ),
+            }
+            self._configs[task.job_id] = kwargs
+        return kwargs
+
+    def _forget_configs(self, in_flight: Dict[Future, CardTask]) -> None:
+        """Drops the parameters of jobs the worker holds no card of anymore (finished, cancelled,
+        taken over), so a long-running worker keeps only those of its current jobs."""
+        held = {task.job_id for task in in_flight.values()}
+        for job_id in [job_id for job_id in self._configs if job_id not in held]:
+            del self._configs[job_id]
+
+    def _run_card(self, task: CardTask) -> None:
+        image_path = batch_manager.get_batch_path(task.batch_name) / task.filename
+        if image_path.exists():
+            res = ocr_engine.process_card_sync(image_path, task.batch_name, **self._card_kwargs(task))
+        else:
+            res = {
+                "filename": task.filename,
+                "batch": task.batch_name,
+                "success": False,
+                "error": f"Datei nicht gefunden: {task.filename}",
+                "duration": 0.0,
+            }
+        res["worker"] = self.name
+        if not self.queue.complete_card(task.job_id, res, self.owner):
+            logger.warning(f"[{task.batch_name}] Result for {task.filename} dropped — card leased by another worker")
+
+    def run(self) -> None:
+        logger.info(f"Worker {self.owner} started with {self.threads} threads")
+        pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="card")
+        in_flight: Dict[Future, CardTask] = {}
+        last_heartbeat = time.monotonic()
+        last_report, reported = time.monotonic(), 0
+        try:
+            while not self.stop_event.is_set():
+                for task in self.queue.lease_pending_cards(self.owner, self.threads - len(in_flight)):
+                    in_flight[pool.submit(self._run_card, task)] = task
+
+                now = time.monotonic()
+                if now - last_heartbeat >= settings.JOB_HEARTBEAT_SECONDS:
+                    last_heartbeat = now
+                    self.queue.heartbeat_cards(self.owner)
+                if now - last_report >= 60 and self.processed > reported:
+                    logger.info(f"Worker {self.name}: {(self.processed - reported) / (now - last_report) * 60:.1f} cards/min")
+                    last_report, reported = now, self.processed
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=settings.WORKER_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = in_flight.pop(future)
+                        self.processed += 1
+                        if future.exception() is not None:
+                            logger.error(f"[{task.batch_name}] {task.filename} failed in worker: {future.exception()}")
+                else:
+                    self.stop_event.wait(settings.WORKER_POLL_SECONDS)
+                self._forget_configs(in_flight)
+            if in_flight:
+                logger.info(f"Worker {self.name} stopping — finishing {len(in_flight)} cards in flight")
+            pool.shutdown(wait=True)
+        finally:
+            released = self.queue.release_cards(self.owner)
+            if released:
+                logger.info(f"Worker {self.name} handed {released} cards back to the queue")
+            logger.info(f"Worker {self.name} stopped after {self.processed} cards")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="OCR card worker")
+    parser.add_argument("--threads", type=int, default=settings.WORKER_THREADS, help="cards in flight")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    worker = CardWorker(job_queue, args.threads)
+
+    def _stop(signum: int, _frame: Any) -> None:
+        logger.info(f"Signal {signum} received")
+        worker.stop_event.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark: rewriting checkpoint.json per card vs. the append-only checkpoint journal.
+
+Usage (from apps/backend):
+    uv run python -m scripts.bench_checkpoint [--cards 10000] [--sample 200]
+
+Records --cards synthetic card results one at a time, once the way process_batch used to
+(json.dump of all results with indent=2 after every card) and once through
+CheckpointStore, and reports bytes written, wall time and fsyncs plus the time to read
+the results back. The old way is quadratic, so only every --sample-th rewrite is timed
+and the total is extrapolated.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.services.checkpoint import CheckpointStore
+
+FIELDS = ["Komponist", "Signatur", "Titel", "Textanfang", "Verlag", "Bemerkungen"]
+
+
+def make_result(i: int) -> Dict[str, Any]:
+    return {
+        "filename": f"card_{i:06d}.jpg",
+        "batch": "bench",
+        "success": i % 50 != 0,
+        "data": {field: f"{field} der Karte {i} " * 2 for field in FIELDS},
+        "duration": 1.234,
+        "provider": "openrouter",
+        "model": "google/gemini-2.0-flash-001",
+    }
+
+
+def run_rewrite(path: Path, results: List[Dict[str, Any]], sample: int):
+    """Old behaviour; returns (extrapolated seconds, extrapolated bytes, rewrites timed)."""
+    seconds = 0.0
+    written = 0
+    timed = 0
+    for n in range(sample, len(results) + 1, sample):
+        t0 = time.perf_counter()
+        with open(path, "w") as f:
+            json.dump(results[:n], f, indent=2)
+        seconds += time.perf_counter() - t0
+        written += path.stat().st_size
+        timed += 1
+    # each timed rewrite stands for the `sample` rewrites before it
+    return seconds * sample, written * sample, timed
+
+
+def run_journal(batch_dir: Path, results: List[Dict[str, Any]]):
+    """New behaviour; returns (seconds, bytes written, fsyncs, compactions)."""
+    store = CheckpointStore(batch_dir)
+    counts = {"fsync": 0, "compact": 0, "snapshot_bytes": 0}
+    real_fsync, real_compact = os.fsync, store._compact
+
+    def counting_fsync(fd: int) -> None:
+        counts["fsync"] += 1
+        real_fsync(fd)
+
+    def counting_compact() -> None:
+        real_compact()
+        counts["compact"] += 1
+        counts["snapshot_bytes"] += store.snapshot_path.stat().st_size
+
+    os.fsync = counting_fsync  # type: ignore[assignment]
+    store._compact = counting_compact  # type: ignore[method-assign]
+    try:
+        store.load()
+        t0 = time.perf_counter()
+        for res in results:
+            store.append([res])
+        store.close()
+        seconds = time.perf_counter() - t0
+    finally:
+        os.fsync = real_fsync
+    journal_bytes = sum(len((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")) for r in results)
+    return seconds, journal_bytes + counts["snapshot_bytes"], counts["fsync"], counts["compact"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=10000)
+    parser.add_argument("--sample", type=int, default=200, help="time every n-th full rewrite")
+    args = parser.parse_args()
+    results = [make_result(i) for i in range(args.cards)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.json"
+        old_time, old_bytes, timed = run_rewrite(legacy_path, results, args.sample)
+        t0 = time.perf_counter()
+        with open(legacy_path, "r") as f:
+            json.load(f)
+        old_read = time.perf_counter() - t0
+
+        batch_dir = Path(tmp) / "bench"
+        batch_dir.mkdir()
+        new_time, new_bytes, fsyncs, compactions = run_journal(batch_dir, results)
+        t0 = time.perf_counter()
+        loaded = CheckpointStore(batch_dir).read()
+        new_read = time.perf_counter() - t0
+
+    if len(loaded) != args.cards:
+        raise SystemExit(f"Journal lost results: {len(loaded)} != {args.cards}")
+    print(f"{args.cards} cards, one checkpoint write per card")
+    print(f"  rewrite (est. from {timed} runs): {old_time:8.1f} s  {old_bytes / 1e9:8.2f} GB written  read {old_read * 1000:6.1f} ms")
+    print(
+        f"  journal                    : {new_time:8.1f} s  {new_bytes / 1e9:8.2f} GB written  read {new_read * 1000:6.1f} ms"
+        f"  ({fsyncs} fsyncs, {compactions} compactions)"
+    )
+    print(f"  speedup                    : {old_time / new_time:8.1f}x  ({old_bytes / new_bytes:.0f}x fewer bytes)")
+
+
+if __name__ == "__main__":
+    main()
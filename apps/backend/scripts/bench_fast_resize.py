@@ -0,0 +1,72 @@
+"""Benchmark: Image.thumbnail vs. JPEG draft decoding (FAST_RESIZE) for large scans.
+
+Usage (from apps/backend):
+    uv run python -m scripts.bench_fast_resize [--size 5000x7000] [--target 1600] [--runs 5]
+
+Generates a synthetic scan, downsizes it with both modes of image_prep.downscale and
+reports the mean time per image plus the output dimensions, which must match.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from app.core.config import settings
+from app.services.image_prep import downscale
+
+
+def make_scan(path: Path, width: int, height: int) -> None:
+    """Card-like test image: paper tone, ruled lines and text-sized blocks."""
+    img = Image.new("RGB", (width, height), (236, 228, 210))
+    draw = ImageDraw.Draw(img)
+    for y in range(0, height, 60):
+        draw.line([(0, y), (width, y)], fill=(180, 170, 150), width=2)
+    for i in range(0, width * height // 40000):
+        x = (i * 7919) % width
+        y = (i * 104729) % height
+        draw.rectangle([x, y, x + 30, y + 12], fill=(40, 40, 60))
+    img.save(path, format="JPEG", quality=92)
+
+
+def run(path: Path, target: int, fast: bool, runs: int):
+    settings.FAST_RESIZE = fast
+    durations = []
+    size = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        with Image.open(path) as img:
+            out = downscale(img, target)
+            out.load()
+            size = out.size
+        durations.append(time.perf_counter() - t0)
+    return sum(durations) / len(durations), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="5000x7000", help="source WxH")
+    parser.add_argument("--target", type=int, default=1600)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scan.jpg"
+        make_scan(path, width, height)
+
+        base_time, base_size = run(path, args.target, fast=False, runs=args.runs)
+        fast_time, fast_size = run(path, args.target, fast=True, runs=args.runs)
+
+    print(f"source {width}x{height} -> target {args.target}px, {args.runs} runs")
+    print(f"  thumbnail  : {base_time * 1000:8.1f} ms  {base_size}")
+    print(f"  fast resize: {fast_time * 1000:8.1f} ms  {fast_size}")
+    print(f"  speedup    : {base_time / fast_time:8.2f}x")
+    if base_size != fast_size:
+        raise SystemExit(f"Output size mismatch: {base_size} != {fast_size}")
+    print("  dimensions match")
+
+
+if __name__ == "__main__":
+    main()
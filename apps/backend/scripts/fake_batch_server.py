@@ -0,0 +1,205 @@
+"""Local stand-in for an OpenAI-style batch API, for testing bulk mode without network.
+
+Usage (from apps/backend):
+    uv run python -m scripts.fake_batch_server [--port 8090] [--delay 5] [--fail-rate 0.1]
+
+Then run the backend with BULK_API_BASE=http://127.0.0.1:8090/v1 and start a batch with
+{"execution_mode": "bulk"}. Implements POST /v1/files, POST /v1/batches, GET /v1/batches/{id},
+POST /v1/batches/{id}/cancel and GET /v1/files/{id}/content. A job stays "in_progress"
+for --delay seconds, then every request is answered with an extraction whose values are
+made up from the field names in the prompt; --fail-rate of them go to the error file
+instead. Everything is kept in memory.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+FIELD_PATTERN = re.compile(r"^\d+\. \*\*(.+?)\*\*:", re.MULTILINE)
+
+FILES: Dict[str, bytes] = {}
+BATCHES: Dict[str, Dict[str, Any]] = {}
+LOCK = threading.Lock()
+
+
+def fake_completion(request_body: Dict[str, Any], custom_id: str) -> Dict[str, Any]:
+    """Chat-completion response with one made-up value per requested field."""
+    prompt = next(
+        (part["text"] for part in request_body["messages"][0]["content"] if part.get("type") == "text"),
+        "",
+    )
+    fields = FIELD_PATTERN.findall(prompt) or ["Bemerkungen"]
+    answer = {field: f"{field} {custom_id}" for field in fields}
+    if "Signatur" in answer:
+        answer["Signatur"] = "RTSO 101"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "model": request_body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(answer, ensure_ascii=False)}}],
+        "usage": {"prompt_tokens": len(prompt) // 4 + 800, "completion_tokens": 60},
+    }
+
+
+def run_job(batch_id: str, delay: float, fail_rate: float) -> None:
+    with LOCK:
+        batch = BATCHES[batch_id]
+        batch["status"] = "in_progress"
+        lines = FILES[batch["input_file_id"]].decode("utf-8").splitlines()
+        batch["request_counts"]["total"] = len(lines)
+
+    # Finish the requests gradually so progress polling has something to show
+    output: List[str] = []
+    errors: List[str] = []
+    for i, line in enumerate(lines):
+        time.sleep(delay / max(1, len(lines)))
+        with LOCK:
+            if batch["status"] == "cancelling":
+                break
+        request = json.loads(line)
+        custom_id = request["custom_id"]
+        if random.random() < fail_rate:
+            body = {"error": {"message": "Simulated failure", "type": "server_error"}}
+            errors.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": custom_id,
+                "response": {"status_code": 500, "body": body},
+                "error": None,
+            }))
+        else:
+            output.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": custom_id,
+                "response": {"status_code": 200, "body": fake_completion(request["body"], custom_id)},
+                "error": None,
+            }, ensure_ascii=False))
+        with LOCK:
+            batch["request_counts"]["completed"] = len(output)
+            batch["request_counts"]["failed"] = len(errors)
+
+    with LOCK:
+        for kind, content in (("output_file_id", output), ("error_file_id", errors)):
+            if content:
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                FILES[file_id] = ("\n".join(content) + "\n").encode("utf-8")
+                batch[kind] = file_id
+        batch["status"] = "cancelled" if batch["status"] == "cancelling" else "completed"
+        batch["completed_at"] = int(time.time())
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 5.0
+    fail_rate = 0.0
+
+    def log_message(self, format: str, *args: Any) -> None:
+        print(f"{self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+    def _send(self, status: int, payload: Any, content_type: str = "application/json") -> None:
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self) -> None:
+        self._send(404, {"error": {"message": f"No route or object for {self.path}"}})
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with LOCK:
+            batch = BATCHES.get(batch_id)
+            return json.loads(json.dumps(batch)) if batch else None
+
+    def do_GET(self) -> None:
+        parts = self.path.strip("/").split("/")
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3:
+            batch = self._batch(parts[2])
+            return self._send(200, batch) if batch else self._not_found()
+        if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content":
+            with LOCK:
+                content = FILES.get(parts[2])
+            return self._send(200, content, "application/jsonl") if content is not None else self._not_found()
+        self._not_found()
+
+    def do_POST(self) -> None:
+        parts = self.path.strip("/").split("/")
+        body = self._read_body()
+        if parts == ["v1", "files"]:
+            return self._upload(body)
+        if parts == ["v1", "batches"]:
+            return self._create_batch(json.loads(body or b"{}"))
+        if parts[:2] == ["v1", "batches"] and len(parts) == 4 and parts[3] == "cancel":
+            with LOCK:
+                batch = BATCHES.get(parts[2])
+                if batch and batch["status"] in ("validating", "in_progress"):
+                    batch["status"] = "cancelling"
+            batch = self._batch(parts[2])
+            return self._send(200, batch) if batch else self._not_found()
+        self._not_found()
+
+    def _upload(self, body: bytes) -> None:
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=HTTP).parsebytes(header + body)
+        content = None
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True)
+        if content is None:
+            return self._send(400, {"error": {"message": "multipart field 'file' missing"}})
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with LOCK:
+            FILES[file_id] = content
+        self._send(200, {"id": file_id, "object": "file", "bytes": len(content), "purpose": "batch"})
+
+    def _create_batch(self, request: Dict[str, Any]) -> None:
+        with LOCK:
+            if request.get("input_file_id") not in FILES:
+                return self._send(400, {"error": {"message": "unknown input_file_id"}})
+            batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+            BATCHES[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "input_file_id": request["input_file_id"],
+                "completion_window": request.get("completion_window"),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            }
+            batch = json.loads(json.dumps(BATCHES[batch_id]))
+        threading.Thread(target=run_job, args=(batch_id, self.delay, self.fail_rate), daemon=True).start()
+        self._send(200, batch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--delay", type=float, default=5.0, help="seconds until a job is completed")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with an error")
+    args = parser.parse_args()
+
+    Handler.delay = args.delay
+    Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), Handler)
+    print(f"Fake batch API on http://127.0.0.1:{args.port}/v1 (delay {args.delay}s, fail rate {args.fail_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
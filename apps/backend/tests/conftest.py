@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# Settings derive every path from DATA_DIR at import time, so point it at a scratch
+# directory before anything from app is imported
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="indexcards-tests-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeClock:
+    """Stands in for time.monotonic and time.time; tests move it forward by setting now."""
+
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake)
+    monkeypatch.setattr(time, "time", fake)
+    return fake
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services.ocr_engine import OcrEngine
+from scripts import fake_batch_server
+
+
+@pytest.fixture
+def batch_server(monkeypatch):
+    monkeypatch.setattr(fake_batch_server.Handler, "delay", 0.1)
+    monkeypatch.setattr(fake_batch_server.Handler, "fail_rate", 0.0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fake_batch_server.Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "BULK_API_BASE", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(settings, "BULK_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "BULK_MAX_REQUESTS_PER_FILE", 2)
+    monkeypatch.setattr(settings, "PREP_USE_PROCESSES", False)
+    yield fake_batch_server
+    server.shutdown()
+    server.server_close()
+
+
+def test_submit_poll_ingest(tmp_path, batch_server):
+    batch_dir = tmp_path / "bulk-batch"
+    batch_dir.mkdir()
+    for i in range(3):
+        Image.new("RGB", (120, 80), (i, 0, 0)).save(batch_dir / f"card{i}.jpg")
+    updates = []
+
+    results = asyncio.run(OcrEngine(api_key="test").process_batch_bulk(
+        batch_dir, fields=["Komponist", "Signatur"], resume=False, use_cache=False,
+        progress_callback=lambda name, progress: updates.append(progress),
+    ))
+
+    # Two request files (two cards per file), each submitted as one job and ingested
+    jobs = json.loads((batch_dir / "_bulk" / "jobs.json").read_text())
+    assert [job["files"] for job in jobs] == [["card0.jpg", "card1.jpg"], ["card2.jpg"]]
+    assert all(job["ingested"] and job["status"] == "completed" for job in jobs)
+    assert {job["id"] for job in jobs} <= set(batch_server.BATCHES)
+    assert not list((batch_dir / "_bulk").glob("requests-*.jsonl"))
+    assert not list((batch_dir / "_bulk").glob("*.part"))
+
+    by_card = {res["filename"]: res for res in results}
+    assert sorted(by_card) == ["card0.jpg", "card1.jpg", "card2.jpg"]
+    for name, res in by_card.items():
+        assert res["success"] and res["bulk_job"] in {job["id"] for job in jobs}
+        assert res["data"]["Komponist"] == f"Komponist {name}"
+        assert res["data"]["Signatur"] == "RTSO 101"
+        assert res["prompt_tokens"] > 800
+    assert updates[-1].current == updates[-1].total == 3
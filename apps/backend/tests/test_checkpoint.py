@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.checkpoint import CheckpointRegistry, CheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_COMPACT_MIN", 4)
+    return CheckpointStore(tmp_path)
+
+
+def card(i, success=True):
+    return {"filename": f"c{i:03}.jpg", "success": success}
+
+
+def snapshot_size(store):
+    if not store.snapshot_path.exists():
+        return 0
+    return len(json.loads(store.snapshot_path.read_text()))
+
+
+def test_results_survive_a_new_process(store):
+    store.append([card(1), card(2, success=False)])
+    store.append([card(2)])  # retried: the later result wins
+    assert store.successes == 2
+    reopened = CheckpointStore(store.batch_dir)
+    assert [(r["filename"], r["success"]) for r in reopened.read()] == [("c001.jpg", True), ("c002.jpg", True)]
+    assert reopened.version() == 3
+
+
+def test_compaction_waits_for_the_journal_to_reach_the_snapshot_size(store):
+    sizes = []
+    for i in range(20):
+        store.append([card(i)])
+        sizes.append(snapshot_size(store))
+    # compacted at 4 records, then whenever the journal held as many as the snapshot
+    assert sorted(set(sizes)) == [0, 4, 8, 16]
+    assert sizes.index(8) == 7 and sizes.index(16) == 15
+    store.close()
+    assert snapshot_size(store) == 20
+    assert store.journal_path.read_bytes() == b""
+
+
+def test_torn_last_record_is_ignored_and_cut(store):
+    store.append([card(1)])
+    store.close()
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"filename": "c002.jpg", "succ')
+    store.append([card(3)])
+    assert [r["filename"] for r in CheckpointStore(store.batch_dir).read()] == ["c001.jpg", "c003.jpg"]
+
+
+def test_removals_reach_pollers_as_tombstones(store):
+    store.append([card(1), card(2)])
+    version = store.version()
+    assert store.remove("c001.jpg") is True
+    assert store.remove("c001.jpg") is False
+    new_version, records, full = store.read_since(version)
+    assert (new_version, full) == (version + 1, False)
+    assert records == [{"filename": "c001.jpg", "_deleted": True, "_seq": version + 1}]
+    assert [r["filename"] for r in store.read()] == ["c002.jpg"]
+
+
+def test_compaction_drops_tombstones_and_sends_older_pollers_everything(store):
+    store.append([card(1), card(2)])
+    before_remove = store.version()
+    store.remove("c001.jpg")
+    store.close()
+    assert [r["filename"] for r in json.loads(store.snapshot_path.read_text())] == ["c002.jpg"]
+
+    reopened = CheckpointStore(store.batch_dir)
+    assert reopened.version() == before_remove + 1  # kept in checkpoint.meta.json
+    version, records, full = reopened.read_since(before_remove)
+    assert full and [r["filename"] for r in records] == ["c002.jpg"]
+    assert reopened.read_since(version) == (version, [], False)
+
+
+def test_reset_starts_over_without_going_back_in_version(store):
+    store.append([card(1), card(2)])
+    store.reset()
+    assert store.load() == [] and store.successes == 0
+    store.append([card(3)])
+    assert store.version() == 5
+    store.close()
+    assert CheckpointStore(store.batch_dir).version() == 5
+
+
+def test_version_follows_writes_of_another_store(store):
+    reader = CheckpointStore(store.batch_dir)
+    assert reader.version() == 0
+    store.append([card(1)])
+    assert reader.version() == 1
+
+
+def test_registry_releases_journal_handles(tmp_path):
+    registry = CheckpointRegistry()
+    running = registry.get(tmp_path / "running")
+    deleted = registry.get(tmp_path / "deleted")
+    for store in (running, deleted):
+        store.batch_dir.mkdir()
+        store.append([card(1)])
+        assert store.holds_journal
+
+    registry.drop(deleted.batch_dir)
+    assert not deleted.holds_journal and not deleted.snapshot_path.exists()
+
+    assert registry.close_all() == 1
+    assert not running.holds_journal
+    assert [r["filename"] for r in json.loads(running.snapshot_path.read_text())] == ["c001.jpg"]
+    assert registry.get(running.batch_dir) is not running
@@ -0,0 +1,73 @@
+
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.services.concurrency import IGNORE, OVERLOAD, SUCCESS
+
+
+def make_breaker(probes: int = 1) -> CircuitBreaker:
+    return CircuitBreaker(
+        "https://provider.test/v1",
+        window=60.0,
+        min_requests=4,
+        error_rate=0.5,
+        slow_call=0.0,
+        open_seconds=30.0,
+        half_open_probes=probes,
+    )
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(4):
+        breaker.record(OVERLOAD, 0.1)
+    assert breaker.state == OPEN
+
+
+def test_opens_at_error_rate(clock):
+    breaker = make_breaker()
+    breaker.record(SUCCESS, 0.1)
+    breaker.record(SUCCESS, 0.1)
+    breaker.record(OVERLOAD, 0.1)
+    assert breaker.state == CLOSED
+    breaker.record(OVERLOAD, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_ignored_outcomes_do_not_count(clock):
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(IGNORE, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # the only probe slot is taken
+    breaker.record(SUCCESS, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.record(OVERLOAD, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_inconclusive_probe_frees_its_slot(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.record(IGNORE, 0.1)  # e.g. a 400 schema rejection or a 401
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()  # the next request probes
+    breaker.record(SUCCESS, 0.1)
+    assert breaker.state == CLOSED
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.services.concurrency import IGNORE, OVERLOAD, SUCCESS, AdaptiveLimiter, classify_status
+
+
+def make_limiter(initial: int = 4) -> AdaptiveLimiter:
+    return AdaptiveLimiter("https://provider.test/v1", initial=initial, min_limit=1, max_limit=8, decrease=0.5)
+
+
+@pytest.mark.parametrize("status, outcome", [(200, SUCCESS), (429, OVERLOAD), (503, OVERLOAD), (400, IGNORE)])
+def test_classify_status(status, outcome):
+    assert classify_status(status) == outcome
+
+
+def test_successes_grow_the_limit_by_about_one_per_window(clock):
+    limiter = make_limiter(initial=4)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(SUCCESS, 1.0)
+    assert limiter.current_limit == 4
+    assert 4.9 < limiter.limit < 5.0
+    limiter.acquire()
+    limiter.release(SUCCESS, 1.0)
+    assert limiter.current_limit == 5
+
+
+def test_slow_successes_do_not_grow_the_limit(clock):
+    limiter = make_limiter(initial=4)
+    limiter.acquire()
+    limiter.release(SUCCESS, 1.0)
+    limit = limiter.limit
+    limiter.acquire()
+    limiter.release(SUCCESS, 5.0)  # beyond 2x the baseline
+    assert limiter.limit == limit
+
+
+def test_overload_halves_the_limit_once_per_round_trip(clock):
+    limiter = make_limiter(initial=8)
+    limiter.acquire()
+    limiter.release(SUCCESS, 1.0)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(OVERLOAD, 1.0)
+    assert limiter.current_limit == 4
+    clock.now += 1.0
+    limiter.acquire()
+    limiter.release(OVERLOAD, 1.0)
+    assert limiter.current_limit == 2
+    for _ in range(5):
+        clock.now += 1.0
+        limiter.acquire()
+        limiter.release(OVERLOAD, 1.0)
+    assert limiter.current_limit == 1  # never below min_limit
+
+
+def test_ignored_outcomes_change_nothing(clock):
+    limiter = make_limiter(initial=4)
+    limiter.acquire()
+    limiter.release(IGNORE, 30.0)
+    assert limiter.limit == 4.0 and limiter.in_flight == 0
+
+
+def test_slot_counts_exceptions_as_overload(clock):
+    limiter = make_limiter(initial=4)
+    with pytest.raises(RuntimeError):
+        with limiter.slot():
+            raise RuntimeError("connection reset")
+    assert limiter.current_limit == 2
+    with limiter.slot() as slot:
+        slot.record(200)
+    assert limiter.in_flight == 0
+
+
+def test_async_waiters_wait_for_capacity():
+    async def main():
+        limiter = make_limiter(initial=1)
+        await limiter.acquire_async()
+        cancelled = asyncio.create_task(limiter.acquire_async())
+        waiting = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        cancelled.cancel()
+        limiter.release(IGNORE, 0.1)
+        await asyncio.wait_for(waiting, 2.0)
+        assert cancelled.cancelled()
+        assert limiter.in_flight == 1
+
+    asyncio.run(main())
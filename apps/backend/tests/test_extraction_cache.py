@@ -0,0 +1,68 @@
+import os
+import threading
+
+import pytest
+
+from app.services.extraction_cache import ExtractionCache
+
+KEY_ARGS = {"prompt": "Extract", "model": "m", "max_size": 1600, "temperature": 0.0}
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "card.jpg"
+    path.write_bytes(b"image bytes")
+    return path
+
+
+def test_key_covers_image_and_parameters(image, tmp_path):
+    key = ExtractionCache.make_key(image, **KEY_ARGS)
+    assert key == ExtractionCache.make_key(image, **KEY_ARGS)
+
+    copy = tmp_path / "renamed.jpg"
+    copy.write_bytes(b"image bytes")
+    assert ExtractionCache.make_key(copy, **KEY_ARGS) == key  # content-addressed, not by name
+
+    other = tmp_path / "other.jpg"
+    other.write_bytes(b"other bytes")
+    keys = {key, ExtractionCache.make_key(other, **KEY_ARGS)}
+    for name, value in [("prompt", "Other"), ("model", "n"), ("max_size", None), ("temperature", 0.2)]:
+        keys.add(ExtractionCache.make_key(image, **{**KEY_ARGS, name: value}))
+    assert len(keys) == 6
+
+
+def test_round_trip(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, {"Komponist": "Händel"})
+    assert cache.get("ab" * 32) == {"Komponist": "Händel"}
+    assert (tmp_path / "cache" / "ab" / f"{'ab' * 32}.json").exists()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    keys = [f"{i:02x}" * 32 for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, {"text": "x" * 100})
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    assert cache.get(keys[0]) is not None  # a hit makes the oldest entry the newest
+
+    size = cache._path(keys[0]).stat().st_size
+    cache.max_bytes = 4 * size  # the next put exceeds it: evict down to 90%
+    cache.put("ff" * 32, {"text": "x" * 100})
+
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True]
+    assert cache.get("ff" * 32) is not None
+    assert cache._total_bytes == 3 * size
+
+
+def test_concurrent_puts_of_one_key(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    key = "cd" * 32
+    threads = [threading.Thread(target=cache.put, args=(key, {"n": i})) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.get(key)["n"] in range(8)
+    assert [p.name for p in (tmp_path / "cache" / "cd").iterdir()] == [f"{key}.json"]
@@ -0,0 +1,32 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.api_v1.endpoints import health
+
+
+def get_all(*paths):
+    app = FastAPI()
+    app.include_router(health.router, prefix="/health")
+
+    async def _get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(path) for path in paths]
+
+    return asyncio.run(_get())
+
+
+def test_each_diagnostic_has_its_endpoint():
+    names = list(health.DIAGNOSTICS)
+    *single, combined, schema = get_all(
+        *(f"/health/{name}" for name in names), "/health/diagnostics", "/openapi.json"
+    )
+    assert all(resp.status_code == 200 for resp in single)
+    assert list(combined.json()) == names
+    assert combined.json()["jobs"] == single[names.index("jobs")].json()
+    assert "runner" in combined.json()["jobs"]
+
+    described = schema.json()["paths"]["/health/circuits"]["get"]
+    assert described["description"] == health.DIAGNOSTICS["circuits"][1]
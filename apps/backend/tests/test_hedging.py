@@ -0,0 +1,35 @@
+from app.services.hedging import HedgeRegistry, LatencyReport, percentile
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) in (2.0, 3.0)
+    assert percentile([5.0], 0.95) == 5.0
+
+
+def test_reports_only_kept_for_owned_runs():
+    registry = HedgeRegistry()
+    registry.report("worker_batch").add(1.0, 1.0)  # no run owns it, e.g. app.worker
+    assert registry._reports == {}
+
+    registry.open_report("run")
+    registry.report("run").add(1.0, 1.0)
+    registry.report("run").add(2.0, 2.0)
+    report = registry.pop_report("run")
+    assert report.summary().endswith("over 2 requests")
+    assert registry._reports == {}
+    assert registry.pop_report("run").summary() == "no requests"
+
+
+def test_latency_report_dict():
+    report = LatencyReport()
+    assert report.to_dict() is None
+    report.add(1.0, 1.0)
+    index = report.add(0.5, 0.5, hedged=True, hedge_won=True)
+    assert report.to_dict()["lower_bounds"] == 1
+    report.set_primary(index, 3.0)
+    summary = report.to_dict()
+    assert summary["requests"] == 2 and summary["hedged"] == 1 and summary["hedge_won"] == 1
+    assert summary["with_hedging"] == {"p50": 0.5, "p95": 1.0, "p99": 1.0}
+    assert summary["without_hedging"] == {"p50": 1.0, "p95": 3.0, "p99": 3.0}
+    assert summary["lower_bounds"] == 0
@@ -0,0 +1,83 @@
+import asyncio
+
+from app.services.history_index import HistoryIndex, scan_batch_dir
+
+
+def _batch(root, name, images=0, errors=0):
+    batch_dir = root / name
+    (batch_dir / "_errors").mkdir(parents=True)
+    for i in range(images):
+        (batch_dir / f"card{i}.jpg").write_bytes(b"x")
+    for i in range(errors):
+        (batch_dir / "_errors" / f"bad{i}.jpg").write_bytes(b"x")
+    return batch_dir
+
+
+def test_scan_batch_dir(tmp_path):
+    batch_dir = _batch(tmp_path, "b", images=2, errors=2)
+    (batch_dir / "scan.PNG").write_bytes(b"x")
+    (batch_dir / "config.json").write_text("{}")
+    (batch_dir / "nested.jpg").mkdir()
+    assert scan_batch_dir(batch_dir) == (3, 2)
+
+
+def test_counter_updates(tmp_path):
+    index = HistoryIndex(str(tmp_path / "index.json"))
+    index.create("b", files=3)
+    index.adjust("b", files=-1, errors=1)
+    index.update("b", successes=2, status="completed")
+    entry = index.get("b")
+    assert (entry["files"], entry["errors"], entry["successes"], entry["status"]) == (2, 1, 2, "completed")
+
+    index.adjust("b", files=-5, errors=-5)
+    assert (index.get("b")["files"], index.get("b")["errors"]) == (0, 0)
+
+    # Batches without an entry are left to the reconciler
+    index.update("legacy", successes=1)
+    index.adjust("legacy", files=1)
+    assert index.get("legacy") is None
+
+
+def test_reconcile(tmp_path):
+    batches = tmp_path / "batches"
+    _batch(batches, "legacy", images=4, errors=1)
+    _batch(batches, "drifted", images=1)
+    _batch(batches, "running", images=5)
+    index = HistoryIndex(str(tmp_path / "index.json"))
+    index.create("drifted", files=3)
+    index.create("running", files=9, status="running")
+    index.create("deleted", files=2)
+
+    scanned = index.reconcile(batches, {"legacy": 3, "drifted": 1})
+
+    assert scanned == 2
+    legacy = index.get("legacy")  # predates the index: counted from disk
+    assert (legacy["files"], legacy["errors"], legacy["successes"]) == (4, 1, 3)
+    drifted = index.get("drifted")
+    assert (drifted["files"], drifted["successes"]) == (1, 1)
+    assert index.corrections == 1
+    assert index.get("running")["files"] == 9  # left to the run's own updates
+    assert index.get("deleted") is None
+    assert index.stats()["batches"] == 3
+
+
+def test_reconciler_waits_for_the_import(tmp_path):
+    batches = tmp_path / "batches"
+    _batch(batches, "legacy", images=1)
+    index = HistoryIndex(str(tmp_path / "index.json"))
+
+    async def main():
+        imported = asyncio.get_running_loop().create_future()
+        index.start(batches, lambda: {"legacy": 1}, after=imported)
+        await asyncio.sleep(0.05)
+        assert index.get("legacy") is None
+        imported.set_result(None)
+        for _ in range(100):
+            if index.get("legacy") is not None:
+                break
+            await asyncio.sleep(0.01)
+        await index.stop()
+        assert not imported.cancelled()
+
+    asyncio.run(main())
+    assert index.get("legacy")["successes"] == 1
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from app.services.image_cache import ENCODED_DIR_NAME, EncodedImageCache
+
+
+@pytest.fixture
+def card(tmp_path):
+    path = tmp_path / "card.jpg"
+    path.write_bytes(b"scan")
+    return path
+
+
+def encoder(calls):
+    def encode():
+        calls.append(1)
+        return f"payload{len(calls)}", {"bytes_before": 10, "bytes_after": len(calls)}
+
+    return encode
+
+
+def test_hit_until_the_file_changes(card):
+    cache = EncodedImageCache()
+    calls = []
+    assert cache.get_or_encode(card, 800, "JPEG|85", encoder(calls)) == ("payload1", {"bytes_before": 10, "bytes_after": 1})
+    assert cache.get_or_encode(card, 800, "JPEG|85", encoder(calls))[0] == "payload1"
+    assert len(calls) == 1
+
+    st = card.stat()
+    os.utime(card, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))  # touched, same size
+    assert cache.get_or_encode(card, 800, "JPEG|85", encoder(calls))[0] == "payload2"
+
+    card.write_bytes(b"rescanned")
+    os.utime(card, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))  # same mtime, new size
+    assert cache.get_or_encode(card, 800, "JPEG|85", encoder(calls))[0] == "payload3"
+    assert len(calls) == 3
+
+
+def test_keyed_by_encoding_parameters(card):
+    cache = EncodedImageCache()
+    calls = []
+    for max_size, variant in [(800, "JPEG|85"), (1600, "JPEG|85"), (800, "JPEG|70"), (800, "JPEG|85")]:
+        cache.get_or_encode(card, max_size, variant, encoder(calls))
+    assert len(calls) == 3
+
+
+def test_errors_share_the_batch_cache(card):
+    cache = EncodedImageCache()
+    (card.parent / "_errors").mkdir()
+    failed = card.parent / "_errors" / card.name
+    os.replace(card, failed)
+    cache.get_or_encode(failed, 800, "JPEG|85", encoder([]))
+    files = sorted(p.suffix for p in (card.parent / ENCODED_DIR_NAME).iterdir())
+    assert files == [".b64", ".json"]
@@ -0,0 +1,83 @@
+import base64
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.core.config import settings
+from app.services.image_prep import downscale, find_card_bounds, resize_and_encode, thumbnail_size
+
+
+def decoded(payload):
+    return Image.open(io.BytesIO(base64.b64decode(payload)))
+
+
+def scan(path, size, card_box=None):
+    """A flat grey scanner bed, optionally with a light card and some dark text on it."""
+    img = Image.new("RGB", size, (90, 90, 90))
+    if card_box:
+        draw = ImageDraw.Draw(img)
+        draw.rectangle(card_box, fill=(235, 230, 215))
+        left, top = card_box[0] + 40, card_box[1] + 40
+        draw.rectangle((left, top, left + 300, top + 20), fill=(20, 20, 20))
+    img.save(path, quality=90)
+    return path
+
+
+@pytest.mark.parametrize("size", [(3000, 2015), (2015, 3000), (1601, 1200), (5000, 3333)])
+def test_draft_decoding_matches_thumbnail(tmp_path, monkeypatch, size):
+    path = scan(tmp_path / "scan.jpg", size)
+    monkeypatch.setattr(settings, "FAST_RESIZE", True)
+    with Image.open(path) as img:
+        fast = downscale(img, 800)
+        assert img.size[0] < size[0]  # decoded at a reduced DCT scale
+    with Image.open(path) as img:
+        img.thumbnail((800, 800))
+    assert fast.size == img.size == thumbnail_size(*size, 800)
+
+
+def test_small_images_are_left_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FAST_RESIZE", True)
+    with Image.open(scan(tmp_path / "scan.jpg", (640, 480))) as img:
+        assert downscale(img, 800).size == (640, 480)
+    assert thumbnail_size(640, 480, 800) is None
+
+
+def test_find_card_bounds():
+    img = Image.new("L", (2000, 1500), 90)
+    ImageDraw.Draw(img).rectangle((300, 200, 1499, 1099), fill=235)
+    box = find_card_bounds(img)
+    assert box is not None
+    padding = 1500 * settings.CROP_PADDING + 2 * 2000 / 512  # padding plus preview rounding
+    for found, card in zip(box, (300, 200, 1500, 1100)):
+        assert abs(found - card) <= padding
+
+    assert find_card_bounds(Image.new("L", (2000, 1500), 90)) is None  # nothing on the bed
+    full = Image.new("L", (2000, 1500), 90)
+    ImageDraw.Draw(full).rectangle((5, 5, 1994, 1494), fill=235)
+    assert find_card_bounds(full) is None  # nothing to gain
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_crop_keeps_the_scale_of_the_whole_scan(tmp_path, monkeypatch, fast):
+    monkeypatch.setattr(settings, "FAST_RESIZE", fast)
+    monkeypatch.setattr(settings, "CROP_BORDERS", True)
+    path = scan(tmp_path / "scan.jpg", (3000, 2015), card_box=(600, 400, 2399, 1599))
+
+    payload, stats = resize_and_encode(path, 800, 85)
+    width, height = decoded(payload).size
+    scale = 800 / 3000
+    slack = (2 * settings.CROP_PADDING * 2015 + 4 * 3000 / 512) * scale  # padding plus preview rounding
+    assert 1800 * scale - 2 <= width <= 1800 * scale + slack
+    assert 1200 * scale - 2 <= height <= 1200 * scale + slack
+    assert stats["bytes_after"] < stats["bytes_before"]
+
+
+@pytest.mark.parametrize("size", [(3000, 2015), (3000, 2045), (2015, 3000)])
+def test_crop_path_without_a_card_has_the_thumbnail_size(tmp_path, monkeypatch, size):
+    # The draft rounds these scans up to whole DCT blocks; the target must come from the scan itself
+    monkeypatch.setattr(settings, "FAST_RESIZE", True)
+    monkeypatch.setattr(settings, "CROP_BORDERS", True)
+    payload, stats = resize_and_encode(scan(tmp_path / "scan.jpg", size), 800, 85)
+    assert decoded(payload).size == thumbnail_size(*size, 800)
+    assert stats["bytes_after"] == stats["bytes_before"]
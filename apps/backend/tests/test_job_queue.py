@@ -0,0 +1,130 @@
+import socket
+
+import pytest
+
+from app.services import job_queue as jq
+from app.services.job_queue import CANCELLED, COMPLETED, FAILED, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), lease_seconds=30.0)
+
+
+def card(filename, success=True):
+    return {"filename": filename, "batch": "b1", "success": success}
+
+
+def test_job_lifecycle(queue):
+    job_id = queue.enqueue("b1")
+    assert queue.enqueue("b1", retry_errors=True) == job_id  # still waiting: reused
+    job = queue.claim("runner")
+    assert job == jq.Job(job_id, "b1", True, 1)
+    assert queue.claim("other") is None
+    assert queue.heartbeat(job_id, "runner") is False
+    assert queue.heartbeat(job_id, "other") is None
+    assert queue.finish(job_id, "runner", COMPLETED) is True
+    assert queue.finish(job_id, "runner", COMPLETED) is False
+    assert queue.latest_statuses() == {"b1": COMPLETED}
+
+
+def test_one_running_job_per_batch(queue):
+    queue.enqueue("b1")
+    queue.claim("runner")
+    second = queue.enqueue("b1")
+    other = queue.enqueue("b2")
+    assert queue.claim("runner").id == other
+    queue.finish(1, "runner", COMPLETED)
+    assert queue.claim("runner").id == second
+
+
+def test_cancel_drops_queued_and_flags_running(queue):
+    running = queue.enqueue("b1")
+    queue.claim("runner")
+    queue.enqueue("b1")
+    assert queue.request_cancel("b1") == {"queued_cancelled": 1, "running_flagged": 1}
+    assert queue.heartbeat(running, "runner") is True
+    assert queue.release(running, "runner") is True
+    assert queue.stats()["jobs"] == {CANCELLED: 2}
+
+
+def test_release_requeues_without_counting_the_attempt(queue):
+    job_id = queue.enqueue("b1")
+    queue.claim("runner")
+    queue.add_cards(job_id, ["a.jpg", "b.jpg"])
+    queue.lease_cards(job_id, ["a.jpg"])
+    assert queue.release(job_id, "runner") is True
+    assert queue.open_cards(job_id) == 2
+    assert queue.claim("runner").attempts == 1
+
+
+def test_expired_leases_are_requeued_then_failed(queue, clock):
+    job_id = queue.enqueue("b1")
+    queue.claim("runner")
+    assert queue.requeue_expired("me", max_attempts=2) == []
+    clock.now += 31
+    assert [job.id for job in queue.requeue_expired("me", max_attempts=2)] == [job_id]
+    queue.claim("runner")
+    clock.now += 31
+    assert queue.requeue_expired("me", max_attempts=2) == []
+    assert queue.latest_statuses() == {"b1": FAILED}
+
+
+def test_job_of_a_dead_process_is_requeued_before_its_lease_ends(queue):
+    job_id = queue.enqueue("b1")
+    queue.claim(f"{socket.gethostname()}:99999999:deadbeef")
+    assert [job.id for job in queue.requeue_expired("me")] == [job_id]
+
+
+def test_finished_cards_are_kept_with_sequence_numbers(queue):
+    job_id = queue.enqueue("b1")
+    queue.add_cards(job_id, ["a.jpg", "b.jpg", "c.jpg"])
+    queue.complete_card(job_id, card("b.jpg"))
+    queue.complete_card(job_id, card("a.jpg", success=False))
+    queue.add_cards(job_id, ["a.jpg", "b.jpg", "c.jpg"])  # a resumed run keeps the results
+    assert queue.open_cards(job_id) == 1
+    assert set(queue.finished_cards(job_id)) == {"a.jpg", "b.jpg"}
+    assert [(seq, r["filename"]) for seq, r in queue.finished_since(job_id)] == [(1, "b.jpg"), (2, "a.jpg")]
+    assert [seq for seq, _ in queue.finished_since(job_id, after_seq=1)] == [2]
+
+
+def test_external_workers_lease_cards_of_dispatched_jobs(queue, clock):
+    job_id = queue.enqueue("b1")
+    queue.claim("runner")
+    queue.add_cards(job_id, ["a.jpg", "b.jpg", "c.jpg"])
+    assert queue.lease_pending_cards("w1", 2) == []  # not dispatched yet
+    queue.dispatch(job_id)
+    leased = queue.lease_pending_cards("w1", 2)
+    assert [c.filename for c in leased] == ["a.jpg", "b.jpg"]
+    assert queue.stats()["workers_in_flight"] == {"w1": 2}
+
+    # w1 stops renewing: its cards go to w2, and w1's late answer is dropped
+    clock.now += 31
+    queue.heartbeat(job_id, "runner")
+    queue.requeue_expired("runner")
+    assert [c.filename for c in queue.lease_pending_cards("w2", 5)] == ["a.jpg", "b.jpg", "c.jpg"]
+    assert queue.complete_card(job_id, card("a.jpg"), owner="w1") is False
+    assert queue.complete_card(job_id, card("a.jpg"), owner="w2") is True
+    assert queue.complete_card(job_id, card("a.jpg"), owner="w2") is False
+
+    assert queue.heartbeat_cards("w2") == 2
+    assert queue.release_cards("w2") == 2
+    assert queue.open_cards(job_id) == 2
+    assert queue.stats()["active"][0]["status"] == RUNNING
+
+
+def test_card_lease_lost_too_often_fails_the_card(queue, clock):
+    job_id = queue.enqueue("b1")
+    queue.claim("runner")
+    queue.add_cards(job_id, ["a.jpg"])
+    queue.dispatch(job_id)
+    for _ in range(2):
+        queue.lease_pending_cards("w1", 1)
+        clock.now += 31
+        queue.heartbeat(job_id, "runner")
+        queue.requeue_expired("runner", max_attempts=2)
+    [(_, result)] = queue.finished_since(job_id)
+    assert result["success"] is False and result["filename"] == "a.jpg"
+    assert queue.open_cards(job_id) == 0
+    assert queue.stats()["jobs"] == {RUNNING: 1}
+    assert QUEUED not in queue.latest_statuses().values()
@@ -0,0 +1,47 @@
+import pytest
+
+from app.services.json_repair import repair_json
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ('{"a": "1"}', {"a": "1"}),
+        ('Here you go:\n```json\n{"a": "1"}\n```', {"a": "1"}),
+        ('```json\n{"a": "1"}\n```\n```json\n{"a": "2"}\n```', {"a": "1"}),
+        ('```json\n{"a": "1"}', {"a": "1"}),
+        ('{"a": "1", "b": [1, 2,],}', {"a": "1", "b": [1, 2]}),
+        ("{'a': '1', 'b': 'say \"hi\"'}", {"a": "1", "b": 'say "hi"'}),
+        ("{'name': 'O\\'Brien'}", {"name": "O'Brien"}),
+        ('{"name": "O\\\'Brien"}', {"name": "O'Brien"}),
+        ('{"a": "1"\n "b": "2"}', {"a": "1", "b": "2"}),
+        ('{"a": 12 "b": -1.5 "c": true "d": null}', {"a": 12, "b": -1.5, "c": True, "d": None}),
+        ('{"a": [1, 2] "b": 3}', {"a": [1, 2], "b": 3}),
+        ('[{"a": "1"} {"a": "2"}]', [{"a": "1"}, {"a": "2"}]),
+        ('{"a": 12,}', {"a": 12}),
+        ('{"a": "first line\nsecond line"}', {"a": "first line\nsecond line"}),
+        ('{"a": "unterminated\n "b": "2"}', {"a": "unterminated", "b": "2"}),
+        ('{"a": "1"} trailing words {"b": 2}', {"a": "1"}),
+    ],
+)
+def test_repairs(content, expected):
+    assert repair_json(content) == expected
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ('{"a": "1", "b": "tru', {"a": "1", "b": "tru"}),
+        ('{"a": "1", "b": "x\\', {"a": "1", "b": "x"}),
+        ('{"a": "1", "b":', {"a": "1", "b": ""}),
+        ('{"a": "1", "b"', {"a": "1", "b": ""}),
+        ('[{"a": "1"}, {"a": "2"', [{"a": "1"}, {"a": "2"}]),
+    ],
+)
+def test_closes_output_truncated_at_max_tokens(content, expected):
+    assert repair_json(content) == expected
+
+
+@pytest.mark.parametrize("content", ["", "no json here", "```\n```"])
+def test_unrepairable_returns_none(content):
+    assert repair_json(content) is None
@@ -0,0 +1,105 @@
+import json
+import threading
+
+import pytest
+
+from app.services.metadata_store import JsonDocument, MetadataStore, write_json_atomic
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "batches.json"
+
+
+def document(path, default=list):
+    # No timer flush during a test: every write is an explicit flush()
+    return JsonDocument(path, default, flush_delay=3600)
+
+
+def test_updates_are_written_behind_in_one_flush(path):
+    doc = document(path)
+    for i in range(3):
+        doc.update(lambda value, i=i: value.append(i))
+    assert doc.pending and not path.exists()
+    assert doc.flush() is True
+    assert json.loads(path.read_text()) == [0, 1, 2]
+    assert doc.flushes == 1
+    assert doc.flush() is False  # nothing pending
+
+
+def test_reloads_file_changed_by_another_process(path):
+    doc = document(path)
+    doc.update(lambda value: value.append("a"))
+    doc.flush()
+    generation = doc.generation
+    path.write_text(json.dumps(["b"]))
+    assert doc.read() == ["b"]
+    assert doc.generation > generation
+
+
+def test_flush_merges_pending_updates_into_another_process_changes(path):
+    # Two processes (API and worker, two API workers) each with their own copy of the file
+    api, worker = document(path, dict), document(path, dict)
+    api.update(lambda value: value.update(a={"status": "queued"}))
+    worker.update(lambda value: value.update(b={"successes": 1}))
+    api.flush()
+    worker.update(lambda value: value["b"].update(successes=value["b"]["successes"] + 1))
+    worker.flush()
+    assert json.loads(path.read_text()) == {"a": {"status": "queued"}, "b": {"successes": 2}}
+    # and the other way round: the API's next flush keeps the worker's changes
+    api.update(lambda value: value["a"].update(status="running"))
+    api.flush()
+    assert json.loads(path.read_text()) == {"a": {"status": "running"}, "b": {"successes": 2}}
+
+
+def test_failing_replay_drops_only_that_update(path):
+    path.write_text(json.dumps({"k": 1}))
+    first, second = document(path, dict), document(path, dict)
+    second.update(lambda value: value.update(k=value["k"] + 1))
+    second.update(lambda value: value.update(y=2))
+    first.update(lambda value: value.pop("k"))
+    first.flush()
+    second.flush()  # k is gone: its increment fails on the reloaded file
+    assert json.loads(path.read_text()) == {"y": 2}
+
+
+def test_unreadable_file_is_moved_aside(path):
+    path.write_text("{not json")
+    doc = document(path)
+    assert doc.read() == []
+    assert [p.name.startswith("batches.corrupt-") for p in path.parent.iterdir()] == [True]
+
+
+def test_discard_drops_pending_changes(path):
+    doc = document(path)
+    doc.update(lambda value: value.append(1))
+    doc.discard()
+    assert doc.flush() is False
+    assert not path.exists()
+
+
+def test_flush_of_deleted_directory_is_dropped(tmp_path):
+    doc = document(tmp_path / "gone" / "config.json", dict)
+    doc.update(lambda value: value.update(provider="x"))
+    assert doc.flush() is False
+    assert not doc.pending
+
+
+def test_store_shares_one_document_per_file(path):
+    store = MetadataStore(flush_delay=3600)
+    doc = store.document(path, list)
+    assert store.document(path.parent / "." / path.name, list) is doc
+    doc.update(lambda value: value.append(1))
+    assert store.stats()["pending"] == 1
+    assert store.flush_all() == 1
+    assert store.stats() == {"documents": 1, "pending": 0, "flushes": 1}
+
+
+def test_concurrent_atomic_writes(path):
+    threads = [threading.Thread(target=write_json_atomic, args=(path, list(range(i)))) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert json.loads(path.read_text()) in [list(range(i)) for i in range(8)]
+    assert [p.name for p in path.parent.iterdir()] == [path.name]
@@ -0,0 +1,90 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.services.ocr_engine import OcrEngine
+
+NAMES = ["a.jpg", "b.jpg", "c.jpg"]
+
+
+@pytest.fixture
+def engine():
+    return OcrEngine(api_key="test")
+
+
+def test_split_matches_by_name_not_position(engine):
+    parsed = [{"Datei": "c.jpg", "K": "3"}, {"Datei": "a", "K": "1"}, {"Datei": " b.jpg ", "K": "2"}]
+    answered = engine._split_multi_response(parsed, NAMES)
+    assert {name: item["K"] for name, item in answered.items()} == {"a.jpg": "1", "b.jpg": "2", "c.jpg": "3"}
+
+
+def test_split_short_array(engine):
+    answered = engine._split_multi_response([{"Datei": "b.jpg", "K": "2"}], NAMES)
+    assert list(answered) == ["b.jpg"]
+
+
+def test_split_drops_unknown_duplicate_and_non_objects(engine):
+    parsed = [
+        {"Datei": "a.jpg", "K": "1"},
+        {"Datei": "a.jpg", "K": "1b"},  # claimed twice: neither answer is trusted
+        {"Datei": "x.jpg", "K": "?"},
+        {"K": "no name"},
+        "b.jpg",
+        {"Datei": "c.jpg", "K": "3"},
+    ]
+    assert list(engine._split_multi_response(parsed, NAMES)) == ["c.jpg"]
+
+
+def test_split_object_keyed_by_filename(engine):
+    parsed = {"a.jpg": {"K": "1"}, "b": {"K": "2"}, "c.jpg": "not an object"}
+    answered = engine._split_multi_response(parsed, NAMES)
+    assert {name: item["K"] for name, item in answered.items()} == {"a.jpg": "1", "b.jpg": "2"}
+    assert engine._split_multi_response({"Datei": "c.jpg", "K": "3"}, NAMES)["c.jpg"]["K"] == "3"
+    assert engine._split_multi_response("nonsense", NAMES) == {}
+
+
+def _fake_provider(engine, monkeypatch, multi_answer):
+    """Answers multi-card requests with multi_answer and single-card requests with their own card."""
+    requests = []
+
+    def fake_post(endpoint, api_key, payload, **kwargs):
+        texts = [part["text"] for part in payload["messages"][0]["content"] if part["type"] == "text"]
+        names = [text.split(": ", 1)[1] for text in texts if text.startswith("Datei: ")]
+        requests.append(names or "single")
+        content = json.dumps(multi_answer if names else {"Komponist": "single"})
+        return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 300}}, None
+
+    monkeypatch.setattr(engine, "_post_completion", fake_post)
+    return requests
+
+
+def _run(engine):
+    cards = [(Path(name), "AAAA") for name in NAMES]
+    return engine._process_cards_multi_sync(cards, "batch", use_cache=False)
+
+
+def test_pack_in_wrong_order(engine, monkeypatch):
+    answer = [{"Datei": name, "Komponist": name[0]} for name in reversed(NAMES)]
+    requests = _fake_provider(engine, monkeypatch, answer)
+    results = _run(engine)
+    assert requests == [NAMES]
+    assert [r["filename"] for r in results] == NAMES
+    assert [r["data"]["Komponist"] for r in results] == ["a", "b", "c"]
+    assert all(r["cards_per_request"] == 3 and r["prompt_tokens"] == 100 for r in results)
+
+
+def test_count_mismatch_falls_back_to_single_requests(engine, monkeypatch):
+    answer = [{"Datei": "a.jpg", "Komponist": "a"}, {"Datei": "c.jpg", "Komponist": "c"}]
+    requests = _fake_provider(engine, monkeypatch, answer)
+    results = _run(engine)
+    assert requests == [NAMES, "single"]
+    assert [r["data"]["Komponist"] for r in results] == ["a", "single", "c"]
+    assert "cards_per_request" not in results[1]
+
+
+def test_unparsable_pack_falls_back_for_every_card(engine, monkeypatch):
+    requests = _fake_provider(engine, monkeypatch, {"unrelated": "object"})
+    results = _run(engine)
+    assert requests == [NAMES, "single", "single", "single"]
+    assert all(r["success"] and r["data"]["Komponist"] == "single" for r in results)
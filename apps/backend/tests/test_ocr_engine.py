@@ -0,0 +1,180 @@
+import asyncio
+import base64
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services.hedging import hedging
+from app.services.ocr_engine import OcrEngine
+
+
+class FakeProvider:
+    """Local chat-completion endpoint. A card is recognised by its image width; script maps
+    a width to the error statuses it answers with before it succeeds."""
+
+    def __init__(self, script):
+        self.script = {width: list(statuses) for width, statuses in script.items()}
+        self.requests = {}
+        self.lock = threading.Lock()
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                image = next(p for p in body["messages"][0]["content"] if p["type"] == "image_url")
+                data = base64.b64decode(image["image_url"]["url"].split(",", 1)[1])
+                width = Image.open(io.BytesIO(data)).width
+                with provider.lock:
+                    provider.requests[width] = provider.requests.get(width, 0) + 1
+                    statuses = provider.script.get(width, [])
+                    status = statuses.pop(0) if statuses else 200
+                if status == 200:
+                    content = json.dumps({"Komponist": f"K{width}", "Signatur": "RTSO 101"})
+                    if width == 105:
+                        content = content[:-1] + ",}"  # trailing comma, repaired locally
+                    self._send(200, {
+                        "choices": [{"message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 900},
+                    })
+                else:
+                    self._send(status, {"error": {"message": f"scripted {status}"}}, {"Retry-After": "0"})
+
+            def _send(self, status, payload, headers=None):
+                raw = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_port}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+SCRIPT = {
+    101: [429],            # rate limited once
+    102: [500, 502],       # two server errors, then an answer
+    103: [400],            # client error: not retried
+    104: [500, 500, 500],  # retries exhausted
+}
+
+
+@pytest.fixture
+def engine_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT", "off")
+    monkeypatch.setattr(settings, "PREP_USE_PROCESSES", False)
+    monkeypatch.setattr(settings, "CARDS_PER_REQUEST", 1)
+    monkeypatch.setattr(OcrEngine, "_retry_wait", lambda self, attempt, retry_after=None: 0.0)
+
+
+def _make_batch(tmp_path, name):
+    batch_dir = tmp_path / name
+    batch_dir.mkdir()
+    for width in range(101, 107):
+        Image.new("RGB", (width, 80), (width, 0, 0)).save(batch_dir / f"card{width}.jpg")
+    return batch_dir
+
+
+def _run(mode, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ENGINE_MODE", mode)
+    provider = FakeProvider(SCRIPT)
+    updates = []
+    try:
+        batch_dir = _make_batch(tmp_path, f"engine-{mode}")
+        results = asyncio.run(OcrEngine(api_key="test").process_batch(
+            batch_dir, max_size=1600, resume=False, api_endpoint=provider.endpoint, use_cache=False,
+            progress_callback=lambda name, progress: updates.append(progress),
+        ))
+    finally:
+        provider.close()
+    # The final update carries the run's request latencies
+    assert [u.latency is not None for u in updates] == [False] * 6 + [True]
+    assert updates[-1].latency["requests"] == 6
+    assert set(updates[-1].latency["with_hedging"]) == {"p50", "p95", "p99"}
+    parse_stats = updates[-1].parse_stats
+    assert (parse_stats["responses"], parse_stats["repaired_locally"], parse_stats["parse_failures"]) == (4, 1, 0)
+    by_card = {}
+    for res in results:
+        data = dict(res.get("data") or {})
+        data.pop("Batch", None)
+        by_card[res["filename"]] = (res["success"], res.get("error"), data, res.get("prompt_tokens"))
+    return by_card, provider.requests
+
+
+def test_threaded_and_async_engine_agree(tmp_path, monkeypatch, engine_settings):
+    threaded, threaded_requests = _run("threaded", tmp_path, monkeypatch)
+    async_, async_requests = _run("async", tmp_path, monkeypatch)
+
+    assert threaded == async_
+    assert threaded_requests == async_requests == {101: 2, 102: 3, 103: 1, 104: 3, 105: 1, 106: 1}
+
+    assert threaded["card101.jpg"][:3] == (
+        True, None, {"Komponist": "K101", "Signatur": "RTSO 101", "Datei": "card101.jpg"}
+    )
+    assert threaded["card101.jpg"][3] == 900
+    assert threaded["card102.jpg"][0] is True
+    assert threaded["card103.jpg"][:2] == (False, "HTTP 400: scripted 400")
+    assert threaded["card104.jpg"][:2] == (False, "Max. Versuche (3) erreicht – API antwortet nicht")
+    assert threaded["card105.jpg"][2]["Komponist"] == "K105"
+
+
+@pytest.mark.parametrize("mode", ["threaded", "async"])
+def test_hedge_delay_learned_from_the_first_request(mode, monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_REQUESTS", True)
+    engine = OcrEngine(api_key="test")
+    endpoint = f"http://hedge-{mode}.invalid"
+    policy = hedging.get(endpoint)
+    policy.budget = 1.0
+    for _ in range(policy.min_samples):
+        policy.record(0.01)
+    hedging.open_report(f"hedge-{mode}")
+    calls = []
+
+    def _delay(timing):
+        timing.setdefault("sent", time.monotonic())
+        calls.append(timing)
+        return 1.0 if len(calls) == 1 else 0.0  # the first request is slow, its hedge fast
+
+    def call(timing):
+        time.sleep(_delay(timing))
+        return {"n": len(calls)}, None, {}
+
+    async def call_async(timing):
+        await asyncio.sleep(_delay(timing))
+        return {"n": len(calls)}, None, {}
+
+    async def _run_async():
+        outcome = await engine._hedged_async(endpoint, f"hedge-{mode}", call_async)
+        await asyncio.sleep(1.0)  # the first request finishes in the background
+        return outcome
+
+    if mode == "async":
+        (data, error, _), info = asyncio.run(_run_async())
+    else:
+        (data, error, _), info = engine._hedged_sync(endpoint, f"hedge-{mode}", call)
+        time.sleep(1.0)
+
+    assert info == {"hedged": True, "hedge_won": True}
+    assert error is None and data == {"n": 2}
+    # Learned: the first request's own latency, not the hedge's quick answer
+    assert policy._latencies[-1] >= 0.9
+    report = hedging.pop_report(f"hedge-{mode}")
+    assert report.answered[0] < 0.9 <= report.primary[0]
+    assert not report.lower_bounds
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.rate_limiter import RateLimiter, TokenBucket
+
+
+def try_take(bucket: TokenBucket):
+    with bucket._lock:
+        return bucket._try_take()
+
+
+def test_burst_then_refill_at_the_rate(clock):
+    bucket = TokenBucket("test", rpm=60, max_concurrent=10, burst=2)
+    assert try_take(bucket) == 0.0
+    assert try_take(bucket) == 0.0
+    assert try_take(bucket) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert try_take(bucket) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert try_take(bucket) == 0.0
+    assert bucket.in_flight == 3
+
+
+def test_refill_is_capped_at_the_burst(clock):
+    bucket = TokenBucket("test", rpm=60, max_concurrent=10, burst=2)
+    clock.now += 3600
+    assert [try_take(bucket) for _ in range(3)] == [0.0, 0.0, pytest.approx(1.0)]
+
+
+def test_concurrency_cap_waits_for_a_release(clock):
+    bucket = TokenBucket("test", rpm=0, max_concurrent=1, burst=1)
+    assert try_take(bucket) == 0.0
+    assert try_take(bucket) is None
+    bucket.release()
+    assert try_take(bucket) == 0.0
+
+
+def test_pause_blocks_until_it_ends(clock):
+    bucket = TokenBucket("test", rpm=0, max_concurrent=5, burst=5)
+    bucket.pause(10.0)
+    bucket.pause(2.0)  # a shorter pause never cuts a longer one
+    assert try_take(bucket) == pytest.approx(10.0)
+    clock.now += 10.0
+    assert try_take(bucket) == 0.0
+
+
+def test_blocked_thread_is_woken_by_release():
+    bucket = TokenBucket("test", rpm=0, max_concurrent=1, burst=1)
+    bucket.acquire()
+    acquired = threading.Event()
+
+    def worker():
+        with bucket.slot():
+            acquired.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not acquired.wait(0.1)
+    bucket.release()
+    assert acquired.wait(2.0)
+    thread.join()
+    assert bucket.in_flight == 0
+
+
+def test_async_waiters_are_woken_and_cancellation_passes_the_slot_on():
+    async def main():
+        bucket = TokenBucket("test", rpm=0, max_concurrent=1, burst=1)
+        await bucket.acquire_async()
+        cancelled = asyncio.create_task(bucket.acquire_async())
+        waiting = asyncio.create_task(bucket.acquire_async())
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        bucket.release()
+        await asyncio.wait_for(waiting, 2.0)
+        assert cancelled.cancelled()
+        assert bucket.in_flight == 1
+
+    asyncio.run(main())
+
+
+def test_buckets_are_shared_per_endpoint_and_key():
+    limiter = RateLimiter()
+    bucket = limiter.get("https://a.test", "key-1")
+    assert limiter.get("https://a.test", "key-1") is bucket
+    assert limiter.get("https://a.test", "key-2") is not bucket
+    assert limiter.get("https://b.test", "key-1") is not bucket
+    assert "key-1" not in bucket.name
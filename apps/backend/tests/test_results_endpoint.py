@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.api_v1.endpoints import batches
+from app.core.config import settings
+from app.services.batch_manager import batch_manager
+from app.services.checkpoint import checkpoints
+
+
+@pytest.fixture
+def batch(request, monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_COMPACT_MIN", 1000)
+    monkeypatch.setattr(settings, "RESULTS_GZIP_MIN_BYTES", 1024)
+    batch_dir = batch_manager.get_batch_path(f"results-{request.node.name}")
+    batch_dir.mkdir(parents=True)
+    yield batch_dir.name, checkpoints.get(batch_dir)
+    checkpoints.drop(batch_dir)
+
+
+def card(i, **values):
+    return {"filename": f"c{i}.jpg", "success": True, "data": {"Signatur": f"S{i}", "Text": "x" * 200}, **values}
+
+
+def get(batch_name, headers=None, **params):
+    app = FastAPI()
+    app.include_router(batches.router, prefix="/batches")
+
+    async def _get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(f"/batches/{batch_name}/results", params=params, headers=headers)
+
+    return asyncio.run(_get())
+
+
+def names(resp):
+    return [r["filename"] for r in resp.json()]
+
+
+def test_not_modified_until_a_card_finishes(batch):
+    name, store = batch
+    store.append([card(1)])
+    first = get(name)
+    assert first.status_code == 200 and first.headers["X-Checkpoint-Version"] == "1"
+
+    repeat = get(name, headers={"If-None-Match": first.headers["ETag"]})
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert repeat.headers["ETag"] == first.headers["ETag"]
+    # The ETag names the variant: the same version with other parameters is not a match
+    assert get(name, headers={"If-None-Match": first.headers["ETag"]}, limit=1).status_code == 200
+
+    store.append([card(2)])
+    changed = get(name, headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and names(changed) == ["c1.jpg", "c2.jpg"]
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_since_across_tombstones_and_compaction(batch):
+    name, store = batch
+    store.append([card(1), card(2), card(3)])
+    version = int(get(name).headers["X-Checkpoint-Version"])
+    store.remove("c2.jpg")
+    store.append([card(4)])
+
+    delta = get(name, since=version)
+    assert delta.json()[0] == {"filename": "c2.jpg", "_deleted": True, "_seq": version + 1}
+    assert names(delta) == ["c2.jpg", "c4.jpg"]
+    assert "X-Checkpoint-Full" not in delta.headers
+
+    page = get(name, since=version, offset=1, limit=1, fields="success")
+    assert page.json() == [{"filename": "c4.jpg", "_seq": version + 2, "success": True}]
+    assert page.headers["X-Total-Count"] == "2"
+
+    # Compaction drops the tombstone: an older poller gets the full set instead
+    store.close()
+    full = get(name, since=version)
+    assert full.headers["X-Checkpoint-Full"] == "true"
+    assert names(full) == ["c1.jpg", "c3.jpg", "c4.jpg"]
+    latest = int(full.headers["X-Checkpoint-Version"])
+    assert latest == version + 2
+    caught_up = get(name, since=latest)
+    assert caught_up.json() == [] and "X-Checkpoint-Full" not in caught_up.headers
+
+
+def test_gzip_negotiation(batch):
+    name, store = batch
+    store.append([card(i) for i in range(20)])
+
+    zipped = get(name, headers={"Accept-Encoding": "gzip"})
+    plain = get(name, headers={"Accept-Encoding": "identity"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in plain.headers
+    assert zipped.headers["Vary"] == plain.headers["Vary"] == "Accept-Encoding"
+    assert zipped.json() == plain.json() and len(plain.json()) == 20
+    assert int(zipped.headers["Content-Length"]) < len(plain.content)
+    assert zipped.headers["ETag"] != plain.headers["ETag"]
+
+    small = get(name, headers={"Accept-Encoding": "gzip"}, limit=1)
+    assert "Content-Encoding" not in small.headers  # below RESULTS_GZIP_MIN_BYTES
+    assert names(small) == ["c0.jpg"]
@@ -0,0 +1,104 @@
+import pytest
+
+from app.services.checkpoint import CheckpointStore
+from app.services.results_store import ResultsStore, error_class
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultsStore(db_path=str(tmp_path / "results.sqlite3"))
+
+
+def ok(filename, signatur="Cod. 1", valid=True, **data):
+    return {
+        "filename": filename,
+        "success": True,
+        "data": {"Signatur": signatur, **data},
+        "has_signatur": bool(signatur),
+        "valid_signatur": valid if signatur else False,
+        "duration": 1.0,
+    }
+
+
+def failed(filename, error):
+    return {"filename": filename, "success": False, "error": error, "duration": 0.5}
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (None, None),
+        ("HTTP 429 Too Many Requests", "rate_limit"),
+        ("Ungültiger API Key (401)", "auth"),
+        ("JSON-Parsing fehlgeschlagen", "parse"),
+        ("HTTP 502 Bad Gateway", "http_5xx"),
+        ("Worker ausgefallen (3 Versuche)", "worker_lost"),
+        ("something new", "other"),
+    ],
+)
+def test_error_class(error, expected):
+    assert error_class(error) == expected
+
+
+def test_upsert_replaces_and_counts(store):
+    store.upsert("b1", [ok("a.jpg"), failed("b.jpg", "HTTP 429")])
+    store.upsert("b1", [ok("b.jpg")])
+    store.upsert("b2", [failed("a.jpg", "Timeout")])
+    assert store.success_counts() == {"b1": 2}
+    assert store.success_counts("b2") == {}
+    stats = store.stats()
+    assert (stats["cards"], stats["batches"], stats["succeeded"]) == (3, 2, 2)
+    assert stats["errors_by_class"] == {"unavailable": 1}
+
+
+def test_query_filters(store):
+    store.upsert("b1", [
+        ok("a.jpg", Titel="Parzival"),
+        ok("b.jpg", signatur="???", valid=False, Titel="Tristan"),
+        ok("c.jpg", signatur=""),
+        failed("d.jpg", "HTTP 429"),
+    ])
+    store.upsert("b2", [ok("a.jpg", Titel="Iwein")])
+
+    def names(**filters):
+        return [(r["batch"], r["filename"]) for r in store.query(**filters)["items"]]
+
+    assert names(batch_names=["b1"], success=False) == [("b1", "d.jpg")]
+    assert names(error_classes=["rate_limit"]) == [("b1", "d.jpg")]
+    assert names(signatur="valid") == [("b1", "a.jpg"), ("b2", "a.jpg")]
+    assert names(signatur="invalid") == [("b1", "b.jpg")]
+    assert names(signatur="missing") == [("b1", "c.jpg")]
+    assert names(field_filters={"Titel": "ist"}) == [("b1", "b.jpg")]
+    assert names(search="iwein") == [("b2", "a.jpg")]
+    with pytest.raises(ValueError):
+        store.query(signatur="maybe")
+
+
+def test_query_sorts_and_pages(store):
+    store.upsert("b1", [ok(f"{name}.jpg", Titel=title) for name, title in [("a", "C"), ("b", "A"), ("c", "B")]])
+    page = store.query(sort="data.Titel", limit=2)
+    assert page["total"] == 3
+    assert [r["filename"] for r in page["items"]] == ["b.jpg", "c.jpg"]
+    assert [r["filename"] for r in store.query(sort="filename", descending=True, offset=1)["items"]] == ["b.jpg", "a.jpg"]
+    with pytest.raises(ValueError):
+        store.query(sort="result; DROP TABLE results")
+
+
+def test_remove_and_remove_batch(store):
+    store.upsert("b1", [ok("a.jpg"), ok("b.jpg")])
+    store.upsert("b2", [ok("a.jpg")])
+    store.remove("b1", "a.jpg")
+    assert store.success_counts() == {"b1": 1, "b2": 1}
+    store.remove_batch("b1")
+    assert store.success_counts() == {"b2": 1}
+
+
+def test_checkpoints_are_imported_once_without_overwriting(store, tmp_path):
+    batches = tmp_path / "batches"
+    (batches / "b1").mkdir(parents=True)
+    CheckpointStore(batches / "b1").append([failed("a.jpg", "HTTP 429"), ok("b.jpg")])
+    store.upsert("b1", [ok("a.jpg")])  # written by a run in the meantime
+    assert store.import_checkpoints(batches) == 2
+    assert store.import_checkpoints(batches) == 0
+    assert store.success_counts() == {"b1": 2}
+    assert store.stats()["checkpoints_imported_at"] is not None
@@ -0,0 +1,116 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from app.services.scheduler import CardScheduler
+
+
+async def grant_order(scheduler: CardScheduler, queued: List[str], grants: int) -> List[str]:
+    """Queues one card request per name and releases one slot at a time; returns the grant order."""
+    order: List[str] = []
+
+    async def card(name: str) -> None:
+        await scheduler.acquire(name)
+        order.append(name)
+
+    tasks = [asyncio.create_task(card(name)) for name in queued]
+    await asyncio.sleep(0.01)
+    while len(order) < grants:
+        scheduler.release(order[-1])
+        await asyncio.sleep(0.01)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return order[:grants]
+
+
+def test_never_more_than_max_workers_in_flight():
+    async def main():
+        scheduler = CardScheduler(2)
+        scheduler.register("a")
+        scheduler.register("b")
+        tasks = [asyncio.create_task(scheduler.acquire(name)) for name in "abab"]
+        await asyncio.sleep(0.01)
+        assert scheduler.in_flight == 2
+        assert sum(task.done() for task in tasks) == 2
+        scheduler.release("a")
+        await asyncio.sleep(0.01)
+        assert scheduler.in_flight == 2
+        assert sum(task.done() for task in tasks) == 3
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(main())
+
+
+def test_weights_split_the_slots():
+    async def main():
+        scheduler = CardScheduler(1)
+        scheduler.register("a", weight=2.0)
+        scheduler.register("b", weight=1.0)
+        return await grant_order(scheduler, ["a"] * 8 + ["b"] * 8, 9)
+
+    order = asyncio.run(main())
+    assert (order.count("a"), order.count("b")) == (6, 3)
+
+
+def test_higher_priority_is_served_first():
+    async def main():
+        scheduler = CardScheduler(1)
+        scheduler.register("low", priority=0)
+        scheduler.register("high", priority=5)
+        return await grant_order(scheduler, ["low"] * 3 + ["high"] * 3, 4)
+
+    assert asyncio.run(main()) == ["low", "high", "high", "high"]
+
+
+def test_idle_batch_does_not_cash_in_unused_share():
+    async def main():
+        scheduler = CardScheduler(1)
+        scheduler.register("a")
+        scheduler.register("b")
+        for _ in range(10):  # a runs alone for a while
+            await scheduler.acquire("a")
+            scheduler.release("a")
+        return await grant_order(scheduler, ["a"] * 4 + ["b"] * 4, 5)
+
+    assert asyncio.run(main()) == ["a", "b", "a", "b", "a"]
+
+
+def test_cancelled_waiters_give_their_slot_back():
+    async def main():
+        scheduler = CardScheduler(1)
+        scheduler.register("a")
+        await scheduler.acquire("a")
+        waiting = asyncio.create_task(scheduler.acquire("a"))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.stats()["batches"][0]["waiting"] == 0
+
+        granted = asyncio.create_task(scheduler.acquire("a"))
+        await asyncio.sleep(0.01)
+        scheduler.release("a")  # grants the slot, then the waiter is cancelled before it runs
+        granted.cancel()
+        await asyncio.gather(granted, return_exceptions=True)
+        assert scheduler.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_unregister_cancels_waiters_and_unknown_batches_fail():
+    async def main():
+        scheduler = CardScheduler(1)
+        scheduler.register("a")
+        await scheduler.acquire("a")
+        waiting = asyncio.create_task(scheduler.acquire("a"))
+        await asyncio.sleep(0.01)
+        scheduler.unregister("a")
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.update("a", weight=2.0) is False
+        with pytest.raises(RuntimeError):
+            await scheduler.acquire("a")
+
+    asyncio.run(main())
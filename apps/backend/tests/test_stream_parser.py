@@ -0,0 +1,80 @@
+import json
+
+from app.services.stream_parser import IncrementalJsonParser, StreamedCompletion
+
+
+def feed_chars(parser, text):
+    members = []
+    for ch in text:
+        members.extend(parser.feed(ch))
+    return members
+
+
+def test_members_are_reported_as_they_close():
+    parser = IncrementalJsonParser()
+    assert parser.feed('Sure:\n```json\n{"title": "A, b",') == [("title", "A, b")]
+    assert parser.feed(' "tags": ["x", "y"], "meta": {"k": "}"}') == [("tags", ["x", "y"])]
+    assert not parser.complete
+    assert parser.feed("}\n```\nmore text") == [("meta", {"k": "}"})]
+    assert parser.complete
+    assert json.loads(parser.text) == {"title": "A, b", "tags": ["x", "y"], "meta": {"k": "}"}}
+
+
+def test_escaped_quotes_do_not_end_strings():
+    parser = IncrementalJsonParser()
+    members = feed_chars(parser, '{"a": "say \\"hi\\", then {go}", "b": 1}')
+    assert members == [("a", 'say "hi", then {go}'), ("b", 1)]
+    assert parser.complete
+
+
+def test_arrays_complete_without_members():
+    parser = IncrementalJsonParser()
+    assert feed_chars(parser, '[{"a": 1}, {"a": 2}] trailing') == []
+    assert parser.text == '[{"a": 1}, {"a": 2}]'
+
+
+def test_text_before_a_value_is_everything_fed():
+    parser = IncrementalJsonParser()
+    parser.feed("no json yet")
+    assert parser.text == "no json yet" and not parser.complete
+
+
+def event(content=None, **extra):
+    body = dict(extra)
+    if content is not None:
+        body["choices"] = [{"delta": {"content": content}}]
+    return "data: " + json.dumps(body)
+
+
+def test_streamed_completion_stops_at_the_closing_bracket():
+    fields = []
+    stream = StreamedCompletion(on_field=lambda key, value: fields.append((key, value)))
+    assert stream.feed_line(": keep-alive") is False
+    assert stream.feed_line(event('{"a": "1", ')) is False
+    assert stream.feed_line(event('"b": "2"} and more', usage={"total_tokens": 7})) is True
+    assert stream.cut_short
+    assert fields == [("a", "1"), ("b", "2")]
+    assert stream.to_response() == {
+        "choices": [{"message": {"role": "assistant", "content": '{"a": "1", "b": "2"}'}}],
+        "usage": {"total_tokens": 7},
+    }
+
+
+def test_streamed_completion_done_and_error_events():
+    stream = StreamedCompletion()
+    stream.feed_line(event('{"a": '))
+    assert stream.feed_line("data: [DONE]") is True
+    assert not stream.cut_short
+
+    stream = StreamedCompletion()
+    assert stream.feed_line('data: {"error": {"message": "overloaded"}}') is True
+    assert stream.error == "overloaded"
+
+
+def test_failing_field_callback_does_not_break_the_stream():
+    def fail(key, value):
+        raise ValueError("boom")
+
+    stream = StreamedCompletion(on_field=fail)
+    assert stream.feed_line(event('{"a": 1}')) is True
+    assert stream.to_response()["choices"][0]["message"]["content"] == '{"a": 1}'
@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.core.config import settings
+from app.services import ocr_engine as engine_module
+from app.services.ocr_engine import OcrEngine
+from app.services.structured_output import StructuredOutputTracker, build_extraction_schema, response_format_for
+
+
+def test_extraction_schema():
+    schema = build_extraction_schema(["Komponist", "Signatur"])
+    assert schema == {
+        "type": "object",
+        "properties": {"Komponist": {"type": "string"}, "Signatur": {"type": "string"}},
+        "required": ["Komponist", "Signatur"],
+        "additionalProperties": False,
+    }
+    assert build_extraction_schema(None)["required"] == list(settings.FIELD_KEYS)
+
+
+def test_response_format():
+    response_format = response_format_for(["Titel"])
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["strict"] is True
+    assert response_format["json_schema"]["schema"] == build_extraction_schema(["Titel"])
+
+
+def test_modes(monkeypatch):
+    tracker = StructuredOutputTracker()
+    tracker.mark_unsupported("http://a", "m")
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT", "on")
+    assert tracker.wants_schema("http://a", "m")
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT", "off")
+    assert not tracker.wants_schema("http://b", "m")
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT", "auto")
+    assert not tracker.wants_schema("http://a", "m")
+    assert tracker.wants_schema("http://a", "other-model")
+    assert tracker.wants_schema("http://b", "m")
+
+
+def test_parse_counts_per_endpoint_and_run():
+    tracker = StructuredOutputTracker()
+    tracker.open_run("b")
+    for outcome in ("ok", "ok", "repaired", "failed"):
+        tracker.record_parse("http://a", True, outcome, "b")
+    tracker.record_parse("http://a", False, "followup", "other")  # no run open for it
+    assert tracker.pop_run("b") == {
+        "responses": 4, "parse_failures": 1, "repaired_locally": 1, "fixed_by_followup": 0,
+        "failure_rate": 0.25, "invalid_json_rate": 0.5,
+    }
+    assert tracker.pop_run("b") is None
+    stats = {s["mode"]: s for s in tracker.stats()}
+    assert stats["structured"]["responses"] == 4
+    assert stats["prompt"]["fixed_by_followup"] == 1
+
+
+def test_auto_falls_back_to_prompt_only(monkeypatch):
+    """A provider rejecting response_format gets the card again without it, and no schema afterwards."""
+    tracker = StructuredOutputTracker()
+    monkeypatch.setattr(engine_module, "structured_output", tracker)
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT", "auto")
+    sent = []
+
+    def fake_post(endpoint, api_key, payload, **kwargs):
+        sent.append("response_format" in payload)
+        if "response_format" in payload:
+            return None, "HTTP 400: response_format is not supported"
+        answer = json.dumps({"Komponist": "Bach"})
+        return {"choices": [{"message": {"content": answer}}]}, None
+
+    engine = OcrEngine(api_key="test")
+    monkeypatch.setattr(engine, "_post_completion", fake_post)
+    for name in ("a.jpg", "b.jpg"):
+        data, error = engine._call_vlm_api_resilient(
+            Path(name), api_endpoint="http://no-schema", model_name="m", base64_image="AAAA"
+        )
+        assert (data, error) == ({"Komponist": "Bach"}, None)
+
+    assert sent == [True, False, False]
+    assert not tracker.wants_schema("http://no-schema", "m")
+    assert [(s["mode"], s["responses"]) for s in tracker.stats()] == [("prompt", 2)]
+
+
+@pytest.mark.parametrize("error", ["HTTP 500: boom", "HTTP 401"])
+def test_other_errors_keep_the_schema(monkeypatch, error):
+    tracker = StructuredOutputTracker()
+    monkeypatch.setattr(engine_module, "structured_output", tracker)
+    monkeypatch.setattr(settings, "STRUCTURED_OUTPUT", "auto")
+    engine = OcrEngine(api_key="test")
+    monkeypatch.setattr(engine, "_post_completion", lambda *args, **kwargs: (None, error))
+    assert engine._call_vlm_api_resilient(Path("a.jpg"), api_endpoint="http://x", model_name="m", base64_image="AAAA") == (None, error)
+    assert tracker.wants_schema("http://x", "m")
@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from app.models.schemas import TemplateCreate, TemplateUpdate
+from app.services.prompts import render_prompt
+from app.services.template_service import TemplateService
+
+
+@pytest.fixture
+def service(tmp_path):
+    return TemplateService(str(tmp_path / "templates.json"))
+
+
+def test_edited_template_renders_a_new_prompt(service):
+    template = service.create_template(TemplateCreate(name="Karten", fields=["Komponist"], prompt_template="A {{fields}}"))
+    first = service.get_prompt(template.id)
+    assert first == render_prompt(("Komponist",), "A {{fields}}")
+    assert first.startswith("A 1. **Komponist**")
+    assert service.get_prompt(template.id) is first  # served from the index
+
+    service.update_template(template.id, TemplateUpdate(prompt_template="B {{fields}}"))
+    assert service.get_prompt(template.id).startswith("B 1. **Komponist**")
+    service.update_template(template.id, TemplateUpdate(fields=["Komponist", "Titel"]))
+    assert "2. **Titel**" in service.get_prompt(template.id)
+    assert service.get_template(template.id).fields == ["Komponist", "Titel"]
+
+
+def test_template_edited_on_disk_is_picked_up(service):
+    template = service.create_template(TemplateCreate(name="Karten", fields=["Komponist"], prompt_template="A {{fields}}"))
+    assert service.get_prompt(template.id).startswith("A ")
+
+    # Another process (or a hand edit) rewrites the file
+    templates = json.loads(service.templates_file.read_text())
+    templates[0]["prompt_template"] = "Edited by hand: {{fields}}"
+    service.templates_file.write_text(json.dumps(templates))
+    st = service.templates_file.stat()
+    os.utime(service.templates_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    assert service.get_prompt(template.id).startswith("Edited by hand: 1. **Komponist**")
+    assert service.get_template(template.id).prompt_template == "Edited by hand: {{fields}}"
+
+
+def test_deleted_template_has_no_prompt(service):
+    template = service.create_template(TemplateCreate(name="Karten", fields=[]))
+    assert service.get_prompt(template.id) == render_prompt(None, None)  # the configured default prompt
+    assert service.delete_template(template.id)
+    assert service.get_prompt(template.id) is None
+    assert service.list_templates() == []
@@ -0,0 +1,64 @@
+import pytest
+
+from app.services.upload_index import BATCH, INCOMING_DIR, SESSION, UploadIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "temp").mkdir()
+    (tmp_path / "batches").mkdir()
+    return UploadIndex(
+        db_path=str(tmp_path / "uploads.sqlite3"),
+        temp_dir=str(tmp_path / "temp"),
+        batches_dir=str(tmp_path / "batches"),
+    )
+
+
+def put(directory, name, content=b"x"):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / name).write_bytes(content)
+
+
+def test_duplicate_in_same_session_is_reported(index):
+    assert index.claim("s1", "a.jpg", "h1", 1) is None
+    put(index.temp_dir / "s1", "a.jpg")
+    assert index.claim("s1", "copy.jpg", "h1", 1) == {"location": SESSION, "owner": "s1", "filename": "a.jpg"}
+    assert index.duplicates_skipped == 1
+
+
+def test_claimed_upload_still_incoming_counts_as_present(index):
+    # First upload has claimed its hash but not yet renamed out of .incoming/
+    put(index.temp_dir / "s1" / INCOMING_DIR, "a.jpg")
+    assert index.claim("s1", "a.jpg", "h1", 1) is None
+    # A concurrent upload of the same content (second tab, parallel PUT) must not store a copy
+    assert index.claim("s2", "b.jpg", "h1", 1) == {"location": SESSION, "owner": "s1", "filename": "a.jpg"}
+
+
+def test_stale_rows_are_dropped(index):
+    assert index.claim("s1", "a.jpg", "h1", 1) is None  # file never landed
+    assert index.claim("s2", "b.jpg", "h1", 1) is None
+    assert index.stats()["sessions"]["files"] == 1
+
+
+def test_assign_moves_session_to_batch(index):
+    index.claim("s1", "a.jpg", "h1", 1)
+    index.assign("s1", "batch_1")
+    put(index.batches_dir / "batch_1" / "_errors", "a.jpg")
+    assert index.claim("s2", "a.jpg", "h1", 1) == {"location": BATCH, "owner": "batch_1", "filename": "a.jpg"}
+    index.remove_batch("batch_1")
+    assert index.claim("s2", "a.jpg", "h1", 1) is None
+
+
+def test_skip_duplicates_false_records_anyway(index):
+    index.claim("s1", "a.jpg", "h1", 1)
+    put(index.temp_dir / "s1", "a.jpg")
+    assert index.claim("s1", "b.jpg", "h1", 1, skip_duplicates=False) is None
+    assert index.stats()["sessions"]["files"] == 2
+
+
+def test_backfill_hashes_existing_batches_once(index):
+    put(index.batches_dir / "old", "card.jpg", b"scan")
+    put(index.batches_dir / "old", "notes.txt", b"not an image")
+    assert index.backfill() == 1
+    assert index.backfill() == 0
+    assert index.stats()["batches"]["files"] == 1
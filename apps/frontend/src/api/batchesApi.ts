@@ -25,6 +25,8 @@ export interface BatchHistoryItem {
   fields: string[];
   has_errors: boolean;
   error_count: number;
+  success_count?: number;
+  updated_at?: number | null;
 }
 
 const createBatch = async (data: BatchCreate): Promise<BatchResponse> => {
@@ -53,9 +55,32 @@ export const cancelBatch = async (batchName: string): Promise<{ message: string;
   return response.data;
 };
 
+type ResultRecord = ExtractionResult & { _seq?: number; _deleted?: boolean };
+
+/** Results already fetched per batch and the checkpoint version they reflect. */
+const resultsCache = new Map<string, { version: number; byFilename: Map<string, ExtractionResult> }>();
+
+/** Fetches only the records changed since the last call (`since`) and merges them. */
 export const fetchResults = async (batchName: string): Promise<ExtractionResult[]> => {
-  const response = await axios.get<ExtractionResult[]>(`/api/v1/batches/${batchName}/results`);
-  return response.data;
+  const cached = resultsCache.get(batchName);
+  const response = await axios.get<ResultRecord[]>(`/api/v1/batches/${batchName}/results`, {
+    params: cached ? { since: cached.version } : undefined,
+  });
+  const version = Number(response.headers['x-checkpoint-version'] ?? 0);
+  if (cached && version < cached.version) {
+    // Checkpoint was replaced; start over with a full fetch
+    resultsCache.delete(batchName);
+    return fetchResults(batchName);
+  }
+  // A full answer to a `since` request (removals were compacted away) replaces the cache
+  const full = response.headers['x-checkpoint-full'] === 'true';
+  const byFilename = new Map<string, ExtractionResult>(full ? undefined : cached?.byFilename);
+  for (const record of response.data) {
+    if (record._deleted) byFilename.delete(record.filename);
+    else byFilename.set(record.filename, record);
+  }
+  resultsCache.set(batchName, { version, byFilename });
+  return [...byFilename.values()];
 };
 
 export const retryImage = async (batchName: string, filename: string): Promise<{ message: string }> => {
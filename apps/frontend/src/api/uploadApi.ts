@@ -3,10 +3,21 @@ import { useMutation } from '@tanstack/react-query';
 import { toast } from 'sonner';
 
 // Define the API response schema matching the backend
+export interface UploadedFileInfo {
+  filename: string;
+  size: number;
+  sha256: string;
+  seconds: number;
+  mb_per_second: number;
+  duplicate_of?: string | null;
+}
+
 export interface UploadResponse {
   session_id: string;
-  filenames: string[];
+  filenames: string[]; // stored files; duplicates skipped by the server are not included
   message: string;
+  files: UploadedFileInfo[];
+  skipped: UploadedFileInfo[];
 }
 
 // Function to upload files
@@ -14,6 +14,7 @@ const statusStyles: Record<string, string> = {
   completed: 'bg-green-100 text-green-800 border-green-200',
   uploaded: 'bg-blue-100 text-blue-800 border-blue-200',
   running: 'bg-yellow-100 text-yellow-800 border-yellow-200',
+  queued: 'bg-orange-100 text-orange-800 border-orange-200',
   failed: 'bg-red-100 text-red-800 border-red-200',
   cancelled: 'bg-gray-100 text-gray-600 border-gray-200',
 };
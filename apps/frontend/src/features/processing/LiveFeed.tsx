@@ -3,9 +3,12 @@ import type { ExtractionResult } from '../../store/wizardStore';
 
 interface LiveFeedProps {
   items: ExtractionResult[];
+  /** Cards still streaming in: filename → fields received so far */
+  pending?: Record<string, Record<string, string>>;
 }
 
-export const LiveFeed: React.FC<LiveFeedProps> = ({ items }) => {
+export const LiveFeed: React.FC<LiveFeedProps> = ({ items, pending = {} }) => {
+  const pendingEntries = Object.entries(pending);
   const bottomRef = useRef<HTMLDivElement | null>(null);
 
   useEffect(() => {
@@ -14,7 +17,7 @@ export const LiveFeed: React.FC<LiveFeedProps> = ({ items }) => {
     }
   }, [items.length]);
 
-  if (items.length === 0) {
+  if (items.length === 0 && pendingEntries.length === 0) {
     return (
       <div className="max-h-64 overflow-y-auto border border-parchment-dark/30 rounded-lg bg-parchment-light/10 p-4">
         <p className="text-archive-ink/40 italic text-sm text-center">
@@ -52,6 +55,24 @@ export const LiveFeed: React.FC<LiveFeedProps> = ({ items }) => {
           )}
         </div>
       ))}
+      {pendingEntries.map(([filename, fields]) => (
+        <div
+          key={`pending-${filename}`}
+          className="border-l-4 border-dashed border-archive-ink/20 bg-parchment-light/10 p-3 rounded-r"
+        >
+          <p className="font-mono text-xs font-semibold text-archive-ink/50 truncate mb-1">
+            {filename} <span className="font-sans font-normal italic">· streaming…</span>
+          </p>
+          <div className="grid grid-cols-2 gap-x-4 gap-y-0.5">
+            {Object.entries(fields).map(([key, value]) => (
+              <div key={key} className="flex gap-1 text-xs text-archive-ink/50 truncate">
+                <span className="font-semibold shrink-0">{key}:</span>
+                <span className="truncate font-serif italic">{value || '—'}</span>
+              </div>
+            ))}
+          </div>
+        </div>
+      ))}
       <div ref={bottomRef} />
     </div>
   );
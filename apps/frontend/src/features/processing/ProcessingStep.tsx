@@ -1,8 +1,8 @@
-import React, { useCallback, useEffect, useRef } from 'react';
+import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { AlertTriangle, X, ArrowLeft } from 'lucide-react';
 import { toast } from 'sonner';
 import { useWizardStore } from '../../store/wizardStore';
-import type { BatchProgress } from '../../store/wizardStore';
+import type { BatchProgress, PartialResult } from '../../store/wizardStore';
 import { useProcessingWebSocket } from './useProcessingWebSocket';
 import { ProgressBar } from './ProgressBar';
 import { LiveFeed } from './LiveFeed';
@@ -42,11 +42,28 @@ export const ProcessingStep: React.FC = () => {
 
   const navigateToResultsRef = useRef<ReturnType<typeof setTimeout> | null>(null);
 
+  // Fields of cards whose answer is still streaming in, keyed by filename
+  const [pendingCards, setPendingCards] = useState<Record<string, Record<string, string>>>({});
+
+  const handlePartialResult = useCallback((partial: PartialResult) => {
+    setPendingCards((prev) => ({
+      ...prev,
+      [partial.filename]: { ...prev[partial.filename], ...partial.fields },
+    }));
+  }, []);
+
   const handleProgress = useCallback(
     (progress: BatchProgress) => {
       setLastProgress(progress);
 
       if (progress.last_result) {
+        const { filename } = progress.last_result;
+        setPendingCards((prev) => {
+          if (!(filename in prev)) return prev;
+          const next = { ...prev };
+          delete next[filename];
+          return next;
+        });
         appendLiveFeedItem(progress.last_result);
         if (progress.last_result.success === false) {
           incrementConsecutiveFailures();
@@ -80,7 +97,7 @@ export const ProcessingStep: React.FC = () => {
     ]
   );
 
-  const { close: closeWebSocket } = useProcessingWebSocket(batchId, handleProgress);
+  const { close: closeWebSocket } = useProcessingWebSocket(batchId, handleProgress, handlePartialResult);
 
   // Cleanup timer on unmount
   useEffect(() => {
@@ -246,7 +263,7 @@ export const ProcessingStep: React.FC = () => {
         <label className="text-xs uppercase tracking-widest text-archive-ink/40 font-semibold">
           Live Extraction Feed
         </label>
-        <LiveFeed items={liveFeedItems} />
+        <LiveFeed items={liveFeedItems} pending={pendingCards} />
       </div>
     </div>
   );
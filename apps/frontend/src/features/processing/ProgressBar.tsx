@@ -21,7 +21,7 @@ export const ProgressBar: React.FC<ProgressBarProps> = ({ progress }) => {
     );
   }
 
-  const { current, total, percentage, eta_seconds, last_result } = progress;
+  const { current, total, percentage, eta_seconds, last_result, concurrency_limit } = progress;
   const etaLabel =
     eta_seconds != null && eta_seconds > 0
       ? `~${Math.ceil(eta_seconds)}s remaining`
@@ -32,6 +32,7 @@ export const ProgressBar: React.FC<ProgressBarProps> = ({ progress }) => {
       <div className="flex justify-between items-center">
         <span className="text-xs uppercase tracking-widest text-archive-ink/40 font-semibold">
           {current} / {total} items
+          {concurrency_limit != null && ` · ${concurrency_limit} parallel`}
         </span>
         {etaLabel && (
           <span className="text-xs uppercase tracking-widest text-archive-ink/40 font-semibold">
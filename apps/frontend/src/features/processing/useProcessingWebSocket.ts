@@ -1,14 +1,19 @@
 import { useEffect, useRef, useCallback } from 'react';
-import type { BatchProgress } from '../../store/wizardStore';
+import type { BatchProgress, PartialResult } from '../../store/wizardStore';
 
 export function useProcessingWebSocket(
   batchId: string | null,
-  onMessage: (progress: BatchProgress) => void
+  onMessage: (progress: BatchProgress) => void,
+  onPartialResult?: (partial: PartialResult) => void
 ) {
   const wsRef = useRef<WebSocket | null>(null);
   const onMessageRef = useRef(onMessage);
-  // Keep callback ref current — read only inside WS event handler, not during render
-  useEffect(() => { onMessageRef.current = onMessage; });
+  const onPartialResultRef = useRef(onPartialResult);
+  // Keep callback refs current — read only inside WS event handler, not during render
+  useEffect(() => {
+    onMessageRef.current = onMessage;
+    onPartialResultRef.current = onPartialResult;
+  });
 
   useEffect(() => {
     if (!batchId) return;
@@ -22,8 +27,12 @@ export function useProcessingWebSocket(
 
       ws.onmessage = (event) => {
         try {
-          const data: BatchProgress = JSON.parse(event.data);
-          onMessageRef.current(data);
+          const data = JSON.parse(event.data);
+          if (data.type === 'partial_result') {
+            onPartialResultRef.current?.(data as PartialResult);
+            return;
+          }
+          onMessageRef.current(data as BatchProgress);
         } catch {
           console.error('WS parse error', event.data);
         }
@@ -37,7 +37,13 @@ export const Dropzone: React.FC = () => {
           { files: acceptedFiles, sessionId },
           {
             onSuccess: (data) => {
-              const newFiles: UploadedFile[] = acceptedFiles.map((file) => ({
+              const stored = new Set(data.filenames);
+              if (data.skipped.length > 0) {
+                toast.warning(`${data.skipped.length} duplicate file(s) skipped`, {
+                  description: data.skipped.map((s) => `${s.filename} (${s.duplicate_of})`).join(', '),
+                });
+              }
+              const newFiles: UploadedFile[] = acceptedFiles.filter((file) => stored.has(file.name)).map((file) => ({
                 id: Math.random().toString(36).substring(2, 11),
                 name: file.name,
                 size: file.size,
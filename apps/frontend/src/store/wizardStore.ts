@@ -37,6 +37,15 @@ export interface BatchProgress {
   last_result: ExtractionResult | null;
   status: 'running' | 'completed' | 'failed' | 'retrying' | 'cancelled';
   error?: string | null;
+  concurrency_limit?: number | null;
+}
+
+/** Fields of a card whose answer is still streaming in (STREAM_COMPLETIONS). */
+export interface PartialResult {
+  type: 'partial_result';
+  batch_name: string;
+  filename: string;
+  fields: Record<string, string>;
 }
 
 export interface ResultRow {
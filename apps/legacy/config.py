@@ -20,6 +20,7 @@ MAX_WORKERS = 5
 MAX_RETRIES = 4
 RETRY_DELAY_BASE = 1.0
 BATCH_SIZE_HINT = 500
+FAST_RESIZE = True  # JPEG draft (DCT-scaled) decoding before the final resample
 
 # === Extraction Configuration ===
 FIELD_KEYS = [
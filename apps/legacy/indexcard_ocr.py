@@ -15,6 +15,7 @@ Wesentliche Änderungen gegenüber Original:
 import os
 import io
 import json
+import math
 import base64
 import time
 import random
@@ -37,7 +38,7 @@ from config import (
     DEFAULT_INPUT_DIR, OUTPUT_BASE, JSON_OUT_BASE, CSV_OUT_BASE,
     FINAL_CSV, CHECKPOINT_JSON, PROGRESS_FILE, LOG_FILE,
     API_BASE_URL, API_ENDPOINT, MODEL_NAME,
-    MAX_WORKERS, MAX_RETRIES, RETRY_DELAY_BASE, BATCH_SIZE_HINT,
+    MAX_WORKERS, MAX_RETRIES, RETRY_DELAY_BASE, BATCH_SIZE_HINT, FAST_RESIZE,
     FIELD_KEYS, EXTRACTION_PROMPT, EXTRACTION_SCHEMA
 )
 
@@ -73,12 +74,38 @@ _session.headers.update({"Content-Type": "application/json"})
 def format_time(seconds):
     return str(timedelta(seconds=int(seconds)))
 
+def thumbnail_size(width: int, height: int, max_size: int) -> Optional[Tuple[int, int]]:
+    """Zielgröße wie bei Image.thumbnail((max_size, max_size)); None wenn das Bild schon passt."""
+    x, y = max_size, max_size
+    if x >= width and y >= height:
+        return None
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+def downscale_image(img, max_size: int):
+    """Verkleinert auf max_size; mit FAST_RESIZE dekodiert JPEG direkt in 1/2, 1/4 oder 1/8 Auflösung (draft)."""
+    if not FAST_RESIZE:
+        img.thumbnail((max_size, max_size))
+        return img
+    target = thumbnail_size(img.width, img.height, max_size)
+    if target is None:
+        return img
+    img.draft(None, target)
+    return img.resize(target, Image.Resampling.LANCZOS)
+
 def encode_image_to_base64(image_path: Path, max_size: Optional[int] = None) -> str:
     """Kodiert ein Bild als Base64; optional vorheriges Resize (falls Pillow installiert)."""
     if max_size and PIL_AVAILABLE:
         try:
-            img = Image.open(image_path)
-            img.thumbnail((max_size, max_size))
+            img = downscale_image(Image.open(image_path), max_size)
             buf = io.BytesIO()
             img.save(buf, format="JPEG", quality=85)
             return base64.b64encode(buf.getvalue()).decode("utf-8")
@@ -9,7 +9,10 @@ from indexcard_ocr import (
     validate_signature,
     extract_json_from_model_content,
     validate_extraction,
-    format_time
+    format_time,
+    thumbnail_size,
+    downscale_image,
+    PIL_AVAILABLE
 )
 
 class TestIndexcardOCR(unittest.TestCase):
@@ -60,6 +63,22 @@ class TestIndexcardOCR(unittest.TestCase):
         self.assertFalse(ok)
         self.assertIn("Field Komponist not a string", errors)
 
+    @unittest.skipUnless(PIL_AVAILABLE, "Pillow not installed")
+    def test_downscale_image_matches_thumbnail(self):
+        import io
+        from PIL import Image
+
+        for size in [(5000, 7000), (3301, 2099), (1200, 900)]:
+            buf = io.BytesIO()
+            Image.new("RGB", size, (230, 220, 200)).save(buf, format="JPEG")
+
+            expected = Image.open(io.BytesIO(buf.getvalue()))
+            expected.thumbnail((1600, 1600))
+            fast = downscale_image(Image.open(io.BytesIO(buf.getvalue())), 1600)
+            self.assertEqual(fast.size, expected.size)
+
+        self.assertIsNone(thumbnail_size(1200, 900, 1600))
+
     def test_format_time(self):
         self.assertEqual(format_time(65), "0:01:05")
         self.assertEqual(format_time(3661), "1:01:01")